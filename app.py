@@ -1,520 +1,639 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, render_template, request, jsonify
+import click
 import os
-import uuid # Para gerar IDs únicos
+import functools
+import shutil
+import tempfile
 import json # Para lidar com dados mais complexos (professor na oferta)
+import threading
+import time
+
+import backup
+import batch
+import change_feed
+import compression
+import exporter
+import importer
+import json_provider
+import metrics
+import operations
+from operations import OperationError
+from profiling import SlowRequestProfiler
+from response_cache import ResponseCache
+from store import LIST_FILTERS, REFERENCES, SEARCH_FIELDS, TABLES, DataStore, record_version
+from sqlite_store import SqliteStore, import_txt_data
 
 app = Flask(__name__)
+# Serialização JSON das respostas: 'orjson' (padrão, se instalado) ou 'json' (ver json_provider)
+app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', json_provider.DEFAULT_PROVIDER)
+app.json = json_provider.create_provider(app, app.config['JSON_PROVIDER'])
 
 # --- Definições de Caminho dos Arquivos ---
 DATA_DIR = 'data'
-TURMAS_FILE = os.path.join(DATA_DIR, 'turmas.txt')
-DISCIPLINAS_FILE = os.path.join(DATA_DIR, 'disciplinas.txt') # Catálogo de disciplinas
-ALUNOS_FILE = os.path.join(DATA_DIR, 'alunos.txt')
-TURMA_DISCIPLINAS_FILE = os.path.join(DATA_DIR, 'turma_disciplinas.txt') # Disciplinas oferecidas em turmas
-MATRICULAS_FILE = os.path.join(DATA_DIR, 'matriculas.txt') # Alunos matriculados em disciplinas-oferta
 
 # Garante que o diretório de dados exista
 os.makedirs(DATA_DIR, exist_ok=True)
 
-# Funções auxiliares para leitura e escrita dos arquivos
-# Usaremos um formato simples de "id|campo1|campo2"
-
-def generate_id():
-    """Gera um ID único usando UUID."""
-    return str(uuid.uuid4())
-
-# NEW: Helper para ler os dados brutos (dicionários) diretamente dos arquivos
-def _read_raw_data_from_files():
-    """Lê todos os dados brutos dos arquivos e os estrutura em dicionários em memória."""
-    raw_data = {
-        'turmas_raw': {},
-        'disciplinas_catalogo_raw': {},
-        'alunos_raw': {},
-        'turma_disciplinas_ofertas_raw': {},
-        'matriculas_raw': {}
-    }
-
-    # Ler turmas.txt
-    if os.path.exists(TURMAS_FILE):
-        with open(TURMAS_FILE, 'r') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) == 2:
-                    raw_data['turmas_raw'][parts[0]] = {'id': parts[0], 'nome': parts[1]}
-
-    # Ler disciplinas.txt (catálogo)
-    if os.path.exists(DISCIPLINAS_FILE):
-        with open(DISCIPLINAS_FILE, 'r') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) == 3: # id|codigo|nome
-                    raw_data['disciplinas_catalogo_raw'][parts[0]] = {'id': parts[0], 'codigo': parts[1], 'nome': parts[2]}
-
-    # Ler alunos.txt
-    if os.path.exists(ALUNOS_FILE):
-        with open(ALUNOS_FILE, 'r') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) == 4: # id|matricula|nome|telefone
-                    raw_data['alunos_raw'][parts[0]] = {'id': parts[0], 'matricula': parts[1], 'nome': parts[2], 'telefone': parts[3]}
-    
-    # Ler turma_disciplinas.txt (ofertas)
-    if os.path.exists(TURMA_DISCIPLINAS_FILE):
-        with open(TURMA_DISCIPLINAS_FILE, 'r') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) == 4: # id|turma_id|disciplina_catalogo_id|professor
-                    raw_data['turma_disciplinas_ofertas_raw'][parts[0]] = {
-                        'id': parts[0], 
-                        'turma_id': parts[1], 
-                        'disciplina_catalogo_id': parts[2], 
-                        'professor': parts[3]
-                    }
-
-    # Ler matriculas.txt
-    if os.path.exists(MATRICULAS_FILE):
-        with open(MATRICULAS_FILE, 'r') as f:
-            for line in f:
-                parts = line.strip().split('|')
-                if len(parts) == 3: # id|aluno_id|turma_disciplina_id
-                    raw_data['matriculas_raw'][parts[0]] = {
-                        'id': parts[0], 
-                        'aluno_id': parts[1], 
-                        'turma_disciplina_id': parts[2]
-                    }
-
-    return raw_data
-
-# NEW: Helper para escrever os dados brutos de volta para os arquivos
-def write_raw_data_to_files(raw_data):
-    """Escreve todos os dados brutos de volta para os arquivos."""
-    with open(TURMAS_FILE, 'w') as f:
-        for turma in raw_data['turmas_raw'].values():
-            f.write(f"{turma['id']}|{turma['nome']}\n")
-    
-    with open(DISCIPLINAS_FILE, 'w') as f:
-        for disciplina in raw_data['disciplinas_catalogo_raw'].values():
-            f.write(f"{disciplina['id']}|{disciplina['codigo']}|{disciplina['nome']}\n")
-            
-    with open(ALUNOS_FILE, 'w') as f:
-        for aluno in raw_data['alunos_raw'].values():
-            f.write(f"{aluno['id']}|{aluno['matricula']}|{aluno['nome']}|{aluno['telefone']}\n")
-
-    with open(TURMA_DISCIPLINAS_FILE, 'w') as f:
-        for oferta in raw_data['turma_disciplinas_ofertas_raw'].values():
-            f.write(f"{oferta['id']}|{oferta['turma_id']}|{oferta['disciplina_catalogo_id']}|{oferta['professor']}\n")
-            
-    with open(MATRICULAS_FILE, 'w') as f:
-        for matricula in raw_data['matriculas_raw'].values():
-            f.write(f"{matricula['id']}|{matricula['aluno_id']}|{matricula['turma_disciplina_id']}\n")
-            
-    print("Dados salvos com sucesso nos arquivos.") # Para debug no console do Flask
-
+# Backend de armazenamento: 'txt' (arquivos "id|campo1|campo2" mantidos em memória)
+# ou 'sqlite' (banco em SQLITE_PATH, criado com `flask migrate-to-sqlite`)
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'txt')
+app.config['SQLITE_PATH'] = os.environ.get('SQLITE_PATH', os.path.join(DATA_DIR, 'faculdade.db'))
+
+def create_store():
+    if app.config['STORAGE_BACKEND'] == 'sqlite':
+        return SqliteStore(app.config['SQLITE_PATH'])
+    return DataStore(DATA_DIR)
+
+store = create_store()
+
+# Cache das respostas de leitura (ver cached_response): limites de entradas e de memória
+app.config['RESPONSE_CACHE_ENTRIES'] = int(os.environ.get('RESPONSE_CACHE_ENTRIES', 256))
+app.config['RESPONSE_CACHE_BYTES'] = int(os.environ.get('RESPONSE_CACHE_BYTES', 32 * 1024 * 1024))
+response_cache = ResponseCache(app.config['RESPONSE_CACHE_ENTRIES'], app.config['RESPONSE_CACHE_BYTES'])
+
+# Respostas a partir deste tamanho (bytes) vão comprimidas para quem aceita gzip/brotli
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+
+# Instrumentação: SERVER_TIMING=1 envia as etapas de cada requisição no cabeçalho Server-Timing;
+# PROFILE_SLOWEST=N perfila as requisições (fração PROFILE_SAMPLE_RATE) e guarda em PROFILE_DIR
+# o pstats das N mais lentas
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING') == '1'
+app.config['PROFILE_SLOWEST'] = int(os.environ.get('PROFILE_SLOWEST', 0))
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PROFILE_SAMPLE_RATE', 1.0))
+app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+# Diretório padrão dos backups de `flask backup`
+app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR', 'backups')
+# Duração máxima (s) de cada conexão de /api/changes/stream: ao fim, o navegador reconecta
+# (libera o worker/thread de tempos em tempos)
+app.config['CHANGE_STREAM_SECONDS'] = float(os.environ.get('CHANGE_STREAM_SECONDS', 300))
+# Streams abertos ao mesmo tempo por processo no modo WSGI, em que cada um prende uma thread:
+# acima disso a rota responde 503 e o cliente tenta de novo depois. No modo ASGI o stream não
+# passa pela rota (ver asgi.py) e não tem limite
+app.config['CHANGE_STREAM_MAX'] = int(os.environ.get('CHANGE_STREAM_MAX', 2))
+# Ligado por asgi.py, que serve o stream sem uma thread por conexão. Só então a página abre o
+# feed; no WSGI ela recarrega a seção depois de cada alteração feita nela
+app.config['CHANGE_STREAM_NONBLOCKING'] = False
+change_stream_slots = threading.BoundedSemaphore(app.config['CHANGE_STREAM_MAX'])
+
+profiler = SlowRequestProfiler(app.config['PROFILE_DIR'], app.config['PROFILE_SLOWEST'],
+                               app.config['PROFILE_SAMPLE_RATE']) if app.config['PROFILE_SLOWEST'] else None
 
 # Função principal para obter dados formatados para o frontend
 def get_current_full_data(search_turma=None, search_disciplina=None, search_aluno=None):
-    raw_data = _read_raw_data_from_files()
-
-    turmas = []
-    for turma_id, turma_info in raw_data['turmas_raw'].items():
-        if search_turma and search_turma.lower() not in turma_info['nome'].lower():
-            continue
-        
-        disciplinas_na_turma = []
-        for oferta_id, oferta_info in raw_data['turma_disciplinas_ofertas_raw'].items():
-            if oferta_info['turma_id'] == turma_id:
-                disciplina_catalogo_info = raw_data['disciplinas_catalogo_raw'].get(oferta_info['disciplina_catalogo_id'])
-                if disciplina_catalogo_info:
-                    
-                    # Apply search_disciplina filter if present
-                    if search_disciplina and search_disciplina.lower() not in disciplina_catalogo_info['nome'].lower() and \
-                       search_disciplina.lower() not in disciplina_catalogo_info['codigo'].lower():
-                        continue
-
-                    alunos_na_disciplina = []
-                    for matricula_id, matricula_info in raw_data['matriculas_raw'].items():
-                        if matricula_info['turma_disciplina_id'] == oferta_id:
-                            aluno_info = raw_data['alunos_raw'].get(matricula_info['aluno_id'])
-                            if aluno_info:
-                                # Apply search_aluno filter if present
-                                if search_aluno and search_aluno.lower() not in aluno_info['nome'].lower() and \
-                                   search_aluno.lower() not in aluno_info['matricula'].lower():
-                                    continue
-                                
-                                alunos_na_disciplina.append({
-                                    'id': aluno_info['id'],
-                                    'matricula': aluno_info['matricula'],
-                                    'nome': aluno_info['nome'],
-                                    'telefone': aluno_info['telefone'],
-                                    'matricula_id': matricula_info['id'] # Adiciona o ID da matrícula para facilitar a exclusão
-                                })
-                    disciplinas_na_turma.append({
-                        'id': oferta_id, # ID da oferta
-                        'codigo': disciplina_catalogo_info['codigo'],
-                        'nome': disciplina_catalogo_info['nome'],
-                        'professor': oferta_info['professor'],
-                        'alunos': alunos_na_disciplina,
-                        'disciplina_catalogo_id': disciplina_catalogo_info['id'] # Adiciona o ID do catálogo
-                    })
-        turmas.append({
-            'id': turma_id,
-            'nome': turma_info['nome'],
-            'disciplinas': disciplinas_na_turma # Estas são as ofertas de disciplina
-        })
-
-    # Preparar catálogo de disciplinas para o frontend (sem filtro de busca aqui)
-    disciplinas_catalogo_list = [
-        {'id': d_id, 'codigo': d_info['codigo'], 'nome': d_info['nome']} 
-        for d_id, d_info in raw_data['disciplinas_catalogo_raw'].items()
-    ]
-    if search_disciplina: # Apply search to catalog directly if not part of a turma search
-        disciplinas_catalogo_list = [
-            d for d in disciplinas_catalogo_list 
-            if search_disciplina.lower() in d['nome'].lower() or search_disciplina.lower() in d['codigo'].lower()
-        ]
-
-    # Preparar lista de alunos para o frontend (sem filtro de busca aqui)
-    alunos_list = [
-        {'id': a_id, 'matricula': a_info['matricula'], 'nome': a_info['nome'], 'telefone': a_info['telefone']}
-        for a_id, a_info in raw_data['alunos_raw'].items()
-    ]
-    if search_aluno: # Apply search to students directly if not part of a turma search
-        alunos_list = [
-            a for a in alunos_list 
-            if search_aluno.lower() in a['nome'].lower() or search_aluno.lower() in a['matricula'].lower()
-        ]
-
-    # Preparar ofertas de disciplina (turma_disciplinas_ofertas) para exibição direta
-    # Esta lista é plana para facilitar a busca e renderização sem depender de turmas
-    ofertas_list = []
-    for oferta_id, oferta_info in raw_data['turma_disciplinas_ofertas_raw'].items():
-        turma_info = raw_data['turmas_raw'].get(oferta_info['turma_id'])
-        disciplina_catalogo_info = raw_data['disciplinas_catalogo_raw'].get(oferta_info['disciplina_catalogo_id'])
-        
-        if turma_info and disciplina_catalogo_info:
-            ofertas_list.append({
-                'id': oferta_id,
-                'turma_id': oferta_info['turma_id'],
-                'turma_nome': turma_info['nome'],
-                'disciplina_catalogo_id': oferta_info['disciplina_catalogo_id'],
-                'disciplina_codigo': disciplina_catalogo_info['codigo'],
-                'disciplina_nome': disciplina_catalogo_info['nome'],
-                'professor': oferta_info['professor']
-            })
-            
-    # Preparar lista de matrículas para exibição direta
-    matriculas_list = []
-    for matricula_id, matricula_info in raw_data['matriculas_raw'].items():
-        aluno_info = raw_data['alunos_raw'].get(matricula_info['aluno_id'])
-        oferta_info = raw_data['turma_disciplinas_ofertas_raw'].get(matricula_info['turma_disciplina_id'])
-        
-        if aluno_info and oferta_info:
-            disciplina_catalogo_info = raw_data['disciplinas_catalogo_raw'].get(oferta_info['disciplina_catalogo_id'])
-            turma_info = raw_data['turmas_raw'].get(oferta_info['turma_id'])
-
-            if disciplina_catalogo_info and turma_info:
-                matriculas_list.append({
-                    'id': matricula_id,
-                    'aluno_id': aluno_info['id'],
-                    'aluno_matricula': aluno_info['matricula'],
-                    'aluno_nome': aluno_info['nome'],
-                    'turma_disciplina_id': oferta_info['id'],
-                    'turma_nome': turma_info['nome'],
-                    'disciplina_nome': disciplina_catalogo_info['nome'],
-                    'professor': oferta_info['professor']
-                })
-
-
-    return {
-        'turmas': turmas,
-        'disciplinas_catalogo': disciplinas_catalogo_list,
-        'alunos': alunos_list,
-        'turma_disciplinas_ofertas': ofertas_list,
-        'matriculas': matriculas_list
-    }
+    return store.full_data(search_turma, search_disciplina, search_aluno)
+
+
+def with_store_lock(view):
+    """Executa a rota dentro de uma transação do armazenamento, para que validação e escrita sejam atômicas."""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        request.get_data()  # recebe o corpo antes da trava: um cliente lento não atrasa os outros
+        with store.transaction():
+            return view(*args, **kwargs)
+    return wrapper
+
+def cached_response(view):
+    """Guarda a resposta de uma rota de leitura por URL, até a próxima alteração dos dados.
+
+    A versão dos dados (store.data_version) é o ETag: um cliente que já a tem recebe 304
+    sem que a resposta seja montada. Só respostas 200 são guardadas, já comprimidas com a
+    codificação aceita pelo cliente (cada codificação é uma entrada, com o próprio ETag).
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified_at = store.data_version()
+        encoding = compression.negotiate(request.accept_encodings)
+        etag = f'{version}-{encoding}' if encoding else version
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+        else:
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), encoding)
+            entry = response_cache.get(key, version)
+            if entry is not None:
+                body, mimetype, content_encoding = entry
+                response = app.response_class(body, mimetype=mimetype)
+                response.content_encoding = content_encoding
+                response.vary.add('Accept-Encoding')
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                compression.compress_response(response, encoding, app.config['COMPRESS_MIN_BYTES'])
+                # Só guarda se nada mudou enquanto a resposta era montada
+                if store.data_version()[0] == version:
+                    response_cache.put(key, version, response.get_data(), response.mimetype,
+                                       response.content_encoding)
+        response.set_etag(etag)
+        response.last_modified = modified_at
+        response.cache_control.no_cache = True  # o navegador sempre revalida com If-None-Match
+        return response.make_conditional(request)
+    return wrapper
+
+
+# --- MÉTRICAS ---
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.begin_request()
+    g.profile = profiler.start() if profiler else None
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_start
+    endpoint = request.url_rule.rule if request.url_rule else 'desconhecida'
+    labels = (('method', request.method), ('endpoint', endpoint))
+    metrics.registry.inc('faculdade_http_requests_total', labels + (('status', str(response.status_code)),))
+    metrics.registry.observe('faculdade_http_request_duration_seconds', labels, elapsed)
+    spans = metrics.end_request()
+    if app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = metrics.server_timing(spans, elapsed)
+    if g.profile:
+        profiler.finish(g.profile, elapsed, f'{request.method} {request.path}')
+        g.profile = None
+    return response
+
+@app.after_request
+def compress_response(response):
+    # Registrada depois de record_request_metrics, roda antes dela: a compressão entra no tempo
+    # da requisição. As respostas de cached_response já chegam aqui comprimidas
+    return compression.compress_response(response, compression.negotiate(request.accept_encodings),
+                                         app.config['COMPRESS_MIN_BYTES'])
+
+@app.teardown_request
+def stop_request_profile(exc):
+    if g.get('profile'):  # a requisição terminou com uma exceção, antes de after_request
+        profiler.stop(g.profile)
+        g.profile = None
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    text = metrics.registry.render(extra=[
+        ('faculdade_response_cache_hits_total', 'counter', 'Respostas servidas pelo cache.', response_cache.hits),
+        ('faculdade_response_cache_misses_total', 'counter', 'Respostas montadas por falta no cache.', response_cache.misses),
+        ('faculdade_response_cache_entries', 'gauge', 'Respostas guardadas no cache.', len(response_cache.entries)),
+        ('faculdade_response_cache_bytes', 'gauge', 'Bytes guardados no cache.', response_cache.size),
+    ])
+    return Response(text, content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', change_stream=app.config['CHANGE_STREAM_NONBLOCKING'])
+
+# Formatos de resposta de /api/data e das listagens (parâmetro format). No "normalized", cada
+# registro vai uma vez só, com os próprios campos, e as referências são só IDs: em vez de repetir
+# nomes de alunos, turmas, disciplinas e professores em cada matrícula
+RESPONSE_FORMATS = ('denormalized', 'normalized')
+
+def _response_format():
+    """Formato pedido, ou None se for inválido."""
+    response_format = request.args.get('format') or 'denormalized'
+    return response_format if response_format in RESPONSE_FORMATS else None
+
+def _invalid_format():
+    return jsonify({'error': f'Formato inválido. Use format={" ou format=".join(RESPONSE_FORMATS)}.'}), 400
 
 @app.route('/api/data', methods=['GET'])
+@cached_response
 def get_data():
+    response_format = _response_format()
+    if response_format is None:
+        return _invalid_format()
     search_turma = request.args.get('search_turma')
     search_disciplina = request.args.get('search_disciplina')
     search_aluno = request.args.get('search_aluno')
+    if response_format == 'normalized':
+        return jsonify(store.normalized_data(search_turma, search_disciplina, search_aluno))
     data = get_current_full_data(search_turma, search_disciplina, search_aluno)
     return jsonify(data)
 
+# --- ROTAS DE LISTAGEM PAGINADA (GET) ---
+# Cada seção do frontend busca só a sua listagem, página por página, em vez de /api/data inteiro.
+# Parâmetros: limit/offset (paginação), search (busca por texto), fields (campos separados
+# por vírgula) e os filtros de LIST_FILTERS (ex.: /api/matriculas?turma_id=...).
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+def _referenced_records(table, records):
+    """Registros referenciados por records (e pelos que eles referenciam), uma vez cada.
+
+    Retorna {tabela: {id: registro}}, no formato "refs" das listagens normalizadas.
+    """
+    refs = {}
+    pending = [(table, records)]
+    while pending:
+        source, source_records = pending.pop()
+        for field, target in REFERENCES.get(source, {}).items():
+            found = refs.setdefault(target, {})
+            ids = {record[field] for record in source_records} - found.keys()
+            if not ids:
+                continue
+            fields = TABLES[target][1]
+            new = [{name: row[name] for name in fields} for row in store.list_rows(target, ids).values()]
+            found.update((record['id'], record) for record in new)
+            pending.append((target, new))
+    return refs
+
+def _list_response(table):
+    response_format = _response_format()
+    if response_format is None:
+        return _invalid_format()
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'Os parâmetros limit e offset devem ser números inteiros.'}), 400
+    if not 1 <= limit <= MAX_PAGE_SIZE or offset < 0:
+        return jsonify({'error': f'limit deve estar entre 1 e {MAX_PAGE_SIZE} e offset não pode ser negativo.'}), 400
+
+    filters = {field: request.args[field] for field in LIST_FILTERS.get(table, ()) if request.args.get(field)}
+    with store.consistent_read():  # as referências são da mesma versão dos dados da página
+        rows, total = store.list_page(table, offset, limit, request.args.get('search'), **filters)
+        if response_format == 'normalized':
+            rows = [{field: row[field] for field in TABLES[table][1]} for row in rows]
+            refs = _referenced_records(table, rows)
+
+    for row in rows:
+        row['version'] = record_version(table, row) # Enviada de volta em If-Match ao editar/remover
+
+    fields = request.args.get('fields')
+    if fields:
+        selected = fields.split(',')
+        rows = [{field: row[field] for field in selected if field in row} for row in rows]
+
+    result = {
+        'items': rows,
+        'total': total,
+        'limit': limit,
+        'offset': offset,
+        'next_offset': offset + limit if offset + limit < total else None
+    }
+    if response_format == 'normalized':
+        result['refs'] = refs
+    return jsonify(result)
+
+@app.route('/api/turmas', methods=['GET'])
+@cached_response
+def list_turmas():
+    return _list_response('turmas')
+
+@app.route('/api/disciplinas_catalogo', methods=['GET'])
+@cached_response
+def list_disciplinas_catalogo():
+    return _list_response('disciplinas_catalogo')
+
+@app.route('/api/alunos', methods=['GET'])
+@cached_response
+def list_alunos():
+    return _list_response('alunos')
+
+@app.route('/api/turma_disciplinas_ofertas', methods=['GET'])
+@cached_response
+def list_ofertas_disciplina():
+    return _list_response('turma_disciplinas_ofertas')
+
+@app.route('/api/matriculas', methods=['GET'])
+@cached_response
+def list_matriculas():
+    return _list_response('matriculas')
+
+# --- AUTOCOMPLETAR ---
+# /api/search?q=jo[&entity=alunos][&limit=10]: sugestões por nome/código/matrícula, sem
+# diferenciar acentos, rápidas o bastante para serem pedidas a cada tecla digitada.
+
+DEFAULT_SUGGESTIONS = 10
+MAX_SUGGESTIONS = 50
+
+@app.route('/api/search', methods=['GET'])
+@cached_response
+def search_suggestions():
+    entities = [request.args['entity']] if request.args.get('entity') else list(SEARCH_FIELDS)
+    if any(entity not in SEARCH_FIELDS for entity in entities):
+        return jsonify({'error': f'Entidade inválida. Use uma destas: {", ".join(SEARCH_FIELDS)}.'}), 400
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SUGGESTIONS))
+    except ValueError:
+        return jsonify({'error': 'O parâmetro limit deve ser um número inteiro.'}), 400
+    if not 1 <= limit <= MAX_SUGGESTIONS:
+        return jsonify({'error': f'limit deve estar entre 1 e {MAX_SUGGESTIONS}.'}), 400
+
+    term = request.args.get('q', '')
+    return jsonify({entity: store.suggest(entity, term, limit) for entity in entities})
+
+# --- ESTATÍSTICAS ---
+# /api/stats[?limit=10]: totais, médias e rankings (ofertas com mais alunos, turmas com mais
+# ofertas, professores com mais matrículas, alunos com mais disciplinas). Os contadores são
+# atualizados a cada alteração, então a leitura não percorre as matrículas.
+
+DEFAULT_STATS_LIMIT = 10
+MAX_STATS_LIMIT = 1000
+
+@app.route('/api/stats', methods=['GET'])
+@cached_response
+def get_stats():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_STATS_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'O parâmetro limit deve ser um número inteiro.'}), 400
+    if not 1 <= limit <= MAX_STATS_LIMIT:
+        return jsonify({'error': f'limit deve estar entre 1 e {MAX_STATS_LIMIT}.'}), 400
+    return jsonify(store.stats(limit))
+
+# --- FEED DE ALTERAÇÕES ---
+# Cada inserção, alteração e remoção gera um evento {seq, op, entity, id, record}, com seq crescente.
+# /api/changes?since=N devolve os posteriores a N; /api/changes/stream os envia em tempo real
+# (Server-Sent Events), retomando do cabeçalho Last-Event-ID ao reconectar.
+
+MAX_CHANGES = 1000
+
+@app.route('/api/changes', methods=['GET'])
+def list_changes():
+    try:
+        since = int(request.args['since'])
+        limit = int(request.args.get('limit', change_feed.PAGE_SIZE))
+    except (KeyError, ValueError):
+        return jsonify({'error': 'Informe since (e, opcionalmente, limit) como números inteiros.'}), 400
+    if since < 0 or not 1 <= limit <= MAX_CHANGES:
+        return jsonify({'error': f'since não pode ser negativo e limit deve estar entre 1 e {MAX_CHANGES}.'}), 400
+
+    changes, last_seq = store.changes_since(since, limit)
+    if changes is None:  # eventos já descartados: o cliente recarrega tudo e continua de last_seq
+        return jsonify({'reset': True, 'last_seq': last_seq, 'changes': []})
+    reset_seq = change_feed.reset_seq(changes)
+    if reset_seq is not None:  # dados trocados (restauração de backup): idem, a partir do reset
+        return jsonify({'reset': True, 'last_seq': reset_seq, 'changes': []})
+    return jsonify({'reset': False, 'last_seq': last_seq, 'changes': change_feed.with_records(store, changes)})
+
+@app.route('/api/changes/stream', methods=['GET'])
+def stream_changes():
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if since is None:
+        since = store.last_change_seq()
+    else:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'error': 'since (ou Last-Event-ID) deve ser um número inteiro.'}), 400
+    if not change_stream_slots.acquire(blocking=False):
+        # Todas as vagas de stream deste processo ocupadas: sem prender mais uma thread
+        retry_seconds = change_feed.RETRY_MS // 1000
+        return Response(f'retry: {change_feed.RETRY_MS}\n\n', status=503, mimetype='text/event-stream',
+                        headers={'Retry-After': str(retry_seconds), 'Cache-Control': 'no-cache'})
+    events = change_feed.iter_events(store, since, app.config['CHANGE_STREAM_SECONDS'])
+    response = Response(events, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(change_stream_slots.release)  # chamado pelo servidor ao fim da conexão
+    return response
+
 # --- ROTAS DE ADIÇÃO (POST) ---
+# As validações ficam em operations.py; um OperationError vira a resposta de erro (ver handle_operation_error)
+
+@app.errorhandler(OperationError)
+def handle_operation_error(error):
+    return jsonify({'error': error.message}), error.status
 
 @app.route('/api/turmas', methods=['POST'])
+@with_store_lock
 def add_turma():
-    data = request.json
-    nome = data.get('nome')
-    if not nome:
-        return jsonify({'error': 'Nome da turma é obrigatório.'}), 400
-    
-    raw_data = _read_raw_data_from_files()
-    new_id = generate_id()
-    raw_data['turmas_raw'][new_id] = {'id': new_id, 'nome': nome}
-    write_raw_data_to_files(raw_data)
+    new_id = operations.create_turma(store, request.json)
     return jsonify({'message': 'Turma adicionada com sucesso!', 'id': new_id}), 201
 
 @app.route('/api/disciplinas_catalogo', methods=['POST'])
+@with_store_lock
 def add_disciplina_catalogo():
-    data = request.json
-    codigo = data.get('codigo')
-    nome = data.get('nome')
-    if not codigo or not nome:
-        return jsonify({'error': 'Código e nome da disciplina são obrigatórios.'}), 400
-    
-    raw_data = _read_raw_data_from_files()
-    
-    # Verifica se já existe uma disciplina com o mesmo código
-    if any(d['codigo'] == codigo for d in raw_data['disciplinas_catalogo_raw'].values()):
-        return jsonify({'error': 'Já existe uma disciplina com este código.'}), 409 # Conflict
-        
-    new_id = generate_id()
-    raw_data['disciplinas_catalogo_raw'][new_id] = {'id': new_id, 'codigo': codigo, 'nome': nome}
-    write_raw_data_to_files(raw_data)
+    new_id = operations.create_disciplina_catalogo(store, request.json)
     return jsonify({'message': 'Disciplina adicionada ao catálogo com sucesso!', 'id': new_id}), 201
 
 @app.route('/api/alunos', methods=['POST'])
+@with_store_lock
 def add_aluno():
-    data = request.json
-    matricula = data.get('matricula')
-    nome = data.get('nome')
-    telefone = data.get('telefone')
-    if not matricula or not nome or not telefone:
-        return jsonify({'error': 'Matrícula, nome e telefone do aluno são obrigatórios.'}), 400
-
-    raw_data = _read_raw_data_from_files()
-    # Verifica se a matrícula já existe
-    if any(a['matricula'] == matricula for a in raw_data['alunos_raw'].values()):
-        return jsonify({'error': 'Já existe um aluno com esta matrícula.'}), 409 # Conflict
-
-    new_id = generate_id()
-    raw_data['alunos_raw'][new_id] = {'id': new_id, 'matricula': matricula, 'nome': nome, 'telefone': telefone}
-    write_raw_data_to_files(raw_data)
+    new_id = operations.create_aluno(store, request.json)
     return jsonify({'message': 'Aluno adicionado com sucesso!', 'id': new_id}), 201
 
 @app.route('/api/turma_disciplinas_ofertas', methods=['POST'])
+@with_store_lock
 def add_oferta_disciplina():
-    data = request.json
-    turma_id = data.get('turma_id')
-    disciplina_catalogo_id = data.get('disciplina_catalogo_id')
-    professor = data.get('professor')
-
-    if not turma_id or not disciplina_catalogo_id or not professor:
-        return jsonify({'error': 'Todos os campos (turma, disciplina e professor) são obrigatórios para a oferta.'}), 400
-
-    raw_data = _read_raw_data_from_files()
-
-    if turma_id not in raw_data['turmas_raw']:
-        return jsonify({'error': 'Turma não encontrada.'}), 404
-    if disciplina_catalogo_id not in raw_data['disciplinas_catalogo_raw']:
-        return jsonify({'error': 'Disciplina do catálogo não encontrada.'}), 404
-    
-    # Verifica se a oferta já existe para evitar duplicatas
-    if any(o['turma_id'] == turma_id and o['disciplina_catalogo_id'] == disciplina_catalogo_id 
-           for o in raw_data['turma_disciplinas_ofertas_raw'].values()):
-        return jsonify({'error': 'Esta disciplina já está sendo ofertada nesta turma.'}), 409
-
-    new_id = generate_id()
-    raw_data['turma_disciplinas_ofertas_raw'][new_id] = {
-        'id': new_id, 
-        'turma_id': turma_id, 
-        'disciplina_catalogo_id': disciplina_catalogo_id, 
-        'professor': professor
-    }
-    write_raw_data_to_files(raw_data)
+    new_id = operations.create_oferta_disciplina(store, request.json)
     return jsonify({'message': 'Oferta de disciplina adicionada com sucesso!', 'id': new_id}), 201
 
 @app.route('/api/matriculas', methods=['POST'])
+@with_store_lock
 def add_matricula():
-    data = request.json
-    aluno_id = data.get('aluno_id')
-    turma_disciplina_id = data.get('turma_disciplina_id')
-
-    if not aluno_id or not turma_disciplina_id:
-        return jsonify({'error': 'Aluno e oferta de disciplina são obrigatórios para a matrícula.'}), 400
-    
-    raw_data = _read_raw_data_from_files()
-    
-    if aluno_id not in raw_data['alunos_raw']:
-        return jsonify({'error': 'Aluno não encontrado.'}), 404
-    if turma_disciplina_id not in raw_data['turma_disciplinas_ofertas_raw']:
-        return jsonify({'error': 'Oferta de disciplina não encontrada.'}), 404
-    
-    # Verifica se o aluno já está matriculado nesta oferta
-    if any(m['aluno_id'] == aluno_id and m['turma_disciplina_id'] == turma_disciplina_id for m in raw_data['matriculas_raw'].values()):
-        return jsonify({'error': 'Este aluno já está matriculado nesta oferta de disciplina.'}), 409
-
-    matricula_id = generate_id()
-    new_matricula = {
-        'id': matricula_id,
-        'aluno_id': aluno_id,
-        'turma_disciplina_id': turma_disciplina_id
-    }
-    raw_data['matriculas_raw'][matricula_id] = new_matricula
+    matricula_id = operations.create_matricula(store, request.json)
+    return jsonify({'message': 'Matrícula realizada com sucesso!', 'id': matricula_id}), 201
 
-    write_raw_data_to_files(raw_data)
 
-    return jsonify({'message': 'Matrícula realizada com sucesso!', 'id': matricula_id}), 201
+# --- IMPORTAÇÃO EM LOTE ---
+# Corpo da requisição em CSV (com cabeçalho) ou JSON Lines. Ele é recebido inteiro em um arquivo
+# temporário antes da transação: um upload lento não segura a trava do armazenamento. Ex.:
+#   curl -X POST --data-binary @alunos.csv -H 'Content-Type: text/csv' localhost:5000/api/import/alunos
+
+@app.route('/api/import/<entity>', methods=['POST'])
+def import_entity(entity):
+    if entity not in operations.CREATORS:
+        return jsonify({'error': 'Entidade desconhecida.'}), 404
+    fmt = request.args.get('format') or ('jsonl' if 'json' in request.mimetype else 'csv')
+    if fmt not in importer.IMPORT_FORMATS:
+        return jsonify({'error': f'Formato inválido. Use um destes: {", ".join(importer.IMPORT_FORMATS)}.'}), 400
+
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    with tempfile.TemporaryFile() as body:
+        shutil.copyfileobj(request.stream, body)
+        body.seek(0)
+        try:
+            stream = importer.open_text(body, request.args.get('encoding') or importer.DEFAULT_ENCODING)
+            report = importer.import_rows(store, entity, importer.iter_rows(stream, fmt), dry_run=dry_run)
+        except importer.ImportFileError as e:
+            return jsonify({'error': e.message}), 400
+    return jsonify(report), 200
+
+
+# --- OPERAÇÕES EM LOTE ---
+# {"operations": [{"op": "create", "entity": "turma_disciplinas_ofertas", "ref": "oferta", "data": {...}},
+#                 {"op": "create", "entity": "matriculas", "data": {"aluno_id": "...", "turma_disciplina_id": {"$ref": "oferta"}}},
+#                 {"op": "update", "entity": "alunos", "id": "...", "version": "...", "data": {...}},
+#                 {"op": "delete", "entity": "matriculas", "id": "..."}]}
+# Tudo ou nada: se uma operação falhar, nenhuma é aplicada.
+
+@app.route('/api/batch', methods=['POST'])
+def batch_operations():
+    body = request.get_json(silent=True)
+    operations_list = body.get('operations') if isinstance(body, dict) else None
+    if not isinstance(operations_list, list) or not operations_list:
+        return jsonify({'error': 'Envie {"operations": [...]} com ao menos uma operação.'}), 400
+    if len(operations_list) > batch.MAX_BATCH_OPERATIONS:
+        return jsonify({'error': f'O lote pode ter no máximo {batch.MAX_BATCH_OPERATIONS} operações.'}), 400
+
+    dry_run = request.args.get('dry_run') in ('1', 'true')
+    report = batch.run_batch(store, operations_list, dry_run=dry_run)
+    failure = next((result for result in report['results'] if 'error' in result), None)
+    if failure:
+        report['error'] = failure['error']
+        return jsonify(report), failure['status']
+    return jsonify(report), 200
+
+
+# --- EXPORTAÇÃO DE MATRÍCULAS ---
+# Relatório de alunos por oferta (turma + disciplina + professor), gerado em streaming. Ex.:
+#   curl 'localhost:5000/api/export/matriculas?format=csv&disciplina_codigo=MAT101' -o matriculas.csv
+
+def _roster_filters(turma_id=None, disciplina_catalogo_id=None, disciplina_codigo=None, professor=None):
+    """Filtros de store.iter_roster; a disciplina pode ser indicada pelo código."""
+    if disciplina_codigo and not disciplina_catalogo_id:
+        disciplina_catalogo_id = store.find_unique('disciplinas_catalogo', codigo=disciplina_codigo)
+        if not disciplina_catalogo_id:
+            raise OperationError('Disciplina do catálogo não encontrada.', 404)
+    return {'turma_id': turma_id, 'disciplina_catalogo_id': disciplina_catalogo_id, 'professor': professor}
+
+@app.route('/api/export/matriculas', methods=['GET'])
+def export_matriculas():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporter.EXPORT_FORMATS:
+        return jsonify({'error': f'Formato inválido. Use um destes: {", ".join(exporter.EXPORT_FORMATS)}.'}), 400
+    filters = _roster_filters(**{k: request.args.get(k) for k in
+                                 ('turma_id', 'disciplina_catalogo_id', 'disciplina_codigo', 'professor')})
+    chunks = exporter.iter_export(store.iter_roster(**filters), fmt)
+    return Response(chunks, mimetype=exporter.EXPORT_MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=matriculas.{fmt}'})
 
 
 # --- ROTAS DE ATUALIZAÇÃO (PUT) ---
+# Validações em operations.py; o cabeçalho If-Match (versão do registro) é repassado a elas
+
 @app.route('/api/turmas/<turma_id>', methods=['PUT'])
+@with_store_lock
 def update_turma(turma_id):
-    data = request.json
-    nome = data.get('nome')
-    if not nome:
-        return jsonify({'error': 'Nome da turma é obrigatório.'}), 400
-
-    raw_data = _read_raw_data_from_files()
-    if turma_id not in raw_data['turmas_raw']:
-        return jsonify({'error': 'Turma não encontrada.'}), 404
-    
-    raw_data['turmas_raw'][turma_id]['nome'] = nome
-    write_raw_data_to_files(raw_data)
+    operations.update_turma(store, turma_id, request.json, request.headers.get('If-Match'))
     return jsonify({'message': 'Turma atualizada com sucesso!'}), 200
 
 @app.route('/api/disciplinas_catalogo/<disciplina_id>', methods=['PUT'])
+@with_store_lock
 def update_disciplina_catalogo(disciplina_id):
-    data = request.json
-    codigo = data.get('codigo')
-    nome = data.get('nome')
-    if not codigo or not nome:
-        return jsonify({'error': 'Código e nome da disciplina são obrigatórios.'}), 400
-
-    raw_data = _read_raw_data_from_files()
-    if disciplina_id not in raw_data['disciplinas_catalogo_raw']:
-        return jsonify({'error': 'Disciplina do catálogo não encontrada.'}), 404
-    
-    # Check for duplicate code (excluding the current discipline being updated)
-    if any(d['codigo'] == codigo and d_id != disciplina_id 
-           for d_id, d in raw_data['disciplinas_catalogo_raw'].items()):
-        return jsonify({'error': 'Já existe outra disciplina com este código.'}), 409
-        
-    raw_data['disciplinas_catalogo_raw'][disciplina_id]['codigo'] = codigo
-    raw_data['disciplinas_catalogo_raw'][disciplina_id]['nome'] = nome
-    write_raw_data_to_files(raw_data)
+    operations.update_disciplina_catalogo(store, disciplina_id, request.json, request.headers.get('If-Match'))
     return jsonify({'message': 'Disciplina do catálogo atualizada com sucesso!'}), 200
 
 @app.route('/api/alunos/<aluno_id>', methods=['PUT'])
+@with_store_lock
 def update_aluno(aluno_id):
-    data = request.json
-    matricula = data.get('matricula')
-    nome = data.get('nome')
-    telefone = data.get('telefone')
-    if not matricula or not nome or not telefone:
-        return jsonify({'error': 'Matrícula, nome e telefone do aluno são obrigatórios.'}), 400
-
-    raw_data = _read_raw_data_from_files()
-    if aluno_id not in raw_data['alunos_raw']:
-        return jsonify({'error': 'Aluno não encontrado.'}), 404
-
-    # Check for duplicate matricula (excluding the current student being updated)
-    if any(a['matricula'] == matricula and a_id != aluno_id 
-           for a_id, a in raw_data['alunos_raw'].items()):
-        return jsonify({'error': 'Já existe outro aluno com esta matrícula.'}), 409
-
-    raw_data['alunos_raw'][aluno_id]['matricula'] = matricula
-    raw_data['alunos_raw'][aluno_id]['nome'] = nome
-    raw_data['alunos_raw'][aluno_id]['telefone'] = telefone
-    write_raw_data_to_files(raw_data)
+    operations.update_aluno(store, aluno_id, request.json, request.headers.get('If-Match'))
     return jsonify({'message': 'Aluno atualizado com sucesso!'}), 200
 
 @app.route('/api/turma_disciplinas_ofertas/<oferta_id>', methods=['PUT'])
+@with_store_lock
 def update_oferta_disciplina(oferta_id):
-    data = request.json
-    professor = data.get('professor')
-    if not professor:
-        return jsonify({'error': 'Professor é obrigatório.'}), 400
-
-    raw_data = _read_raw_data_from_files()
-    if oferta_id not in raw_data['turma_disciplinas_ofertas_raw']:
-        return jsonify({'error': 'Oferta de disciplina não encontrada.'}), 404
-    
-    raw_data['turma_disciplinas_ofertas_raw'][oferta_id]['professor'] = professor
-    write_raw_data_to_files(raw_data)
+    operations.update_oferta_disciplina(store, oferta_id, request.json, request.headers.get('If-Match'))
     return jsonify({'message': 'Oferta de disciplina atualizada com sucesso!'}), 200
 
-
 # --- ROTAS DE REMOÇÃO (DELETE) ---
 
 @app.route('/api/turmas/<turma_id>', methods=['DELETE'])
+@with_store_lock
 def delete_turma(turma_id):
-    raw_data = _read_raw_data_from_files()
-    
-    if turma_id not in raw_data['turmas_raw']:
-        return jsonify({'error': 'Turma não encontrada.'}), 404
-
-    # Check for associated offers (disciplines in this turma)
-    if any(o['turma_id'] == turma_id for o in raw_data['turma_disciplinas_ofertas_raw'].values()):
-        return jsonify({'error': 'Não é possível remover a turma: existem ofertas de disciplinas associadas a ela.'}), 409
-    
-    del raw_data['turmas_raw'][turma_id]
-    write_raw_data_to_files(raw_data)
+    operations.delete_turma(store, turma_id, request.headers.get('If-Match'))
     return jsonify({'message': 'Turma removida com sucesso!'}), 200
 
 @app.route('/api/disciplinas_catalogo/<disciplina_id>', methods=['DELETE'])
+@with_store_lock
 def delete_disciplina_catalogo(disciplina_id):
-    raw_data = _read_raw_data_from_files()
-    
-    if disciplina_id not in raw_data['disciplinas_catalogo_raw']:
-        return jsonify({'error': 'Disciplina do catálogo não encontrada.'}), 404
-
-    # Check for associated offers (if this catalog discipline is offered in any turma)
-    if any(o['disciplina_catalogo_id'] == disciplina_id for o in raw_data['turma_disciplinas_ofertas_raw'].values()):
-        return jsonify({'error': 'Não é possível remover a disciplina do catálogo: existem ofertas associadas a ela em turmas.'}), 409
-    
-    del raw_data['disciplinas_catalogo_raw'][disciplina_id]
-    write_raw_data_to_files(raw_data)
+    operations.delete_disciplina_catalogo(store, disciplina_id, request.headers.get('If-Match'))
     return jsonify({'message': 'Disciplina do catálogo removida com sucesso!'}), 200
 
 @app.route('/api/alunos/<aluno_id>', methods=['DELETE'])
+@with_store_lock
 def delete_aluno(aluno_id):
-    raw_data = _read_raw_data_from_files()
-    
-    if aluno_id not in raw_data['alunos_raw']:
-        return jsonify({'error': 'Aluno não encontrado.'}), 404
-        
-    # Check for associated enrollments (if this student is matriculated in any discipline offer)
-    if any(m['aluno_id'] == aluno_id for m in raw_data['matriculas_raw'].values()):
-        return jsonify({'error': 'Não é possível remover o aluno: existem matrículas associadas a ele.'}), 409
-
-    del raw_data['alunos_raw'][aluno_id]
-    write_raw_data_to_files(raw_data)
+    operations.delete_aluno(store, aluno_id, request.headers.get('If-Match'))
     return jsonify({'message': 'Aluno removido com sucesso!'}), 200
 
 @app.route('/api/turma_disciplinas_ofertas/<oferta_id>', methods=['DELETE'])
+@with_store_lock
 def delete_oferta_disciplina(oferta_id):
-    raw_data = _read_raw_data_from_files()
-    
-    if oferta_id not in raw_data['turma_disciplinas_ofertas_raw']:
-        return jsonify({'error': 'Oferta de disciplina não encontrada.'}), 404
-
-    # Check for associated enrollments (if students are matriculated in this offer)
-    if any(m['turma_disciplina_id'] == oferta_id for m in raw_data['matriculas_raw'].values()):
-        return jsonify({'error': 'Não é possível remover esta oferta de disciplina: existem matrículas de alunos associadas a ela.'}), 409
-
-    del raw_data['turma_disciplinas_ofertas_raw'][oferta_id]
-    write_raw_data_to_files(raw_data)
+    operations.delete_oferta_disciplina(store, oferta_id, request.headers.get('If-Match'))
     return jsonify({'message': 'Oferta de disciplina removida com sucesso!'}), 200
 
 @app.route('/api/matriculas/<matricula_id>', methods=['DELETE'])
+@with_store_lock
 def delete_matricula(matricula_id):
-    raw_data = _read_raw_data_from_files()
-    
-    if matricula_id not in raw_data['matriculas_raw']:
-        return jsonify({'error': 'Matrícula não encontrada.'}), 404
-    
-    del raw_data['matriculas_raw'][matricula_id]
-    write_raw_data_to_files(raw_data)
-
+    operations.delete_matricula(store, matricula_id, request.headers.get('If-Match'))
     return jsonify({'message': 'Matrícula removida com sucesso!'}), 200
 
+# --- COMANDOS DE LINHA DE COMANDO ---
+
+@app.cli.command('migrate-to-sqlite')
+@click.option('--data-dir', default=DATA_DIR, show_default=True, help='Diretório com os arquivos .txt.')
+@click.option('--db', 'db_path', default=None, help='Arquivo do banco (padrão: SQLITE_PATH).')
+def migrate_to_sqlite(data_dir, db_path):
+    """Importa os arquivos .txt para o banco SQLite."""
+    db_path = db_path or app.config['SQLITE_PATH']
+    report = import_txt_data(data_dir, db_path)
+    for table, (imported, skipped) in report.items():
+        click.echo(f'{table}: {imported} importados, {skipped} ignorados')
+    click.echo(f'Banco criado em {db_path}. Use STORAGE_BACKEND=sqlite para utilizá-lo.')
+
+@app.cli.command('import')
+@click.argument('entity', type=click.Choice(list(operations.CREATORS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(importer.IMPORT_FORMATS), default=None,
+              help='Formato do arquivo (padrão: pela extensão; .jsonl/.ndjson = jsonl, senão csv).')
+@click.option('--encoding', default=importer.DEFAULT_ENCODING, show_default=True,
+              help='Codificação do arquivo (ex.: latin-1).')
+@click.option('--dry-run', is_flag=True, help='Apenas valida, sem gravar.')
+def import_command(entity, path, fmt, encoding, dry_run):
+    """Importa registros de ENTITY a partir de um arquivo CSV ou JSON Lines."""
+    fmt = fmt or importer.format_from_filename(path)
+    with open(path, 'rb') as f:
+        try:
+            report = importer.import_rows(store, entity, importer.iter_rows(importer.open_text(f, encoding), fmt),
+                                          dry_run=dry_run)
+        except importer.ImportFileError as e:
+            raise click.ClickException(e.message)
+    for error in report['errors']:
+        click.echo(f"linha {error['line']}: {error['error']}", err=True)
+    verb = 'válidos' if dry_run else 'importados'
+    click.echo(f"{entity}: {report['imported']} {verb}, {report['error_count']} com erro")
+
+@app.cli.command('export-matriculas')
+@click.option('--format', 'fmt', type=click.Choice(exporter.EXPORT_FORMATS), default='csv', show_default=True)
+@click.option('--turma-id', default=None, help='Apenas as ofertas desta turma.')
+@click.option('--disciplina-codigo', default=None, help='Apenas as ofertas desta disciplina.')
+@click.option('--professor', default=None, help='Apenas as ofertas deste professor (nome exato).')
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8', lazy=True), default='-',
+              help='Arquivo de saída (padrão: saída padrão).')
+def export_matriculas_command(fmt, turma_id, disciplina_codigo, professor, output):
+    """Exporta as matrículas (alunos por oferta de disciplina) em CSV ou JSON Lines."""
+    try:
+        filters = _roster_filters(turma_id=turma_id, disciplina_codigo=disciplina_codigo, professor=professor)
+    except OperationError as e:
+        raise click.ClickException(e.message)
+    for chunk in exporter.iter_export(store.iter_roster(**filters), fmt):
+        output.write(chunk)
+
+@app.cli.command('backup')
+@click.option('-o', '--output', default=None,
+              help='Arquivo do backup (padrão: BACKUP_DIR/faculdade-<data>-<hora>.tar.gz).')
+def backup_command(output):
+    """Grava um backup de todos os dados (.tar.gz), com o servidor no ar."""
+    output = output or os.path.join(app.config['BACKUP_DIR'], time.strftime('faculdade-%Y%m%d-%H%M%S.tar.gz'))
+    manifest = backup.create_backup(store, output)
+    for table, info in manifest['tables'].items():
+        click.echo(f"{table}: {info['records']} registros")
+    click.echo(f"Backup gravado em {output} (alterações até o evento {manifest['last_change_seq']}).")
+
+@app.cli.command('restore')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--check', 'check_only', is_flag=True, help='Apenas valida o backup, sem restaurar.')
+def restore_command(path, check_only):
+    """Troca todos os dados pelos de um backup, depois de conferir checksums e referências."""
+    try:
+        manifest = backup.restore_backup(store, path, check_only=check_only)
+    except backup.BackupError as e:
+        for problem in e.problems[:backup.MAX_REPORTED_PROBLEMS]:
+            click.echo(problem, err=True)
+        raise click.ClickException(e.message)
+    total = sum(info['records'] for info in manifest['tables'].values())
+    verb = 'válido' if check_only else 'restaurado'
+    click.echo(f"Backup de {manifest['created_at']} {verb}: {total} registros.")
+
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,281 @@
+"""Modo ASGI: serve o app Flask em um loop asyncio (ex.: `uvicorn asgi:app --workers 4`).
+
+As rotas continuam as do app.py, executadas em um pool de ASGI_THREADS threads por processo.
+O loop cuida das conexões: uma conexão ociosa (keep-alive), um upload lento ou um download
+lento não prendem uma thread, que só é usada enquanto a rota trabalha. O stream de alterações
+(/api/changes/stream) é servido direto no loop, sem thread por conexão: uma única thread
+espera por alterações e acorda todos os streams abertos.
+"""
+import asyncio
+import concurrent.futures
+import io
+import os
+import sys
+from urllib.parse import parse_qs
+
+import change_feed
+import metrics
+from app import app as flask_app, store
+
+THREADS = int(os.environ.get('ASGI_THREADS', 32))
+# Bytes da resposta obtidos do app a cada passo (respostas maiores vão em partes, como a exportação)
+CHUNK_BYTES = 64 * 1024
+
+STREAM_PATH = '/api/changes/stream'
+
+
+class _RequestBody(io.RawIOBase):
+    """wsgi.input: lê o corpo da requisição do loop à medida que a rota o consome."""
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = b''
+        self._more = True
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buffer and self._more:
+            message = asyncio.run_coroutine_threadsafe(self._receive(), self._loop).result()
+            if message['type'] == 'http.disconnect':
+                raise OSError('Conexão encerrada pelo cliente durante o envio do corpo.')
+            self._buffer = message.get('body', b'')
+            self._more = message.get('more_body', False)
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def _environ(scope, body):
+    """Ambiente WSGI (PEP 3333) equivalente ao scope HTTP do ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope["http_version"]}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.input_terminated': True,  # o corpo pode vir sem Content-Length (chunked)
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        key = name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else f'HTTP_{name}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _read_chunks(iterator):
+    """Lê do corpo da resposta até CHUNK_BYTES. Retorna (bytes, se o corpo terminou)."""
+    chunks, size = [], 0
+    for chunk in iterator:
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= CHUNK_BYTES:
+            return b''.join(chunks), False
+    return b''.join(chunks), True
+
+
+class _ChangeNotifier:
+    """Espera, em uma única thread, por alterações no armazenamento e acorda os streams do loop.
+
+    Alterações deste processo acordam na hora; as de outros processos, em até POLL_SECONDS.
+    """
+
+    def __init__(self):
+        self.seq = None  # último seq visto pela thread
+        self.changed = None  # asyncio.Event trocado a cada alteração
+        self._thread = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='change-notifier')
+        self._task = None
+
+    async def wait(self, since, timeout):
+        """Espera até haver um evento posterior a since (ou até timeout segundos)."""
+        if self._task is None:  # começa com o primeiro stream, no loop do servidor
+            self.changed = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        if self.seq is not None and self.seq > since:
+            return
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if self.seq is not None:
+                    await loop.run_in_executor(self._thread, store.wait_for_changes, self.seq,
+                                               change_feed.POLL_SECONDS)
+                seq = await loop.run_in_executor(self._thread, store.last_change_seq)
+            except Exception as e:  # ex.: banco ocupado; tenta de novo na próxima volta
+                flask_app.logger.warning('Erro ao esperar por alterações: %r', e)
+                await asyncio.sleep(change_feed.POLL_SECONDS)
+                continue
+            if seq != self.seq:
+                self.seq = seq
+                self.changed.set()
+                self.changed = asyncio.Event()
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+        self._thread.shutdown(wait=False)
+
+
+class AsgiApp:
+    """Aplicação ASGI que repassa as requisições HTTP ao app WSGI (ver o início do módulo)."""
+
+    def __init__(self, wsgi_app, threads=THREADS):
+        self.wsgi_app = wsgi_app
+        self.pool = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='asgi')
+        self.notifier = _ChangeNotifier()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            since = self._stream_since(scope)
+            if since is not None:
+                await self._change_stream(since, receive, send)
+            else:
+                await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.notifier.close()
+                self.pool.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+
+    async def _wsgi(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        environ = _environ(scope, io.BufferedReader(_RequestBody(receive, loop)))
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('started'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                                   for name, value in headers]
+
+        def call_app():
+            iterable = self.wsgi_app(environ, start_response)
+            return iterable, iter(iterable)
+
+        iterable, iterator = await self._run(call_app)
+        # Resposta sem Content-Length (em partes, como a exportação): o gerador pode guardar
+        # objetos presos à thread que o começou (ex.: a conexão SQLite do relatório), então todas
+        # as partes e o close são feitos por uma thread só desta resposta. As demais já estão
+        # inteiras na memória e são lidas no pool.
+        streamed = all(name != b'content-length' for name, _ in response.get('headers', ()))
+        reader = (concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='asgi-stream')
+                  if streamed else self.pool)
+
+        async def run(func, *args):
+            return await loop.run_in_executor(reader, func, *args)
+
+        try:
+            body, done = await run(_read_chunks, iterator)
+            await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+            response['started'] = True
+            while not done:
+                if body:
+                    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+                body, done = await run(_read_chunks, iterator)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+        finally:
+            try:
+                if hasattr(iterable, 'close'):
+                    await run(iterable.close)
+            finally:
+                if streamed:
+                    reader.shutdown(wait=False)
+
+    def _stream_since(self, scope):
+        """since de um GET válido a /api/changes/stream, ou None (a rota do app trata o resto, inclusive os erros)."""
+        if scope['method'] != 'GET' or scope['path'] != STREAM_PATH:
+            return None
+        headers = dict(scope['headers'])
+        value = headers.get(b'last-event-id', b'').decode('latin-1')
+        if not value:
+            value = (parse_qs(scope['query_string'].decode('latin-1')).get('since') or [''])[0]
+        if not value:
+            return -1  # a partir do último evento
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    async def _change_stream(self, since, receive, send):
+        """Mesmo stream de change_feed.iter_events, sem ocupar uma thread enquanto espera."""
+        loop = asyncio.get_running_loop()
+        if since < 0:
+            since = await self._run(store.last_change_seq)
+        metrics.registry.inc('faculdade_http_requests_total',
+                             (('method', 'GET'), ('endpoint', STREAM_PATH), ('status', '200')))
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+
+        disconnected = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({'type': 'http.response.body', 'body': f'retry: {change_feed.RETRY_MS}\n\n'.encode(),
+                        'more_body': True})
+            deadline = loop.time() + flask_app.config['CHANGE_STREAM_SECONDS']
+            last_message = loop.time()
+            while loop.time() < deadline and not disconnected.done():
+                messages, since, more = await self._run(change_feed.poll, store, since)
+                if messages:
+                    await send({'type': 'http.response.body', 'body': ''.join(messages).encode('utf-8'),
+                                'more_body': True})
+                    last_message = loop.time()
+                    if more:
+                        continue
+                elif loop.time() - last_message >= change_feed.HEARTBEAT_SECONDS:
+                    await send({'type': 'http.response.body', 'body': change_feed.HEARTBEAT.encode(),
+                                'more_body': True})
+                    last_message = loop.time()
+                timeout = min(change_feed.HEARTBEAT_SECONDS, max(0.0, deadline - loop.time()))
+                waiter = asyncio.ensure_future(self.notifier.wait(since, timeout))
+                await asyncio.wait([waiter, disconnected], return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            disconnected.cancel()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+
+# A página só abre o feed quando o stream não prende uma thread (ver index em app.py)
+flask_app.config['CHANGE_STREAM_NONBLOCKING'] = True
+app = AsgiApp(flask_app)
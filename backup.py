@@ -0,0 +1,172 @@
+"""Backup e restauração de todos os dados (flask backup / flask restore).
+
+O backup é um .tar.gz com um manifest.json e as tabelas no formato dos arquivos de dados
+("id|campo1|campo2"). O manifesto traz, para cada tabela, o número de registros e o SHA-256
+do arquivo. Vale para os dois backends: um backup do txt pode ser restaurado no SQLite e
+vice-versa.
+"""
+import datetime
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+
+from locking import unique_tmp_path
+from store import RECORD_TYPES, REFERENCES, TABLES, UNIQUE_KEYS, parse_table_lines, table_lines
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+# gzip 6 (padrão): o backup é gravado fora da trava, então o tempo de compressão não atrasa escritas
+COMPRESS_LEVEL = 6
+MAX_REPORTED_PROBLEMS = 20  # Problemas de integridade listados pelo comando (a contagem é completa)
+
+
+class BackupError(Exception):
+    """Backup ilegível, corrompido ou com dados inconsistentes (problems lista os registros)."""
+
+    def __init__(self, message, problems=()):
+        super().__init__(message)
+        self.message = message
+        self.problems = list(problems)
+
+
+def create_backup(store, path):
+    """Grava em path um backup de todos os dados, como estavam em um mesmo instante.
+
+    Dentro de store.consistent_read só se copiam as listas de registros (no DataStore, uma
+    cópia rasa em memória; no SQLite, uma transação de leitura, que não bloqueia quem escreve).
+    A gravação e a compressão ficam de fora. O arquivo aparece em path só quando completo.
+    Retorna o manifesto.
+    """
+    with store.consistent_read():
+        last_seq = store.last_change_seq()
+        records = {table: store.all_records(table) for table in TABLES}
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'last_change_seq': last_seq,  # o backup inclui as alterações até este evento do feed
+        'tables': {},
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = unique_tmp_path(path)
+    # O manifesto vai primeiro no arquivo, mas os checksums só se conhecem depois de gerar as
+    # tabelas: elas passam antes por arquivos temporários
+    spooled = {}
+    try:
+        for table, (filename, fields) in TABLES.items():
+            f = spooled[table] = tempfile.TemporaryFile()
+            digest = hashlib.sha256()
+            for line in table_lines(fields, records[table]):
+                data = line.encode('utf-8')
+                digest.update(data)
+                f.write(data)
+            manifest['tables'][table] = {'file': filename, 'records': len(records[table]),
+                                         'sha256': digest.hexdigest()}
+        records = None  # libera as cópias antes da compressão
+
+        with tarfile.open(tmp_path, 'w:gz', compresslevel=COMPRESS_LEVEL) as archive:
+            _add_file(archive, MANIFEST_FILE, json.dumps(manifest, indent=2).encode('utf-8'))
+            for table, f in spooled.items():
+                info = tarfile.TarInfo(TABLES[table][0])
+                info.size = f.tell()
+                info.mtime = int(time.time())
+                f.seek(0)
+                archive.addfile(info, f)
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        for f in spooled.values():
+            f.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return manifest
+
+
+def _add_file(archive, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    archive.addfile(info, io.BytesIO(data))
+
+
+def _read_file(archive, name):
+    try:
+        f = archive.extractfile(name)
+    except KeyError:
+        f = None
+    if f is None:
+        raise BackupError(f'O backup não contém {name}.')
+    with f:
+        return f.read()
+
+
+def read_backup(path):
+    """Lê um backup conferindo o manifesto, os checksums e as contagens.
+
+    Retorna (manifesto, {tabela: {id: registro}}). Levanta BackupError se o arquivo estiver
+    incompleto ou corrompido.
+    """
+    try:
+        with tarfile.open(path, 'r:gz') as archive:
+            manifest = json.loads(_read_file(archive, MANIFEST_FILE))
+            if manifest.get('format') != FORMAT_VERSION:
+                raise BackupError(f'Formato de backup não suportado: {manifest.get("format")}.')
+            tables = {}
+            for table, (filename, _) in TABLES.items():
+                expected = manifest['tables'][table]
+                data = _read_file(archive, filename)
+                if hashlib.sha256(data).hexdigest() != expected['sha256']:
+                    raise BackupError(f'{filename}: o checksum não confere (arquivo corrompido).')
+                tables[table] = parse_table_lines(data.decode('utf-8').splitlines(), RECORD_TYPES[table])
+                if len(tables[table]) != expected['records']:
+                    raise BackupError(f'{filename}: {len(tables[table])} registros válidos, mas o manifesto '
+                                      f'indica {expected["records"]} (linhas malformadas ou IDs repetidos).')
+    except (tarfile.TarError, EOFError, OSError, ValueError, KeyError, TypeError) as e:
+        raise BackupError(f'Não foi possível ler o backup: {e}') from e
+    return manifest, tables
+
+
+def check_integrity(tables):
+    """Lista os problemas de integridade das tabelas (vazia se estiver tudo certo).
+
+    Confere as chaves estrangeiras (ofertas -> turmas e disciplinas, matrículas -> alunos e
+    ofertas) consultando os dicionários {id: registro} das tabelas referenciadas, e as chaves
+    únicas com um dicionário por chave: uma passada por tabela, sem buscas aninhadas.
+    """
+    problems = []
+    for table, references in REFERENCES.items():
+        for record in tables[table].values():
+            for field, target in references.items():
+                if record[field] not in tables[target]:
+                    problems.append(f'{table} {record["id"]}: {field} {record[field]} não existe em {target}.')
+    for table, keys in UNIQUE_KEYS.items():
+        for key in keys:
+            seen = {}
+            for record in tables[table].values():
+                value = tuple(record[field] for field in key)
+                if value in seen:
+                    problems.append(f'{table} {record["id"]}: valor repetido em {", ".join(key)} '
+                                    f'(o mesmo do registro {seen[value]}).')
+                else:
+                    seen[value] = record['id']
+    return problems
+
+
+def restore_backup(store, path, check_only=False):
+    """Valida um backup e, se estiver íntegro, troca todos os dados pelos dele (store.replace_all).
+
+    Com check_only, apenas valida. Levanta BackupError se o backup estiver corrompido ou com
+    referências quebradas ou chaves repetidas; nesse caso nada é alterado. Retorna o manifesto.
+    """
+    manifest, tables = read_backup(path)
+    problems = check_integrity(tables)
+    if problems:
+        raise BackupError(f'O backup tem {len(problems)} problema(s) de integridade; nada foi restaurado.', problems)
+    if not check_only:
+        store.replace_all(tables)
+    return manifest
@@ -0,0 +1,84 @@
+from operations import CREATORS, DELETERS, UPDATERS, OperationError
+
+MAX_BATCH_OPERATIONS = 1000
+BATCH_OPS = ('create', 'update', 'delete')
+
+
+class _BatchAborted(Exception):
+    """Desfaz a transação do lote (operação com erro ou dry_run)."""
+
+
+def _resolve(value, refs):
+    """Troca {"$ref": nome} pelo ID criado pela operação do lote que declarou "ref": nome."""
+    if isinstance(value, dict):
+        if set(value) == {'$ref'}:
+            if value['$ref'] not in refs:
+                raise OperationError(f'Referência desconhecida: {value["$ref"]}.', 400)
+            return refs[value['$ref']]
+        return {key: _resolve(item, refs) for key, item in value.items()}
+    return value
+
+
+def _run_operation(store, operation, refs):
+    """Executa uma operação do lote e retorna (status, id do registro)."""
+    if not isinstance(operation, dict):
+        raise OperationError('Cada operação deve ser um objeto JSON.', 400)
+    op, entity = operation.get('op'), operation.get('entity')
+    if op not in BATCH_OPS:
+        raise OperationError(f'Operação inválida. Use uma destas: {", ".join(BATCH_OPS)}.', 400)
+    handlers = {'create': CREATORS, 'update': UPDATERS, 'delete': DELETERS}[op]
+    if entity not in handlers:
+        raise OperationError(f'Operação {op} não suportada para a entidade {entity}.', 400)
+    ref = operation.get('ref')
+    if ref is not None and ref in refs:
+        raise OperationError(f'A referência {ref} já foi declarada neste lote.', 400)
+
+    data = _resolve(operation.get('data') or {}, refs)
+    if not isinstance(data, dict):
+        raise OperationError('O campo data deve ser um objeto JSON.', 400)
+    if op == 'create':
+        record_id = CREATORS[entity](store, data)
+        status = 201
+    else:
+        record_id = _resolve(operation.get('id'), refs)
+        if not isinstance(record_id, str) or not record_id:
+            raise OperationError('O id do registro é obrigatório.', 400)
+        if op == 'update':
+            UPDATERS[entity](store, record_id, data, operation.get('version'))
+        else:
+            DELETERS[entity](store, record_id, operation.get('version'))
+        status = 200
+    if ref is not None:
+        refs[ref] = record_id
+    return status, record_id
+
+
+def run_batch(store, operations, dry_run=False):
+    """Executa as operações em ordem, em uma única transação (gravada de uma só vez no final).
+
+    Se uma operação falhar, nenhuma é aplicada. Retorna o relatório com o resultado de cada
+    operação executada: {'applied', 'dry_run', 'results': [{'index', 'status', 'id' | 'error'}]}.
+    """
+    results = []
+    refs = {}
+    failed = False
+    try:
+        with store.transaction():
+            for index, operation in enumerate(operations):
+                try:
+                    status, record_id = _run_operation(store, operation, refs)
+                except OperationError as e:
+                    results.append({'index': index, 'status': e.status, 'error': e.message})
+                    failed = True
+                    break
+                results.append({'index': index, 'status': status, 'id': record_id})
+            if failed or dry_run:
+                raise _BatchAborted()
+    except _BatchAborted:
+        pass
+
+    return {
+        'applied': not (failed or dry_run),
+        'dry_run': dry_run,
+        'results': results,
+    }
@@ -0,0 +1,101 @@
+"""Gera arquivos de dados sintéticos (data/*.txt) com o número de matrículas desejado.
+
+Cada turma tem ALUNOS_POR_TURMA alunos e OFERTAS_POR_TURMA disciplinas ofertadas; cada aluno
+se matricula em DISCIPLINAS_POR_ALUNO das ofertas da sua turma.
+
+Uso: python benchmarks/generate_data.py --matriculas 100000 --output data
+"""
+import argparse
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from store import JOURNAL_FILE, TABLES  # noqa: E402
+
+ALUNOS_POR_TURMA = 40
+OFERTAS_POR_TURMA = 6
+DISCIPLINAS_POR_ALUNO = 5
+
+NOMES = ['João', 'Maria', 'José', 'Ana', 'Antônio', 'Francisca', 'Luís', 'Letícia', 'Carlos', 'Márcia',
+         'Paulo', 'Sebastião', 'Júlia', 'Lucas', 'Beatriz', 'Gabriel', 'Conceição', 'Rafael', 'Fernanda', 'Tiago']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Ferreira', 'Araújo', 'Gonçalves', 'Brandão',
+              'Ribeiro', 'Gomes', 'Martins', 'Simões', 'Rocha', 'Conceição', 'Barbosa', 'Magalhães', 'Falcão', 'Assunção']
+AREAS = ['Cálculo', 'Álgebra Linear', 'Física', 'Química', 'Programação', 'Estruturas de Dados', 'Bancos de Dados',
+         'Redes', 'Estatística', 'Economia', 'Direito', 'Administração', 'Introdução à Computação', 'Ética']
+CURSOS = ['Engenharia', 'Computação', 'Administração', 'Direito', 'Medicina', 'Arquitetura']
+
+
+def _writer(data_dir, table):
+    return open(os.path.join(data_dir, TABLES[table][0]), 'w')
+
+
+def generate(data_dir, matriculas, seed=0):
+    """Grava as tabelas em data_dir e retorna {tabela: número de registros}."""
+    rng = random.Random(seed)
+    new_id = lambda: str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    os.makedirs(data_dir, exist_ok=True)
+    # O journal de uma execução anterior não se aplica aos arquivos novos
+    journal_path = os.path.join(data_dir, JOURNAL_FILE)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+
+    alunos_total = max(1, -(-matriculas // DISCIPLINAS_POR_ALUNO))
+    turmas_total = max(1, -(-alunos_total // ALUNOS_POR_TURMA))
+    disciplinas_total = max(OFERTAS_POR_TURMA, min(len(AREAS) * 40, turmas_total * 2))
+    counts = {}
+
+    disciplina_ids = []
+    with _writer(data_dir, 'disciplinas_catalogo') as f:
+        for n in range(disciplinas_total):
+            disciplina_ids.append(new_id())
+            area = AREAS[n % len(AREAS)]
+            f.write(f'{disciplina_ids[-1]}|{area[:3].upper()}{n + 100}|{area} {n // len(AREAS) + 1}\n')
+    counts['disciplinas_catalogo'] = disciplinas_total
+
+    ofertas_por_turma = []
+    with _writer(data_dir, 'turmas') as turmas_f, _writer(data_dir, 'turma_disciplinas_ofertas') as ofertas_f:
+        for n in range(turmas_total):
+            turma_id = new_id()
+            turmas_f.write(f'{turma_id}|{CURSOS[n % len(CURSOS)]} {2020 + n % 6}/{n % 2 + 1} - Turma {n + 1}\n')
+            ofertas = []
+            for disciplina_id in rng.sample(disciplina_ids, OFERTAS_POR_TURMA):
+                ofertas.append(new_id())
+                professor = f'Prof. {rng.choice(NOMES)} {rng.choice(SOBRENOMES)}'
+                ofertas_f.write(f'{ofertas[-1]}|{turma_id}|{disciplina_id}|{professor}\n')
+            ofertas_por_turma.append(ofertas)
+    counts['turmas'] = turmas_total
+    counts['turma_disciplinas_ofertas'] = turmas_total * OFERTAS_POR_TURMA
+
+    # Alunos e matrículas são gravados à medida que são gerados, sem guardá-los em memória
+    restantes = matriculas
+    with _writer(data_dir, 'alunos') as alunos_f, _writer(data_dir, 'matriculas') as matriculas_f:
+        for n in range(alunos_total):
+            aluno_id = new_id()
+            nome = f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}'
+            alunos_f.write(f'{aluno_id}|{2020000000 + n}|{nome}|(11) 9{rng.randrange(10**8):08}\n')
+            quantidade = min(DISCIPLINAS_POR_ALUNO, restantes)
+            for oferta_id in rng.sample(ofertas_por_turma[n // ALUNOS_POR_TURMA], quantidade):
+                matriculas_f.write(f'{new_id()}|{aluno_id}|{oferta_id}\n')
+            restantes -= quantidade
+    counts['alunos'] = alunos_total
+    counts['matriculas'] = matriculas
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--matriculas', type=int, default=10000, help='Número de matrículas (ex.: 1000 a 1000000).')
+    parser.add_argument('--output', default='data', help='Diretório de saída (os .txt existentes são substituídos).')
+    parser.add_argument('--seed', type=int, default=0, help='Semente, para gerar sempre os mesmos dados.')
+    args = parser.parse_args()
+
+    counts = generate(args.output, args.matriculas, args.seed)
+    for table, count in counts.items():
+        print(f'{table}: {count}')
+
+
+if __name__ == '__main__':
+    main()
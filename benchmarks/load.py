@@ -0,0 +1,244 @@
+"""Teste de carga: vazão e latência das rotas de leitura com muitos clientes simultâneos.
+
+Sobe o servidor em cada modo (gunicorn sync, gunicorn gthread e ASGI com uvicorn) sobre
+dados sintéticos e mede cada nível de concorrência com conexões keep-alive. Com --sse, mantém
+abertas também conexões ociosas em /api/changes/stream, como abas do navegador:
+
+    python benchmarks/load.py --concurrency 10,100,500 --sse 50
+    python benchmarks/load.py --url http://localhost:8000 --concurrency 200   # servidor já no ar
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+from generate_data import generate
+from run import ROOT, git_commit, percentile
+
+# Comando de cada modo (workers e threads vêm dos argumentos; o resto, do gunicorn.conf.py)
+SERVER_MODES = {
+    'sync': ['gunicorn', 'app:app', '-k', 'sync'],
+    'gthread': ['gunicorn', 'app:app', '-k', 'gthread'],
+    'asgi': ['gunicorn', 'asgi:app', '-k', 'uvicorn.workers.UvicornWorker'],
+}
+REQUEST_TIMEOUT = 10.0  # segundos; uma requisição mais lenta conta como erro
+
+
+async def _request(reader, writer, path):
+    """GET em HTTP/1.1. Retorna (status, se a conexão pode ser reaproveitada)."""
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: load-test\r\n\r\n'.encode('latin-1'))
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Conexão encerrada pelo servidor.')
+    status = int(status_line.split()[1])
+    length, chunked, keep_alive = 0, False, True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = b'chunked' in value
+        elif name == b'connection':
+            keep_alive = value != b'close'
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)  # dados + \r\n (no último, só a linha vazia final)
+            if size == 0:
+                break
+    elif length:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def _client(host, port, paths, offset, deadline, latencies, errors):
+    """Um cliente: faz requisições em sequência, pela mesma conexão enquanto o servidor deixar."""
+    reader = writer = None
+    i = offset
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), REQUEST_TIMEOUT)
+            status, keep_alive = await asyncio.wait_for(_request(reader, writer, paths[i % len(paths)]),
+                                                        REQUEST_TIMEOUT)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            errors.append('conexão')
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.01)
+            continue
+        latencies.append(time.perf_counter() - start)
+        if status >= 400:
+            errors.append(str(status))
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+        i += 1
+    if writer is not None:
+        writer.close()
+
+
+async def _clients(host, port, paths, connections, first, duration):
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(_client(host, port, paths, first + n, deadline, latencies, errors)
+                           for n in range(connections)))
+    return latencies, errors
+
+
+def _client_process(args):
+    return asyncio.run(_clients(*args))
+
+
+def run_phase(host, port, paths, concurrency, duration, processes):
+    """Mede um nível de concorrência, com os clientes divididos entre processes processos."""
+    processes = max(1, min(processes, concurrency))
+    shares = [concurrency // processes + (1 if n < concurrency % processes else 0) for n in range(processes)]
+    jobs = [(host, port, paths, share, sum(shares[:n]), duration) for n, share in enumerate(shares)]
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.map(_client_process, jobs)
+    latencies = sorted(latency for result_latencies, _ in results for latency in result_latencies)
+    errors = [error for _, result_errors in results for error in result_errors]
+    ok = len(latencies) - sum(1 for error in errors if error != 'conexão')
+    return {
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput_rps': ok / duration,
+        'p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+    }
+
+
+def open_streams(host, port, count):
+    """Abre count conexões em /api/changes/stream e as deixa ociosas (como abas abertas)."""
+    streams = []
+    for _ in range(count):
+        try:
+            conn = socket.create_connection((host, port), timeout=REQUEST_TIMEOUT)
+        except OSError:
+            break
+        conn.sendall('GET /api/changes/stream HTTP/1.1\r\nHost: load-test\r\n\r\n'.encode('latin-1'))
+        streams.append(conn)
+    return streams
+
+
+def wait_until_ready(base_url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError('O servidor terminou durante a inicialização.')
+        try:
+            with urllib.request.urlopen(f'{base_url}/api/turmas?limit=1', timeout=2) as response:
+                return json.load(response)
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'O servidor não respondeu em {timeout}s.')
+
+
+def request_paths(base_url):
+    """Rotas de leitura usadas pelo frontend, em rodízio entre os clientes."""
+    turma_id = wait_until_ready(base_url, None)['items'][0]['id']
+    paths = [f'/api/alunos?limit=50&offset={offset}' for offset in range(0, 1000, 50)]
+    paths += [
+        f'/api/matriculas?turma_id={turma_id}',
+        '/api/turma_disciplinas_ofertas?limit=50',
+        '/api/alunos?search=silva',
+        '/api/search?q=mar',
+        '/api/search?q=ana&entity=alunos',
+    ]
+    return paths
+
+
+def measure(base_url, args, label):
+    split = urlsplit(base_url)
+    host, port = split.hostname, split.port or 80
+    paths = request_paths(base_url)
+    streams = open_streams(host, port, args.sse)
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            result = run_phase(host, port, paths, concurrency, args.duration, args.client_processes)
+            results.append(result)
+            print(f'{label:<10}{concurrency:>8}{result["throughput_rps"]:>10.0f}{result["p50_ms"] or 0:>10.1f}'
+                  f'{result["p99_ms"] or 0:>10.1f}{result["errors"]:>9}')
+    finally:
+        for conn in streams:
+            conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', default=','.join(SERVER_MODES), help='Modos, separados por vírgula.')
+    parser.add_argument('--url', default=None, help='Mede um servidor já no ar, em vez de subir um por modo.')
+    parser.add_argument('--concurrency', default='10,100,500', help='Clientes simultâneos, separados por vírgula.')
+    parser.add_argument('--duration', type=float, default=10.0, help='Segundos de medição por nível.')
+    parser.add_argument('--sse', type=int, default=0, help='Conexões ociosas abertas em /api/changes/stream.')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='Threads por worker (gthread e ASGI).')
+    parser.add_argument('--backend', choices=('txt', 'sqlite'), default='txt')
+    parser.add_argument('--matriculas', type=int, default=20000)
+    parser.add_argument('--client-processes', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='Processos que geram a carga.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--output', default=None, help='Arquivo JSON dos resultados.')
+    args = parser.parse_args()
+    args.concurrency = [int(value) for value in args.concurrency.split(',')]
+
+    print(f'{"modo":<10}{"clientes":>8}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"erros":>9}')
+    results = {}
+    if args.url:
+        results['url'] = measure(args.url.rstrip('/'), args, 'url')
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            generate(os.path.join(workdir, 'data'), args.matriculas, 0)
+            env = dict(os.environ, PYTHONPATH=ROOT, STORAGE_BACKEND=args.backend,
+                       SQLITE_PATH=os.path.join(workdir, 'data', 'faculdade.db'),
+                       ASGI_THREADS=str(args.threads),
+                       CHANGE_STREAM_SECONDS=str(args.duration * len(args.concurrency) + 60))
+            if args.backend == 'sqlite':
+                subprocess.run([sys.executable, '-c', 'from sqlite_store import import_txt_data; '
+                                'import_txt_data("data", "data/faculdade.db")'], cwd=workdir, env=env, check=True)
+            for mode in args.modes.split(','):
+                command = SERVER_MODES[mode] + [
+                    '-c', os.path.join(ROOT, 'gunicorn.conf.py'), '-w', str(args.workers),
+                    '--threads', str(args.threads), '-b', f'127.0.0.1:{args.port}', '--log-level', 'warning']
+                process = subprocess.Popen(command, cwd=workdir, env=env)
+                try:
+                    base_url = f'http://127.0.0.1:{args.port}'
+                    wait_until_ready(base_url, process)
+                    results[mode] = measure(base_url, args, mode)
+                finally:
+                    process.terminate()
+                    process.wait(timeout=30)
+
+    commit = git_commit()
+    output = os.path.abspath(args.output or os.path.join(ROOT, 'benchmarks', 'results', f'{commit or "local"}-load.json'))
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'meta': {'commit': commit, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'backend': args.backend,
+                     'workers': args.workers, 'threads': args.threads, 'sse': args.sse,
+                     'duration': args.duration, 'counts_matriculas': args.matriculas},
+            'modes': results,
+        }, f, indent=2)
+    print(f'Resultados gravados em {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Memória por registro das tabelas carregadas: dicts (formato antigo) x registros compactos.
+
+Uso: python benchmarks/memory.py [--matriculas 200000]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate_data import generate  # noqa: E402
+from store import RECORD_TYPES, TABLES, read_table_file  # noqa: E402
+
+
+def read_table_file_as_dicts(path, record_type):
+    """Leitura anterior aos registros compactos: um dict por linha, sem internar os IDs."""
+    fields = record_type.fields
+    records = {}
+    with open(path, 'r') as f:
+        for line in f:
+            parts = line.strip().split('|')
+            if len(parts) == len(fields):
+                records[parts[0]] = dict(zip(fields, parts))
+    return records
+
+
+def measure(data_dir, reader):
+    """Bytes alocados para carregar todas as tabelas, por tabela (os IDs compartilhados contam na primeira)."""
+    gc.collect()
+    tracemalloc.start()
+    tables, sizes = {}, {}
+    for table, (filename, _) in TABLES.items():
+        before = tracemalloc.get_traced_memory()[0]
+        tables[table] = reader(os.path.join(data_dir, filename), RECORD_TYPES[table])
+        sizes[table] = (tracemalloc.get_traced_memory()[0] - before, len(tables[table]))
+    tracemalloc.stop()
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--matriculas', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        generate(data_dir, args.matriculas)
+        before = measure(data_dir, read_table_file_as_dicts)
+        after = measure(data_dir, read_table_file)
+
+    print(f'{"tabela":<28}{"registros":>10}{"antes (B/reg)":>15}{"depois (B/reg)":>16}{"redução":>10}')
+    total_before = total_after = 0
+    for table in TABLES:
+        (size_before, count), (size_after, _) = before[table], after[table]
+        total_before += size_before
+        total_after += size_after
+        print(f'{table:<28}{count:>10}{size_before / count:>15.0f}{size_after / count:>16.0f}'
+              f'{1 - size_after / size_before:>10.0%}')
+    print(f'{"total (MB)":<28}{"":>10}{total_before / 2**20:>15.1f}{total_after / 2**20:>16.1f}'
+          f'{1 - total_after / total_before:>10.0%}')
+
+
+if __name__ == '__main__':
+    main()
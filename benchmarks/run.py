@@ -0,0 +1,253 @@
+"""Mede latência, vazão e memória da carga dos dados e das rotas da API sobre dados sintéticos.
+
+Os resultados são gravados em JSON (por padrão em benchmarks/results/) para comparar commits:
+
+    python benchmarks/run.py --matriculas 100000
+    python benchmarks/run.py --matriculas 100000 --compare benchmarks/results/<anterior>.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_data import generate  # noqa: E402
+
+DEFAULT_ITERATIONS = 200
+HEAVY_ITERATIONS = 5  # /api/data monta todos os dados a cada requisição
+
+
+def percentile(sorted_values, p):
+    """Percentil p (0-100) de uma lista ordenada, pelo posto mais próximo."""
+    return sorted_values[min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))]
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    return {
+        'requests': len(latencies),
+        'mean_ms': total / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p90_ms': percentile(latencies, 90) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'throughput_rps': len(latencies) / total if total else None,
+    }
+
+
+def peak_memory_kb(func):
+    """Pico de memória alocada (em KB) durante uma chamada de func."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure_load(backend):
+    """Tempo e pico de memória para carregar todos os dados em um armazenamento novo.
+
+    No backend txt, a primeira carga lê os .txt (e grava o cache binário dos snapshots); a
+    segunda, como a de um worker reiniciado, vem do cache.
+    """
+    from store import DataStore
+    from sqlite_store import SqliteStore
+
+    def load():
+        store = SqliteStore(os.path.join('data', 'faculdade.db')) if backend == 'sqlite' else DataStore('data')
+        store.load_all()
+        return store
+
+    timings = []
+    for _ in range(2):
+        start = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - start)
+    return {'seconds': timings[0], 'cached_seconds': timings[1], 'peak_kb': peak_memory_kb(load)}
+
+
+class Scenarios:
+    """Requisições de cada cenário. Os de escrita usam os registros criados pelos anteriores."""
+
+    def __init__(self, client, iterations, heavy_iterations):
+        self.client = client
+        self.iterations = iterations
+        self.heavy_iterations = heavy_iterations
+        self.turma_id = self._first('turmas')
+        self.oferta_id = self._first('turma_disciplinas_ofertas')
+        self.created_alunos = []
+        self.created_matriculas = []
+
+    def _first(self, entity):
+        return self.client.get(f'/api/{entity}?limit=1').get_json()['items'][0]['id']
+
+    def all(self):
+        """(nome, iterações, função que recebe o número da iteração e retorna a resposta, é leitura?)."""
+        c = self.client
+        return [
+            ('GET /api/data', self.heavy_iterations, lambda i: c.get('/api/data'), True),
+            ('GET /api/data?search_aluno', self.heavy_iterations, lambda i: c.get('/api/data?search_aluno=silva'), True),
+            ('GET /api/alunos', self.iterations, lambda i: c.get(f'/api/alunos?offset={i * 50 % 1000}'), True),
+            ('GET /api/alunos?search', self.iterations, lambda i: c.get('/api/alunos?search=joao'), True),
+            ('GET /api/matriculas?turma_id', self.iterations,
+             lambda i: c.get(f'/api/matriculas?turma_id={self.turma_id}'), True),
+            ('GET /api/search', self.iterations, lambda i: c.get('/api/search?q=mar'), True),
+            ('GET /api/stats', self.iterations, lambda i: c.get('/api/stats'), True),
+            ('POST /api/alunos', self.iterations, self._create_aluno, False),
+            ('POST /api/matriculas', self.iterations, self._create_matricula, False),
+            ('PUT /api/alunos', self.iterations, self._update_aluno, False),
+            ('DELETE /api/matriculas', self.iterations, self._delete_matricula, False),
+            ('DELETE /api/alunos', self.iterations, self._delete_aluno, False),
+        ]
+
+    def _create_aluno(self, i):
+        response = self.client.post('/api/alunos', json={
+            'matricula': f'BENCH{len(self.created_alunos)}', 'nome': f'Aluno Benchmark {i}', 'telefone': '(11) 90000-0000'})
+        self.created_alunos.append(response.get_json()['id'])
+        return response
+
+    def _create_matricula(self, i):
+        response = self.client.post('/api/matriculas', json={
+            'aluno_id': self.created_alunos[i % len(self.created_alunos)], 'turma_disciplina_id': self.oferta_id})
+        self.created_matriculas.append(response.get_json()['id'])
+        return response
+
+    def _update_aluno(self, i):
+        aluno_id = self.created_alunos[i % len(self.created_alunos)]
+        return self.client.put(f'/api/alunos/{aluno_id}', json={
+            'matricula': f'BENCH-{aluno_id}', 'nome': f'Aluno Alterado {i}', 'telefone': '(11) 91111-1111'})
+
+    def _delete_matricula(self, i):
+        return self.client.delete(f'/api/matriculas/{self.created_matriculas.pop()}')
+
+    def _delete_aluno(self, i):
+        return self.client.delete(f'/api/alunos/{self.created_alunos.pop()}')
+
+
+def run_scenarios(client, iterations, heavy_iterations):
+    results = {}
+    for name, count, request, is_read in Scenarios(client, iterations, heavy_iterations).all():
+        if is_read:
+            request(0)  # aquecimento
+        latencies = []
+        for i in range(count):
+            start = time.perf_counter()
+            response = request(i)
+            response.get_data()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name}: status {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        results[name] = summarize(latencies)
+        # A memória é medida à parte, pois o tracemalloc deixa as requisições mais lentas
+        results[name]['peak_kb'] = peak_memory_kb(lambda: request(0).get_data()) if is_read else None
+        print(f'{name:<32}{results[name]["p50_ms"]:>9.2f}{results[name]["p99_ms"]:>9.2f}'
+              f'{results[name]["throughput_rps"]:>10.0f}{results[name]["peak_kb"] or 0:>11.0f}')
+    return results
+
+
+def compare(previous, current):
+    print(f'\nComparação com {previous["meta"].get("commit")} (p50 / p99, em ms):')
+    for name, result in current['endpoints'].items():
+        old = previous['endpoints'].get(name)
+        if not old:
+            continue
+        change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] if old['p50_ms'] else 0
+        print(f'{name:<32}{old["p50_ms"]:>9.2f} -> {result["p50_ms"]:<9.2f}{old["p99_ms"]:>9.2f} -> '
+              f'{result["p99_ms"]:<9.2f}{change:>+8.0%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--matriculas', type=int, default=10000)
+    parser.add_argument('--backend', choices=('txt', 'sqlite'), default='txt')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help='Requisições por rota.')
+    parser.add_argument('--heavy-iterations', type=int, default=HEAVY_ITERATIONS, help='Requisições a /api/data.')
+    parser.add_argument('--cache', action='store_true', help='Mantém o cache de respostas ligado.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help='Arquivo JSON dos resultados.')
+    parser.add_argument('--compare', default=None, help='Resultados anteriores (JSON) para comparar.')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f'{commit or "local"}-{args.backend}-{args.matriculas}.json')
+    output = os.path.abspath(output)
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)  # app.py usa ./data
+        start = time.perf_counter()
+        counts = generate('data', args.matriculas, args.seed)
+        print(f'Dados gerados em {time.perf_counter() - start:.1f}s: {counts}')
+        if args.backend == 'sqlite':
+            from sqlite_store import import_txt_data
+            import_txt_data('data', os.path.join('data', 'faculdade.db'))
+
+        os.environ['STORAGE_BACKEND'] = args.backend
+        os.environ['SQLITE_PATH'] = os.path.join('data', 'faculdade.db')
+        if not args.cache:
+            os.environ['RESPONSE_CACHE_ENTRIES'] = '0'  # mede a montagem das respostas, não o cache
+
+        load = measure_load(args.backend)
+        print(f'Carga dos dados: {load["seconds"]:.2f}s ({load["cached_seconds"]:.2f}s pelo cache), '
+              f'pico de {load["peak_kb"] / 1024:.1f} MB')
+
+        import app as application
+        client = application.app.test_client()
+        print(f'{"rota":<32}{"p50 ms":>9}{"p99 ms":>9}{"req/s":>10}{"pico KB":>11}')
+        endpoints = run_scenarios(client, args.iterations, args.heavy_iterations)
+        os.chdir(ROOT)
+
+    results = {
+        'meta': {
+            'commit': commit,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'backend': args.backend,
+            'cache': args.cache,
+            'seed': args.seed,
+            'counts': counts,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None,
+        },
+        'load': load,
+        'endpoints': endpoints,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Resultados gravados em {output}')
+
+    if previous:
+        compare(previous, results)
+
+
+if __name__ == '__main__':
+    main()
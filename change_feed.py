@@ -0,0 +1,77 @@
+import json
+import time
+
+from store import record_version
+
+# Eventos por consulta ao armazenamento (e padrão do limit de /api/changes)
+PAGE_SIZE = 500
+# Sem alterações deste processo, o stream consulta o armazenamento a cada POLL_SECONDS
+# (para ver as de outros processos) e manda um comentário a cada HEARTBEAT_SECONDS,
+# para que proxies não fechem a conexão parada
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 15.0
+# Espera do navegador antes de reconectar (campo retry do SSE)
+RETRY_MS = 3000
+HEARTBEAT = ': ping\n\n'
+
+
+def reset_seq(changes):
+    """seq do primeiro evento "reset" (todos os dados trocados, como na restauração de um
+    backup), ou None. O cliente recarrega tudo e continua a partir dele."""
+    return next((change['seq'] for change in changes if change['op'] == 'reset'), None)
+
+
+def with_records(store, changes):
+    """Acrescenta a cada evento a linha atual do registro (a das listagens, com a versão).
+
+    record é None nas remoções e quando o registro não existe mais (um evento posterior o remove).
+    """
+    ids = {}
+    for change in changes:
+        if change['op'] != 'delete':
+            ids.setdefault(change['entity'], set()).add(change['id'])
+    rows = {entity: store.list_rows(entity, entity_ids) for entity, entity_ids in ids.items()}
+    for entity, entity_rows in rows.items():
+        for row in entity_rows.values():
+            row['version'] = record_version(entity, row)
+    return [{**change, 'record': rows.get(change['entity'], {}).get(change['id'])} for change in changes]
+
+
+def _message(event, data, event_id):
+    return f'event: {event}\nid: {event_id}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
+
+
+def poll(store, since):
+    """Uma consulta do stream: (mensagens SSE, novo since, se pode haver mais eventos já gravados)."""
+    changes, last_seq = store.changes_since(since, PAGE_SIZE)
+    if changes is None:
+        return [_message('reset', {'last_seq': last_seq}, last_seq)], last_seq, False
+    reset = reset_seq(changes)
+    if reset is not None:
+        return [_message('reset', {'last_seq': reset}, reset)], reset, True
+    messages = [_message('change', event, event['seq']) for event in with_records(store, changes)]
+    return messages, changes[-1]['seq'] if changes else since, len(changes) == PAGE_SIZE
+
+
+def iter_events(store, since, max_seconds):
+    """Gera o stream SSE com os eventos posteriores a since, por até max_seconds.
+
+    Ao fim, o navegador reconecta sozinho e envia o último id recebido em Last-Event-ID.
+    Se os eventos pedidos não estiverem mais disponíveis (ou os dados foram todos trocados),
+    manda "reset" com o seq a partir do qual continuar.
+    (No modo ASGI, asgi.py serve o mesmo stream sem ocupar uma thread por conexão.)
+    """
+    yield f'retry: {RETRY_MS}\n\n'
+    deadline = time.monotonic() + max_seconds
+    last_message = time.monotonic()
+    while time.monotonic() < deadline:
+        messages, since, more = poll(store, since)
+        if messages:
+            yield from messages
+            last_message = time.monotonic()
+            if more:
+                continue
+        elif time.monotonic() - last_message >= HEARTBEAT_SECONDS:
+            yield HEARTBEAT
+            last_message = time.monotonic()
+        store.wait_for_changes(since, POLL_SECONDS)
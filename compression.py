@@ -0,0 +1,51 @@
+"""Compressão das respostas (brotli ou gzip), negociada pelo cabeçalho Accept-Encoding."""
+import gzip
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # dependência opcional: sem ela, só gzip
+    brotli = None
+
+# Codificações aceitas, na ordem de preferência do servidor (usada nos empates do cliente)
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+# Níveis para conteúdo gerado a cada requisição: nas respostas JSON daqui, o gzip 4 reduz quase
+# tanto quanto o 6 (padrão) em 3/4 do tempo. As respostas cacheadas (ver cached_response) são
+# comprimidas uma vez só
+GZIP_LEVEL = 4
+BROTLI_QUALITY = 5
+# Tipos comprimidos. O stream de alterações (text/event-stream) e a exportação, enviados em
+# partes, ficam de fora
+MIMETYPES = frozenset({
+    'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html', 'text/plain',
+})
+
+
+def negotiate(accept_encodings):
+    """Codificação a usar com o Accept-Encoding do cliente (request.accept_encodings), ou None."""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(body, encoding):
+    with metrics.span('compress'):
+        if encoding == 'br':
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, encoding, min_bytes):
+    """Comprime o corpo de response com encoding (None = sem compressão), se valer a pena.
+
+    Respostas de tipos comprimíveis levam Vary: Accept-Encoding mesmo sem compressão, para
+    que caches intermediários não entreguem uma versão a quem pediu outra.
+    """
+    if (response.mimetype not in MIMETYPES or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if encoding is None or response.status_code != 200 or len(response.get_data()) < min_bytes:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.content_encoding = encoding
+    return response
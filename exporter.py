@@ -0,0 +1,34 @@
+import csv
+import io
+import json
+
+from store import ROSTER_FIELDS
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_MIMETYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+CHUNK_ROWS = 500  # Linhas acumuladas antes de cada envio ao cliente
+
+
+def iter_export(rows, fmt):
+    """Converte as linhas do relatório (ver store.iter_roster) em blocos de texto CSV ou JSON Lines.
+
+    Os blocos são gerados à medida que as linhas chegam, sem montar o arquivo inteiro em memória.
+    """
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(ROSTER_FIELDS)
+        write = lambda row: writer.writerow([row[f] for f in ROSTER_FIELDS])
+    else:
+        write = lambda row: buffer.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    count = 0
+    for row in rows:
+        write(row)
+        count += 1
+        if count % CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
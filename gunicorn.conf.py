@@ -0,0 +1,48 @@
+# Configuração do Gunicorn, lida automaticamente ao rodar `gunicorn` nesta pasta (ex.: pelo Procfile).
+#
+# Modo ASGI (Procfile): gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+#   (ou `uvicorn asgi:app --workers N`) Um loop asyncio por worker segura as conexões e as rotas
+#   rodam em ASGI_THREADS threads; os streams de /api/changes/stream não ocupam thread. É o modo
+#   indicado para muitos clientes simultâneos (ver benchmarks/load.py).
+# Modo WSGI:            gunicorn app:app
+#   Workers gthread: cada worker atende até GUNICORN_THREADS requisições ao mesmo tempo, e as
+#   conexões keep-alive ociosas esperam sem ocupar uma thread. Cada stream de alterações prende
+#   uma thread, por isso a página não abre o feed nesse modo (ver CHANGE_STREAM_MAX no app.py).
+#
+# Variáveis: WEB_CONCURRENCY (workers), GUNICORN_WORKER_CLASS, GUNICORN_THREADS, ASGI_THREADS,
+# GUNICORN_PRELOAD.
+import gc
+import multiprocessing
+import os
+
+# Cada worker mantém os dados em memória (backend txt): mais workers, mais memória. Com
+# preload_app (padrão), o processo principal importa o app e carrega os dados uma vez antes de
+# criar os workers, que os herdam e compartilham (copy-on-write): um worker novo ou reiniciado
+# começa a atender sem ler nada. Desligue (GUNICORN_PRELOAD=0) para que cada worker importe o
+# código de novo ao ser reiniciado (ex.: kill -HUP depois de um deploy)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+keepalive = 5
+# Segundos sem sinal de vida até o worker ser reiniciado. Nos workers gthread e uvicorn,
+# requisições longas (como os streams de alterações) não contam; no sync, contam
+timeout = 60
+
+
+def pre_fork(server, worker):
+    """Antes de cada fork (com preload_app): carrega as tabelas que faltam e congela os objetos
+    no coletor de lixo, para que as coletas nos workers não escrevam neles e copiem as páginas
+    compartilhadas.
+
+    O processo principal não escreve, então não começa compactações. Se alguma estiver em
+    andamento, o fork espera por ela: um worker criado enquanto a thread segura as travas do
+    armazenamento as herdaria presas, sem a thread para soltá-las.
+    """
+    if server.cfg.preload_app:
+        import app  # já importado pelo preload (também por asgi:app)
+        app.store.load_all()
+        compactor = getattr(app.store, '_compactor', None)  # só no backend txt
+        if compactor is not None:
+            compactor.join()
+        gc.freeze()
@@ -0,0 +1,130 @@
+import codecs
+import csv
+import io
+import json
+
+from operations import CREATORS, OperationError
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+MAX_REPORTED_ERRORS = 1000  # Erros listados no relatório (a contagem é sempre completa)
+DEFAULT_ENCODING = 'utf-8-sig'  # UTF-8, ignorando o BOM que o Excel grava no início
+
+
+class ImportFileError(Exception):
+    """Arquivo ilegível (codificação errada, CSV malformado): nada é importado."""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+class _DryRun(Exception):
+    """Desfaz a transação de uma importação de teste."""
+
+
+def format_from_filename(filename):
+    return 'jsonl' if filename.endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def open_text(f, encoding=DEFAULT_ENCODING):
+    """Arquivo binário f como texto, para iter_rows (planilhas exportadas em Latin-1: encoding='latin-1')."""
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        raise ImportFileError(f'Codificação desconhecida: {encoding}.') from None
+    return io.TextIOWrapper(f, encoding=encoding, newline='')
+
+
+def iter_rows(stream, fmt):
+    """Lê um arquivo texto CSV (com cabeçalho) ou JSON Lines linha a linha.
+
+    Gera (número da linha, registro, erro), em que erro é None se a linha pôde ser lida.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+        return
+
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'JSON inválido.'
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, 'Cada linha deve ser um objeto JSON.'
+            continue
+        yield line_number, row, None
+
+
+def _resolve_references(store, table, row):
+    """Permite referenciar disciplinas pelo código e alunos pela matrícula, como nas planilhas da secretaria."""
+    row = dict(row)
+    if row.get('disciplina_codigo') and not row.get('disciplina_catalogo_id'):
+        row['disciplina_catalogo_id'] = store.find_unique('disciplinas_catalogo', codigo=row['disciplina_codigo'])
+        if not row['disciplina_catalogo_id']:
+            raise OperationError('Disciplina do catálogo não encontrada.', 404)
+    if table == 'matriculas':
+        if row.get('aluno_matricula') and not row.get('aluno_id'):
+            row['aluno_id'] = store.find_unique('alunos', matricula=row['aluno_matricula'])
+            if not row['aluno_id']:
+                raise OperationError('Aluno não encontrado.', 404)
+        if row.get('turma_id') and row.get('disciplina_catalogo_id') and not row.get('turma_disciplina_id'):
+            row['turma_disciplina_id'] = store.find_unique(
+                'turma_disciplinas_ofertas', turma_id=row['turma_id'], disciplina_catalogo_id=row['disciplina_catalogo_id'])
+            if not row['turma_disciplina_id']:
+                raise OperationError('Oferta de disciplina não encontrada.', 404)
+    return row
+
+
+def _after_line(line_number):
+    # O texto é decodificado em blocos: o erro pode estar algumas linhas depois da última lida
+    return f' (erro depois da linha {line_number})' if line_number else ''
+
+
+def import_rows(store, table, rows, dry_run=False):
+    """Valida e cria os registros de rows (ver iter_rows) em uma única transação.
+
+    Linhas inválidas são ignoradas e relatadas; as válidas são gravadas de uma só vez
+    no final (ou descartadas, em dry_run). Retorna o relatório da importação. Se o arquivo
+    não puder ser lido até o fim, levanta ImportFileError e nada é gravado.
+    """
+    create = CREATORS[table]
+    imported = 0
+    errors = []
+    error_count = 0
+    line_number = 0
+    try:
+        with store.transaction():
+            try:
+                for line_number, row, error in rows:
+                    if error is None:
+                        try:
+                            create(store, _resolve_references(store, table, row))
+                            imported += 1
+                            continue
+                        except OperationError as e:
+                            error = e.message
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({'line': line_number, 'error': error})
+            except UnicodeDecodeError as e:
+                raise ImportFileError(f'O arquivo não está em {e.encoding}{_after_line(line_number)}. '
+                                      'Informe a codificação, ex.: encoding=latin-1.') from e
+            except csv.Error as e:
+                raise ImportFileError(f'CSV inválido{_after_line(line_number)}: {e}.') from e
+            if dry_run:
+                raise _DryRun()
+    except _DryRun:
+        pass
+
+    return {
+        'entity': table,
+        'imported': imported,
+        'error_count': error_count,
+        'errors': errors,
+        'dry_run': dry_run
+    }
@@ -0,0 +1,82 @@
+import json
+import os
+
+
+class Journal:
+    """Log de alterações só de acréscimo (uma linha JSON por operação)."""
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, entries):
+        """Acrescenta as entradas ao final do log com uma única escrita."""
+        data = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries).encode('utf-8')
+        with open(self.path, 'ab') as f:
+            f.write(data)
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        return self.size()
+
+    def read_from(self, offset):
+        """Lê as entradas completas a partir de offset. Retorna (entradas, novo_offset).
+
+        Uma última linha sem '\\n' (escrita interrompida) é ignorada até ser concluída.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        end = data.rfind(b'\n') + 1
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # linha corrompida: descartada na reexecução
+        return entries, offset + end
+
+    def repair(self):
+        """Remove uma linha final incompleta, deixada por uma queda durante a escrita."""
+        size = self.size()
+        if not size:
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            end = data.rfind(b'\n') + 1
+            if end != size:
+                f.truncate(end)
+
+    def tail_offset(self, keep_bytes):
+        """Offset da primeira linha completa entre os últimos keep_bytes do log."""
+        size = self.size()
+        if size <= keep_bytes:
+            return 0
+        with open(self.path, 'rb') as f:
+            f.seek(size - keep_bytes - 1)
+            f.readline()  # termina a linha cortada ao meio
+            return f.tell()
+
+    def truncate_to(self, offset):
+        """Descarta as entradas anteriores a offset, mantendo as posteriores (de forma atômica)."""
+        if not os.path.exists(self.path):
+            return 0
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            tail = f.read()
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        return len(tail)
@@ -0,0 +1,62 @@
+"""Serialização JSON do app (app.json), escolhida por JSON_PROVIDER.
+
+- "json": o provider padrão do Flask (módulo json da biblioteca padrão);
+- "orjson": o pacote orjson, várias vezes mais rápido nas respostas grandes. É o padrão
+  quando está instalado.
+
+Os dois medem a serialização como a etapa "json" (ver metrics.span) e produzem o mesmo
+JSON, exceto pelos caracteres não ASCII, que o orjson envia em UTF-8 em vez de escapá-los.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+import metrics
+
+try:
+    import orjson
+except ImportError:  # dependência opcional
+    orjson = None
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Serialização JSON padrão, medida como a etapa "json" (ver metrics.span)."""
+
+    def dumps(self, obj, **kwargs):
+        with metrics.span('json'):
+            return super().dumps(obj, **kwargs)
+
+
+class OrjsonProvider(TimedJSONProvider):
+    """Serialização com orjson. Tipos que ele não trata (e datas) passam pelo default do Flask."""
+
+    def _dumps_bytes(self, obj, indent=False):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        with metrics.span('json'):
+            return orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps_bytes(obj, kwargs.get('indent')).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s) if not kwargs else super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Os bytes do orjson vão direto para a resposta, sem passar por str
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+PROVIDERS = {'json': TimedJSONProvider, 'orjson': OrjsonProvider}
+DEFAULT_PROVIDER = 'orjson' if orjson else 'json'
+
+
+def create_provider(app, name):
+    if name not in PROVIDERS:
+        raise ValueError(f'JSON_PROVIDER inválido: {name}. Use um destes: {", ".join(PROVIDERS)}.')
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER=orjson requer o pacote orjson (pip install orjson).')
+    return PROVIDERS[name](app)
@@ -0,0 +1,128 @@
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+
+# Limites (em segundos) dos buckets dos histogramas
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SPAN_METRIC = 'faculdade_span_duration_seconds'
+
+HELP = {
+    'faculdade_http_requests_total': ('counter', 'Requisições HTTP atendidas.'),
+    'faculdade_http_request_duration_seconds': ('histogram', 'Duração das requisições HTTP.'),
+    SPAN_METRIC: ('histogram', 'Duração de cada etapa instrumentada (carga, junções, escrita, JSON).'),
+}
+
+# Etapas da requisição atual: {nome: segundos}, ou None fora de uma requisição
+_request_spans = contextvars.ContextVar('request_spans', default=None)
+
+
+class _Histogram:
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # o último é o +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Registry:
+    """Contadores e histogramas do processo, no formato de texto do Prometheus."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}  # (nome, labels) -> valor
+        self.histograms = {}  # (nome, labels) -> _Histogram
+
+    def inc(self, name, labels=(), amount=1):
+        with self.lock:
+            key = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        with self.lock:
+            histogram = self.histograms.get((name, labels))
+            if histogram is None:
+                histogram = self.histograms[(name, labels)] = _Histogram()
+            histogram.observe(value)
+
+    def render(self, extra=()):
+        """Texto para o /metrics. extra: (nome, tipo, ajuda, valor) medidos na hora da coleta."""
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum)) for key, h in self.histograms.items())
+
+        described = set()
+
+        def describe(name, kind, help_text):
+            if name not in described:
+                described.add(name)
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            describe(name, *HELP[name])
+            lines.append(f'{name}{_labels(labels)} {value}')
+        for (name, labels), (counts, total) in histograms:
+            describe(name, *HELP[name])
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+        for name, kind, help_text, value in extra:
+            describe(name, kind, help_text)
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+registry = Registry()
+
+
+@contextlib.contextmanager
+def span(name):
+    """Mede uma etapa: vai para o histograma do processo e para o Server-Timing da requisição."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        registry.observe(SPAN_METRIC, (('span', name),), elapsed)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans[name] = spans.get(name, 0.0) + elapsed
+
+
+def begin_request():
+    _request_spans.set({})
+
+
+def end_request():
+    """Etapas medidas na requisição atual ({nome: segundos})."""
+    spans = _request_spans.get() or {}
+    _request_spans.set(None)
+    return spans
+
+
+def server_timing(spans, total):
+    """Valor do cabeçalho Server-Timing (durações em ms)."""
+    entries = [f'{name.replace(".", "-")};dur={seconds * 1000:.2f}' for name, seconds in spans.items()]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
@@ -0,0 +1,258 @@
+import uuid # Para gerar IDs únicos
+
+from store import record_version
+
+# Regras de validação e escrita de cada entidade, compartilhadas pelas rotas da API,
+# pela importação em lote e por /api/batch. Devem ser chamadas dentro de store.transaction().
+
+
+class OperationError(Exception):
+    """Erro de validação de uma operação, com a mensagem e o status HTTP da resposta."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+VERSION_CONFLICT_ERROR = 'O registro foi alterado por outro usuário. Recarregue os dados e tente novamente.'
+
+
+def generate_id():
+    """Gera um ID único usando UUID."""
+    return str(uuid.uuid4())
+
+
+def _field(data, name):
+    """Valor de um campo como texto (o JSON pode trazer números), ou None se ausente.
+
+    Rejeita "|" e quebras de linha, que corromperiam a linha nos arquivos "id|campo1|campo2".
+    """
+    value = data.get(name)
+    if value is None:
+        return None
+    value = str(value)
+    if '|' in value or '\n' in value or '\r' in value:
+        raise OperationError(f'O campo {name} não pode conter "|" nem quebras de linha.', 400)
+    return value
+
+
+def create_turma(store, data):
+    nome = _field(data, 'nome')
+    if not nome:
+        raise OperationError('Nome da turma é obrigatório.', 400)
+
+    new_id = generate_id()
+    store.insert('turmas', {'id': new_id, 'nome': nome})
+    return new_id
+
+
+def create_disciplina_catalogo(store, data):
+    codigo = _field(data, 'codigo')
+    nome = _field(data, 'nome')
+    if not codigo or not nome:
+        raise OperationError('Código e nome da disciplina são obrigatórios.', 400)
+
+    # Verifica se já existe uma disciplina com o mesmo código
+    if store.find_unique('disciplinas_catalogo', codigo=codigo):
+        raise OperationError('Já existe uma disciplina com este código.', 409) # Conflict
+
+    new_id = generate_id()
+    store.insert('disciplinas_catalogo', {'id': new_id, 'codigo': codigo, 'nome': nome})
+    return new_id
+
+
+def create_aluno(store, data):
+    matricula = _field(data, 'matricula')
+    nome = _field(data, 'nome')
+    telefone = _field(data, 'telefone')
+    if not matricula or not nome or not telefone:
+        raise OperationError('Matrícula, nome e telefone do aluno são obrigatórios.', 400)
+
+    # Verifica se a matrícula já existe
+    if store.find_unique('alunos', matricula=matricula):
+        raise OperationError('Já existe um aluno com esta matrícula.', 409) # Conflict
+
+    new_id = generate_id()
+    store.insert('alunos', {'id': new_id, 'matricula': matricula, 'nome': nome, 'telefone': telefone})
+    return new_id
+
+
+def create_oferta_disciplina(store, data):
+    turma_id = _field(data, 'turma_id')
+    disciplina_catalogo_id = _field(data, 'disciplina_catalogo_id')
+    professor = _field(data, 'professor')
+
+    if not turma_id or not disciplina_catalogo_id or not professor:
+        raise OperationError('Todos os campos (turma, disciplina e professor) são obrigatórios para a oferta.', 400)
+
+    if not store.get('turmas', turma_id):
+        raise OperationError('Turma não encontrada.', 404)
+    if not store.get('disciplinas_catalogo', disciplina_catalogo_id):
+        raise OperationError('Disciplina do catálogo não encontrada.', 404)
+
+    # Verifica se a oferta já existe para evitar duplicatas
+    if store.find_unique('turma_disciplinas_ofertas', turma_id=turma_id, disciplina_catalogo_id=disciplina_catalogo_id):
+        raise OperationError('Esta disciplina já está sendo ofertada nesta turma.', 409)
+
+    new_id = generate_id()
+    store.insert('turma_disciplinas_ofertas', {
+        'id': new_id,
+        'turma_id': turma_id,
+        'disciplina_catalogo_id': disciplina_catalogo_id,
+        'professor': professor
+    })
+    return new_id
+
+
+def create_matricula(store, data):
+    aluno_id = _field(data, 'aluno_id')
+    turma_disciplina_id = _field(data, 'turma_disciplina_id')
+
+    if not aluno_id or not turma_disciplina_id:
+        raise OperationError('Aluno e oferta de disciplina são obrigatórios para a matrícula.', 400)
+
+    if not store.get('alunos', aluno_id):
+        raise OperationError('Aluno não encontrado.', 404)
+    if not store.get('turma_disciplinas_ofertas', turma_disciplina_id):
+        raise OperationError('Oferta de disciplina não encontrada.', 404)
+
+    # Verifica se o aluno já está matriculado nesta oferta
+    if store.find_unique('matriculas', aluno_id=aluno_id, turma_disciplina_id=turma_disciplina_id):
+        raise OperationError('Este aluno já está matriculado nesta oferta de disciplina.', 409)
+
+    matricula_id = generate_id()
+    store.insert('matriculas', {
+        'id': matricula_id,
+        'aluno_id': aluno_id,
+        'turma_disciplina_id': turma_disciplina_id
+    })
+    return matricula_id
+
+
+def _existing(store, table, record_id, version, not_found):
+    """Registro a alterar ou remover. version (do If-Match), se informada, deve ser a atual."""
+    record = store.get(table, record_id)
+    if not record:
+        raise OperationError(not_found, 404)
+    if version and version.strip('"') != record_version(table, record):
+        raise OperationError(VERSION_CONFLICT_ERROR, 409)
+    return record
+
+
+def update_turma(store, turma_id, data, version=None):
+    nome = _field(data, 'nome')
+    if not nome:
+        raise OperationError('Nome da turma é obrigatório.', 400)
+
+    _existing(store, 'turmas', turma_id, version, 'Turma não encontrada.')
+    store.update('turmas', turma_id, nome=nome)
+
+
+def update_disciplina_catalogo(store, disciplina_id, data, version=None):
+    codigo = _field(data, 'codigo')
+    nome = _field(data, 'nome')
+    if not codigo or not nome:
+        raise OperationError('Código e nome da disciplina são obrigatórios.', 400)
+
+    _existing(store, 'disciplinas_catalogo', disciplina_id, version, 'Disciplina do catálogo não encontrada.')
+
+    # Verifica se o código já é de outra disciplina
+    if store.find_unique('disciplinas_catalogo', codigo=codigo) not in (None, disciplina_id):
+        raise OperationError('Já existe outra disciplina com este código.', 409)
+
+    store.update('disciplinas_catalogo', disciplina_id, codigo=codigo, nome=nome)
+
+
+def update_aluno(store, aluno_id, data, version=None):
+    matricula = _field(data, 'matricula')
+    nome = _field(data, 'nome')
+    telefone = _field(data, 'telefone')
+    if not matricula or not nome or not telefone:
+        raise OperationError('Matrícula, nome e telefone do aluno são obrigatórios.', 400)
+
+    _existing(store, 'alunos', aluno_id, version, 'Aluno não encontrado.')
+
+    # Verifica se a matrícula já é de outro aluno
+    if store.find_unique('alunos', matricula=matricula) not in (None, aluno_id):
+        raise OperationError('Já existe outro aluno com esta matrícula.', 409)
+
+    store.update('alunos', aluno_id, matricula=matricula, nome=nome, telefone=telefone)
+
+
+def update_oferta_disciplina(store, oferta_id, data, version=None):
+    professor = _field(data, 'professor')
+    if not professor:
+        raise OperationError('Professor é obrigatório.', 400)
+
+    _existing(store, 'turma_disciplinas_ofertas', oferta_id, version, 'Oferta de disciplina não encontrada.')
+    store.update('turma_disciplinas_ofertas', oferta_id, professor=professor)
+
+
+def delete_turma(store, turma_id, version=None):
+    _existing(store, 'turmas', turma_id, version, 'Turma não encontrada.')
+
+    # Não remove turmas com ofertas de disciplinas
+    if store.lookup('turma_disciplinas_ofertas', 'turma_id', turma_id):
+        raise OperationError('Não é possível remover a turma: existem ofertas de disciplinas associadas a ela.', 409)
+
+    store.delete('turmas', turma_id)
+
+
+def delete_disciplina_catalogo(store, disciplina_id, version=None):
+    _existing(store, 'disciplinas_catalogo', disciplina_id, version, 'Disciplina do catálogo não encontrada.')
+
+    # Não remove disciplinas ofertadas em alguma turma
+    if store.lookup('turma_disciplinas_ofertas', 'disciplina_catalogo_id', disciplina_id):
+        raise OperationError('Não é possível remover a disciplina do catálogo: existem ofertas associadas a ela em turmas.', 409)
+
+    store.delete('disciplinas_catalogo', disciplina_id)
+
+
+def delete_aluno(store, aluno_id, version=None):
+    _existing(store, 'alunos', aluno_id, version, 'Aluno não encontrado.')
+
+    # Não remove alunos com matrículas
+    if store.lookup('matriculas', 'aluno_id', aluno_id):
+        raise OperationError('Não é possível remover o aluno: existem matrículas associadas a ele.', 409)
+
+    store.delete('alunos', aluno_id)
+
+
+def delete_oferta_disciplina(store, oferta_id, version=None):
+    _existing(store, 'turma_disciplinas_ofertas', oferta_id, version, 'Oferta de disciplina não encontrada.')
+
+    # Não remove ofertas com alunos matriculados
+    if store.lookup('matriculas', 'turma_disciplina_id', oferta_id):
+        raise OperationError('Não é possível remover esta oferta de disciplina: existem matrículas de alunos associadas a ela.', 409)
+
+    store.delete('turma_disciplinas_ofertas', oferta_id)
+
+
+def delete_matricula(store, matricula_id, version=None):
+    _existing(store, 'matriculas', matricula_id, version, 'Matrícula não encontrada.')
+    store.delete('matriculas', matricula_id)
+
+
+CREATORS = {
+    'turmas': create_turma,
+    'disciplinas_catalogo': create_disciplina_catalogo,
+    'alunos': create_aluno,
+    'turma_disciplinas_ofertas': create_oferta_disciplina,
+    'matriculas': create_matricula,
+}
+
+UPDATERS = {
+    'turmas': update_turma,
+    'disciplinas_catalogo': update_disciplina_catalogo,
+    'alunos': update_aluno,
+    'turma_disciplinas_ofertas': update_oferta_disciplina,
+}
+
+DELETERS = {
+    'turmas': delete_turma,
+    'disciplinas_catalogo': delete_disciplina_catalogo,
+    'alunos': delete_aluno,
+    'turma_disciplinas_ofertas': delete_oferta_disciplina,
+    'matriculas': delete_matricula,
+}
@@ -0,0 +1,59 @@
+import cProfile
+import heapq
+import itertools
+import os
+import random
+import re
+import threading
+
+
+class SlowRequestProfiler:
+    """Perfila requisições com o cProfile e mantém em disco o pstats das keep mais lentas.
+
+    Só uma requisição por processo é perfilada de cada vez (o cProfile não admite dois
+    perfis ativos), e apenas a fração sample_rate delas. Para ler um arquivo:
+    python -m pstats profiles/<arquivo>.pstats
+    """
+
+    def __init__(self, directory, keep, sample_rate=1.0):
+        self.directory = directory
+        self.keep = keep
+        self.sample_rate = sample_rate
+        self.active = threading.Lock()
+        self.lock = threading.Lock()
+        self.slowest = []  # heap de (duração, caminho do arquivo)
+        self._sequence = itertools.count()
+
+    def start(self):
+        """Começa a perfilar a requisição atual; retorna o perfil, ou None se ela não foi sorteada."""
+        if random.random() >= self.sample_rate or not self.active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # outra ferramenta de profiling já está ativa
+            self.active.release()
+            return None
+        return profile
+
+    def stop(self, profile):
+        profile.disable()
+        self.active.release()
+
+    def finish(self, profile, duration, label):
+        """Encerra o perfil e grava o pstats se a requisição estiver entre as mais lentas."""
+        self.stop(profile)
+        with self.lock:
+            if len(self.slowest) >= self.keep and duration <= self.slowest[0][0]:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            name = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')
+            path = os.path.join(self.directory, f'{duration * 1000:010.1f}ms-{name}-{os.getpid()}-{next(self._sequence)}.pstats')
+            profile.dump_stats(path)
+            heapq.heappush(self.slowest, (duration, path))
+            if len(self.slowest) > self.keep:
+                _, removed = heapq.heappop(self.slowest)
+                try:
+                    os.remove(removed)
+                except FileNotFoundError:
+                    pass
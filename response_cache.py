@@ -0,0 +1,52 @@
+import collections
+import threading
+
+
+class ResponseCache:
+    """Cache LRU de corpos de resposta, válido para uma única versão dos dados.
+
+    Quando a versão muda (qualquer alteração gravada), todas as entradas são descartadas
+    de uma vez. O tamanho é limitado pelo número de entradas e pelo total de bytes.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.version = None
+        self.entries = collections.OrderedDict()  # chave -> (corpo, mimetype, Content-Encoding)
+        self.size = 0  # total de bytes dos corpos guardados
+        self.hits = 0
+        self.misses = 0
+
+    def _set_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.size = 0
+            self.version = version
+
+    def get(self, key, version):
+        """(corpo, mimetype, Content-Encoding) guardado para key na versão informada, ou None."""
+        with self.lock:
+            self._set_version(version)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body, mimetype, content_encoding=None):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            self._set_version(version)
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self.entries[key] = (body, mimetype, content_encoding)
+            self.size += len(body)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, (evicted, *_) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
@@ -0,0 +1,127 @@
+import bisect
+import heapq
+import unicodedata
+
+GRAM = 3  # Tamanho dos n-gramas indexados
+FIELD_SEPARATOR = '\x1f'  # Separa os campos no texto indexado (um termo não casa entre dois campos)
+
+
+def normalize(text):
+    """Texto em minúsculas e sem acentos, para que "joao" encontre "João"."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    folded = ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+    return folded.replace(FIELD_SEPARATOR, ' ')
+
+
+class SearchIndex:
+    """Índice de trigramas dos campos de busca de uma tabela, atualizado registro a registro.
+
+    Um termo com GRAM caracteres ou mais é procurado pela interseção dos seus trigramas e
+    confirmado no texto normalizado; termos mais curtos percorrem os textos já normalizados.
+    Os textos também ficam em uma lista ordenada, para o autocompletar achar os prefixos por
+    busca binária.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.texts = {}  # id -> texto normalizado dos campos
+        self.grams = {}  # trigrama -> {id: None}
+        self._sorted = None  # [(texto, id)] ordenada; None = remontar na próxima consulta
+
+    def _grams(self, text):
+        return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+    def clear(self):
+        self.texts.clear()
+        self.grams.clear()
+        self._sorted = None
+
+    def state(self, copy=False):
+        """(textos, trigramas) do índice, para o cache dos snapshots (ver load_state).
+
+        copy: copia os dicionários, para gravá-los enquanto o índice continua sendo alterado.
+        """
+        if copy:
+            return dict(self.texts), {gram: dict(bucket) for gram, bucket in self.grams.items()}
+        return self.texts, self.grams
+
+    def load_state(self, state):
+        self.texts, self.grams = state
+        self._sorted = None
+
+    def _sorted_texts(self):
+        if self._sorted is None:
+            self._sorted = sorted((text, i) for i, text in self.texts.items())
+        return self._sorted
+
+    def update(self, old, new):
+        """Troca old por new no índice (qualquer um pode ser None)."""
+        old_text = self.texts.get(old['id']) if old else None
+        new_text = FIELD_SEPARATOR.join(normalize(new[f]) for f in self.fields) if new else None
+        if old and new and old['id'] == new['id'] and old_text == new_text:
+            return
+        if old_text is not None:
+            del self.texts[old['id']]
+            for gram in self._grams(old_text):
+                bucket = self.grams.get(gram)
+                if bucket is not None:
+                    bucket.pop(old['id'], None)
+                    if not bucket:
+                        del self.grams[gram]
+            if self._sorted is not None:
+                position = bisect.bisect_left(self._sorted, (old_text, old['id']))
+                del self._sorted[position]
+        if new_text is not None:
+            self.texts[new['id']] = new_text
+            for gram in self._grams(new_text):
+                self.grams.setdefault(gram, {})[new['id']] = None
+            if self._sorted is not None:
+                bisect.insort(self._sorted, (new_text, new['id']))
+
+    def search(self, term):
+        """Conjunto dos IDs cujo texto contém term (sem diferenciar acentos e maiúsculas)."""
+        term = normalize(term)
+        if len(term) < GRAM:
+            return {i for i, text in self.texts.items() if term in text}
+        buckets = []
+        for gram in self._grams(term):
+            bucket = self.grams.get(gram)
+            if not bucket:
+                return set()
+            buckets.append(bucket)
+        buckets.sort(key=len)
+        candidates = set(buckets[0])
+        for bucket in buckets[1:]:
+            candidates.intersection_update(bucket)
+            if not candidates:
+                break
+        return {i for i in candidates if term in self.texts[i]}
+
+    def suggest(self, term, limit):
+        """Até limit IDs que contêm term, na ordem de suggestion_key."""
+        normalized = normalize(term)
+        if not normalized:
+            return []
+        # Caso comum: há ao menos limit textos começando com term, já em ordem na lista
+        texts = self._sorted_texts()
+        start = bisect.bisect_left(texts, (normalized,))
+        prefixed = [i for text, i in texts[start:start + limit] if text.startswith(normalized)]
+        if len(prefixed) == limit:
+            return prefixed
+        keys = ((suggestion_key(self.texts[i], normalized), i) for i in self.search(term))
+        return [i for _, i in heapq.nsmallest(limit, keys)]
+
+
+def suggestion_key(text, term):
+    """Ordem do autocompletar para um texto normalizado que contém term (também normalizado).
+
+    Primeiro os textos que começam com term, depois os que têm uma palavra começando com term,
+    e por fim os demais; em cada grupo, em ordem alfabética.
+    """
+    if text.startswith(term):
+        group = 0
+    elif ' ' + term in text or FIELD_SEPARATOR + term in text:
+        group = 1
+    else:
+        group = 2
+    return (group, text)
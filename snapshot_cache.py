@@ -0,0 +1,45 @@
+"""Cache binário dos snapshots .txt do DataStore, para a carga não reprocessar os arquivos.
+
+Ao lado de cada arquivo de tabela fica um <arquivo>.cache (pickle) com as linhas já
+separadas em campos e o estado do índice de busca. Ele só vale para o .txt com o mesmo
+(mtime, tamanho) gravado no cabeçalho: se o arquivo mudou (compactação, restauração,
+edição à mão), a carga volta a ler o .txt e grava um cache novo.
+
+Como todo pickle, o cache só deve ser lido de um diretório de dados confiável.
+"""
+import os
+import pickle
+
+from locking import unique_tmp_path
+
+CACHE_SUFFIX = '.cache'
+# Muda quando o conteúdo do cache muda de formato (os caches antigos passam a ser ignorados)
+CACHE_FORMAT = 1
+
+
+def cache_path(path):
+    return path + CACHE_SUFFIX
+
+
+def read_cache(path, key):
+    """Conteúdo do cache de path, se ele foi gravado com key (campos e assinatura do .txt); senão None."""
+    try:
+        with open(cache_path(path), 'rb') as f:
+            if pickle.load(f) != (CACHE_FORMAT, key):
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+
+
+def write_cache(path, key, content):
+    """Grava o cache de path. Uma falha só faz a próxima carga ler o .txt, então é ignorada."""
+    tmp_path = unique_tmp_path(cache_path(path))
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((CACHE_FORMAT, key), f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(content, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path(path))
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,699 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+import metrics
+from search_index import FIELD_SEPARATOR, GRAM, normalize
+from stats import averages
+from store import CHANGE_LOG_KEEP, RELATED_SEARCH, ROSTER_FIELDS, SEARCH_FIELDS, TABLES, DataStore
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS turmas (
+    id TEXT PRIMARY KEY,
+    nome TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS disciplinas_catalogo (
+    id TEXT PRIMARY KEY,
+    codigo TEXT NOT NULL UNIQUE,
+    nome TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS alunos (
+    id TEXT PRIMARY KEY,
+    matricula TEXT NOT NULL UNIQUE,
+    nome TEXT NOT NULL,
+    telefone TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turma_disciplinas_ofertas (
+    id TEXT PRIMARY KEY,
+    turma_id TEXT NOT NULL REFERENCES turmas (id),
+    disciplina_catalogo_id TEXT NOT NULL REFERENCES disciplinas_catalogo (id),
+    professor TEXT NOT NULL,
+    UNIQUE (turma_id, disciplina_catalogo_id)
+);
+CREATE INDEX IF NOT EXISTS idx_ofertas_disciplina ON turma_disciplinas_ofertas (disciplina_catalogo_id);
+CREATE TABLE IF NOT EXISTS matriculas (
+    id TEXT PRIMARY KEY,
+    aluno_id TEXT NOT NULL REFERENCES alunos (id),
+    turma_disciplina_id TEXT NOT NULL REFERENCES turma_disciplinas_ofertas (id),
+    UNIQUE (aluno_id, turma_disciplina_id)
+);
+CREATE INDEX IF NOT EXISTS idx_matriculas_oferta ON matriculas (turma_disciplina_id);
+-- Contador incrementado por toda transação que altera dados (ver SqliteStore.data_version)
+CREATE TABLE IF NOT EXISTS data_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    generation INTEGER NOT NULL,
+    modified_at REAL NOT NULL
+);
+INSERT OR IGNORE INTO data_version VALUES (1, 0, 0);
+-- Feed de alterações (ver SqliteStore.changes_since): um evento por registro alterado
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    record_id TEXT NOT NULL
+);
+-- Contadores de /api/stats (ver SqliteStore.stats), mantidos pelos gatilhos abaixo dentro da
+-- própria transação que altera os dados. Contagens que chegam a zero ficam na tabela
+CREATE TABLE IF NOT EXISTS stats_totais (tabela TEXT PRIMARY KEY, total INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS stats_ofertas (oferta_id TEXT PRIMARY KEY, alunos INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_stats_ofertas ON stats_ofertas (alunos);
+CREATE TABLE IF NOT EXISTS stats_turmas (turma_id TEXT PRIMARY KEY, ofertas INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_stats_turmas ON stats_turmas (ofertas);
+CREATE TABLE IF NOT EXISTS stats_alunos (aluno_id TEXT PRIMARY KEY, disciplinas INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_stats_alunos ON stats_alunos (disciplinas);
+CREATE TABLE IF NOT EXISTS stats_professores (
+    professor TEXT PRIMARY KEY,
+    ofertas INTEGER NOT NULL,
+    matriculas INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_stats_professores ON stats_professores (matriculas);
+CREATE TRIGGER IF NOT EXISTS stats_matriculas_insert AFTER INSERT ON matriculas BEGIN
+    INSERT INTO stats_ofertas VALUES (NEW.turma_disciplina_id, 1)
+        ON CONFLICT (oferta_id) DO UPDATE SET alunos = alunos + 1;
+    INSERT INTO stats_alunos VALUES (NEW.aluno_id, 1)
+        ON CONFLICT (aluno_id) DO UPDATE SET disciplinas = disciplinas + 1;
+    UPDATE stats_professores SET matriculas = matriculas + 1
+        WHERE professor = (SELECT professor FROM turma_disciplinas_ofertas WHERE id = NEW.turma_disciplina_id);
+END;
+CREATE TRIGGER IF NOT EXISTS stats_matriculas_delete AFTER DELETE ON matriculas BEGIN
+    UPDATE stats_ofertas SET alunos = alunos - 1 WHERE oferta_id = OLD.turma_disciplina_id;
+    UPDATE stats_alunos SET disciplinas = disciplinas - 1 WHERE aluno_id = OLD.aluno_id;
+    UPDATE stats_professores SET matriculas = matriculas - 1
+        WHERE professor = (SELECT professor FROM turma_disciplinas_ofertas WHERE id = OLD.turma_disciplina_id);
+END;
+CREATE TRIGGER IF NOT EXISTS stats_ofertas_insert AFTER INSERT ON turma_disciplinas_ofertas BEGIN
+    INSERT INTO stats_turmas VALUES (NEW.turma_id, 1)
+        ON CONFLICT (turma_id) DO UPDATE SET ofertas = ofertas + 1;
+    INSERT INTO stats_professores VALUES (NEW.professor, 1, 0)
+        ON CONFLICT (professor) DO UPDATE SET ofertas = ofertas + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS stats_ofertas_delete AFTER DELETE ON turma_disciplinas_ofertas BEGIN
+    UPDATE stats_turmas SET ofertas = ofertas - 1 WHERE turma_id = OLD.turma_id;
+    UPDATE stats_professores SET ofertas = ofertas - 1 WHERE professor = OLD.professor;
+END;
+-- Troca de professor: as matrículas da oferta passam para o novo professor
+CREATE TRIGGER IF NOT EXISTS stats_ofertas_update AFTER UPDATE OF turma_id, professor ON turma_disciplinas_ofertas BEGIN
+    UPDATE stats_turmas SET ofertas = ofertas - 1 WHERE turma_id = OLD.turma_id;
+    INSERT INTO stats_turmas VALUES (NEW.turma_id, 1)
+        ON CONFLICT (turma_id) DO UPDATE SET ofertas = ofertas + 1;
+    UPDATE stats_professores
+        SET ofertas = ofertas - 1,
+            matriculas = matriculas - COALESCE((SELECT alunos FROM stats_ofertas WHERE oferta_id = OLD.id), 0)
+        WHERE professor = OLD.professor;
+    INSERT INTO stats_professores
+        VALUES (NEW.professor, 1, COALESCE((SELECT alunos FROM stats_ofertas WHERE oferta_id = NEW.id), 0))
+        ON CONFLICT (professor) DO UPDATE SET ofertas = ofertas + 1, matriculas = matriculas + excluded.matriculas;
+END;
+''' + ''.join(f'''
+CREATE TRIGGER IF NOT EXISTS stats_{table}_insert_total AFTER INSERT ON {table} BEGIN
+    UPDATE stats_totais SET total = total + 1 WHERE tabela = '{table}';
+END;
+CREATE TRIGGER IF NOT EXISTS stats_{table}_delete_total AFTER DELETE ON {table} BEGIN
+    UPDATE stats_totais SET total = total - 1 WHERE tabela = '{table}';
+END;''' for table in TABLES)
+
+# Índice de busca de cada tabela de SEARCH_FIELDS: search_<tabela> guarda o texto normalizado
+# dos campos (o mesmo do SearchIndex do DataStore) pelo rowid do registro, ordenado para o
+# autocompletar achar os prefixos, e search_<tabela>_fts indexa esse texto por trigramas. Os
+# gatilhos mantêm os dois na mesma transação que altera os dados; search_text é registrada
+# em cada conexão (ver SqliteStore._conn)
+SEARCH_SCHEMA = ''.join(f'''
+CREATE TABLE IF NOT EXISTS search_{table} (registro INTEGER PRIMARY KEY, texto TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_search_{table} ON search_{table} (texto);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_{table}_fts USING fts5(
+    texto, content = 'search_{table}', content_rowid = 'registro', tokenize = 'trigram'
+);
+CREATE TRIGGER IF NOT EXISTS search_{table}_insert AFTER INSERT ON {table} BEGIN
+    INSERT INTO search_{table} VALUES (NEW.rowid, search_text({', '.join(f'NEW.{f}' for f in fields)}));
+END;
+CREATE TRIGGER IF NOT EXISTS search_{table}_delete AFTER DELETE ON {table} BEGIN
+    DELETE FROM search_{table} WHERE registro = OLD.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS search_{table}_update AFTER UPDATE OF {', '.join(fields)} ON {table} BEGIN
+    UPDATE search_{table} SET texto = search_text({', '.join(f'NEW.{f}' for f in fields)}) WHERE registro = NEW.rowid;
+END;
+CREATE TRIGGER IF NOT EXISTS search_{table}_fts_insert AFTER INSERT ON search_{table} BEGIN
+    INSERT INTO search_{table}_fts (rowid, texto) VALUES (NEW.registro, NEW.texto);
+END;
+CREATE TRIGGER IF NOT EXISTS search_{table}_fts_delete AFTER DELETE ON search_{table} BEGIN
+    INSERT INTO search_{table}_fts (search_{table}_fts, rowid, texto) VALUES ('delete', OLD.registro, OLD.texto);
+END;
+CREATE TRIGGER IF NOT EXISTS search_{table}_fts_update AFTER UPDATE ON search_{table} BEGIN
+    INSERT INTO search_{table}_fts (search_{table}_fts, rowid, texto) VALUES ('delete', OLD.registro, OLD.texto);
+    INSERT INTO search_{table}_fts (rowid, texto) VALUES (NEW.registro, NEW.texto);
+END;''' for table, fields in SEARCH_FIELDS.items())
+
+# Refaz os índices de busca a partir dos dados (bancos criados antes deles ou trocados por
+# replace_all, que desliga os gatilhos); ver SqliteStore._backfill_search
+SEARCH_BACKFILL = tuple(
+    statement
+    for table, fields in SEARCH_FIELDS.items()
+    for statement in (
+        f'DELETE FROM search_{table}',
+        f"INSERT INTO search_{table} SELECT rowid, search_text({', '.join(fields)}) FROM {table}",
+        f"INSERT INTO search_{table}_fts (search_{table}_fts) VALUES ('rebuild')",
+    )
+)
+
+# Preenche os contadores a partir dos dados (bancos criados antes deles); ver SqliteStore._init_stats
+STATS_BACKFILL = (
+    *(f"INSERT INTO stats_totais SELECT '{table}', COUNT(*) FROM {table}" for table in TABLES),
+    'INSERT INTO stats_ofertas SELECT turma_disciplina_id, COUNT(*) FROM matriculas GROUP BY turma_disciplina_id',
+    'INSERT INTO stats_alunos SELECT aluno_id, COUNT(*) FROM matriculas GROUP BY aluno_id',
+    'INSERT INTO stats_turmas SELECT turma_id, COUNT(*) FROM turma_disciplinas_ofertas GROUP BY turma_id',
+    '''INSERT INTO stats_professores
+       SELECT o.professor, COUNT(DISTINCT o.id), COUNT(m.id)
+       FROM turma_disciplinas_ofertas o LEFT JOIN matriculas m ON m.turma_disciplina_id = o.id
+       GROUP BY o.professor''',
+)
+
+# Rankings de /api/stats: as maiores contagens vêm direto dos índices dos contadores
+STATS_QUERIES = {
+    'ofertas_com_mais_alunos': '''
+        SELECT o.id, o.turma_id, t.nome AS turma_nome, o.disciplina_catalogo_id,
+               d.codigo AS disciplina_codigo, d.nome AS disciplina_nome, o.professor, s.alunos
+        FROM stats_ofertas s
+        JOIN turma_disciplinas_ofertas o ON o.id = s.oferta_id
+        JOIN turmas t ON t.id = o.turma_id
+        JOIN disciplinas_catalogo d ON d.id = o.disciplina_catalogo_id
+        WHERE s.alunos > 0 ORDER BY s.alunos DESC LIMIT ?''',
+    'turmas_com_mais_ofertas': '''
+        SELECT t.id, t.nome, s.ofertas FROM stats_turmas s JOIN turmas t ON t.id = s.turma_id
+        WHERE s.ofertas > 0 ORDER BY s.ofertas DESC LIMIT ?''',
+    'professores_com_mais_matriculas': '''
+        SELECT professor, ofertas, matriculas FROM stats_professores
+        WHERE matriculas > 0 ORDER BY matriculas DESC LIMIT ?''',
+    'alunos_com_mais_disciplinas': '''
+        SELECT a.id, a.matricula, a.nome, s.disciplinas FROM stats_alunos s JOIN alunos a ON a.id = s.aluno_id
+        WHERE s.disciplinas > 0 ORDER BY s.disciplinas DESC LIMIT ?''',
+}
+
+# Consulta da listagem plana de cada tabela (mesmas colunas das listas de /api/data) e seu alias
+LIST_QUERIES = {
+    'turmas': ('SELECT t.id, t.nome FROM turmas t', 't'),
+    'disciplinas_catalogo': ('SELECT d.id, d.codigo, d.nome FROM disciplinas_catalogo d', 'd'),
+    'alunos': ('SELECT a.id, a.matricula, a.nome, a.telefone FROM alunos a', 'a'),
+    'turma_disciplinas_ofertas': (
+        '''SELECT o.id, o.turma_id, t.nome AS turma_nome, o.disciplina_catalogo_id,
+                  d.codigo AS disciplina_codigo, d.nome AS disciplina_nome, o.professor
+           FROM turma_disciplinas_ofertas o
+           JOIN turmas t ON t.id = o.turma_id
+           JOIN disciplinas_catalogo d ON d.id = o.disciplina_catalogo_id''',
+        'o',
+    ),
+    'matriculas': (
+        '''SELECT m.id, a.id AS aluno_id, a.matricula AS aluno_matricula, a.nome AS aluno_nome,
+                  o.id AS turma_disciplina_id, t.nome AS turma_nome, d.nome AS disciplina_nome, o.professor
+           FROM matriculas m
+           JOIN alunos a ON a.id = m.aluno_id
+           JOIN turma_disciplinas_ofertas o ON o.id = m.turma_disciplina_id
+           JOIN turmas t ON t.id = o.turma_id
+           JOIN disciplinas_catalogo d ON d.id = o.disciplina_catalogo_id''',
+        'm',
+    ),
+}
+
+# Índices de busca consultados por search em cada listagem: (alias na consulta, tabela). As
+# tabelas de RELATED_SEARCH buscam nas referenciadas, que aparecem no JOIN com o mesmo alias
+# das próprias listagens (t, d)
+SEARCH_TARGETS = {table: [(LIST_QUERIES[table][1], table)] for table in SEARCH_FIELDS}
+SEARCH_TARGETS.update({
+    table: [target for referenced in references.values() for target in SEARCH_TARGETS[referenced]]
+    for table, references in RELATED_SEARCH.items()
+})
+
+# Coluna SQL de cada filtro de LIST_FILTERS
+FILTER_COLUMNS = {
+    'turma_disciplinas_ofertas': {'turma_id': 'o.turma_id', 'disciplina_catalogo_id': 'o.disciplina_catalogo_id'},
+    'matriculas': {'aluno_id': 'm.aluno_id', 'turma_disciplina_id': 'm.turma_disciplina_id', 'turma_id': 'o.turma_id'},
+}
+
+
+def _search_text(*values):
+    """Texto indexado de um registro: os campos de busca normalizados, como no SearchIndex."""
+    return FIELD_SEPARATOR.join(normalize(value) for value in values)
+
+
+def _matching(alias, table, term, placeholder='?'):
+    """Condição SQL (e parâmetros) das linhas de alias cujo registro de table contém term.
+
+    Termos com GRAM caracteres ou mais usam o índice de trigramas (uma frase FTS5 de trigramas
+    casa com o texto como substring); os mais curtos percorrem os textos já normalizados.
+    """
+    term = normalize(term)
+    if len(term) >= GRAM:
+        return (f'{alias}.rowid IN (SELECT rowid FROM search_{table}_fts WHERE search_{table}_fts MATCH {placeholder})',
+                ['"' + term.replace('"', '""') + '"'])
+    return f'{alias}.rowid IN (SELECT registro FROM search_{table} WHERE instr(texto, {placeholder}) > 0)', [term]
+
+
+# Stores deste processo: depois de um fork, o filho abre conexões próprias (uma conexão SQLite
+# não pode ser usada dos dois lados de um fork)
+_stores = weakref.WeakSet()
+
+
+def _after_fork():
+    for store in list(_stores):
+        store._local = threading.local()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class SqliteStore:
+    """Armazenamento em SQLite com a mesma interface do DataStore.
+
+    Cada thread usa a própria conexão; o modo WAL deixa os leitores trabalharem
+    enquanto um worker escreve.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._changed = threading.Condition()
+        self._local_seq = 0  # último seq gravado por este processo (ver wait_for_changes)
+        self._conn().executescript(SCHEMA + SEARCH_SCHEMA)
+        self._init_stats()
+        self._init_search()
+        _stores.add(self)
+
+    def _init_stats(self):
+        """Preenche os contadores de /api/stats se ainda estiverem vazios (banco novo ou anterior a eles)."""
+        with self.transaction() as conn:
+            if conn.execute('SELECT 1 FROM stats_totais').fetchone():
+                return
+            self._backfill_stats(conn)
+
+    @staticmethod
+    def _backfill_stats(conn):
+        for table in ('stats_totais', 'stats_ofertas', 'stats_turmas', 'stats_alunos', 'stats_professores'):
+            conn.execute(f'DELETE FROM {table}')
+        for statement in STATS_BACKFILL:
+            conn.execute(statement)
+
+    def _init_search(self):
+        """Preenche os índices de busca se ainda estiverem vazios e a tabela não (banco anterior a eles)."""
+        with self.transaction() as conn:
+            for table in SEARCH_FIELDS:
+                if (conn.execute(f'SELECT 1 FROM {table} LIMIT 1').fetchone()
+                        and not conn.execute(f'SELECT 1 FROM search_{table} LIMIT 1').fetchone()):
+                    self._backfill_search(conn)
+                    return
+
+    @staticmethod
+    def _backfill_search(conn):
+        for statement in SEARCH_BACKFILL:
+            conn.execute(statement)
+
+    def load_all(self):
+        """Nada a carregar: os dados ficam no banco (mesma interface do DataStore)."""
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA foreign_keys = ON')
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.create_function('search_text', -1, _search_text, deterministic=True)
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Transação de escrita (BEGIN IMMEDIATE); aninhada, reaproveita a transação externa."""
+        conn = self._conn()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        changes = conn.total_changes
+        try:
+            yield conn
+            changed = conn.total_changes != changes
+            if changed:
+                conn.execute('UPDATE data_version SET generation = generation + 1, modified_at = ?', (time.time(),))
+                conn.execute('DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?', (CHANGE_LOG_KEEP,))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        with metrics.span('store.commit'):
+            conn.execute('COMMIT')
+        if changed:
+            with self._changed:
+                self._local_seq = self.last_change_seq()
+                self._changed.notify_all()
+
+    def data_version(self):
+        """Retorna (versão, horário da última alteração), como DataStore.data_version."""
+        generation, modified_at = self._conn().execute('SELECT generation, modified_at FROM data_version').fetchone()
+        return f'{generation:x}.{int(modified_at * 1e6):x}', modified_at
+
+    def last_change_seq(self):
+        return self._conn().execute('SELECT COALESCE(MAX(seq), 0) FROM changes').fetchone()[0]
+
+    def changes_since(self, seq, limit=500):
+        """Eventos posteriores a seq e o último seq, como DataStore.changes_since."""
+        conn = self._conn()
+        first, last = conn.execute('SELECT MIN(seq), COALESCE(MAX(seq), 0) FROM changes').fetchone()
+        if seq > last or (first is not None and first > seq + 1):
+            return None, last
+        rows = conn.execute('SELECT seq, op, entity, record_id AS id FROM changes WHERE seq > ? ORDER BY seq LIMIT ?',
+                            (seq, limit))
+        return [dict(row) for row in rows], last
+
+    def wait_for_changes(self, seq, timeout):
+        """Espera até timeout segundos por um evento posterior a seq gravado por este processo."""
+        with self._changed:
+            self._changed.wait_for(lambda: self._local_seq > seq, timeout)
+
+    @contextlib.contextmanager
+    def consistent_read(self):
+        """Várias leituras que enxergam os mesmos dados (uma transação de leitura)."""
+        conn = self._conn()
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute('BEGIN')
+        try:
+            yield
+        finally:
+            conn.execute('COMMIT')
+
+    def get(self, table, record_id):
+        row = self._conn().execute(f'SELECT * FROM {table} WHERE id = ?', (record_id,)).fetchone()
+        return dict(row) if row else None
+
+    def lookup(self, table, field, value):
+        rows = self._conn().execute(f'SELECT id FROM {table} WHERE {field} = ? ORDER BY rowid', (value,))
+        return [row['id'] for row in rows]
+
+    def find_unique(self, table, **values):
+        where = ' AND '.join(f'{field} = ?' for field in values)
+        row = self._conn().execute(f'SELECT id FROM {table} WHERE {where}', tuple(values.values())).fetchone()
+        return row['id'] if row else None
+
+    def insert(self, table, record):
+        fields = TABLES[table][1]
+        with self.transaction() as conn:
+            conn.execute(
+                f'INSERT INTO {table} ({", ".join(fields)}) VALUES ({", ".join("?" for _ in fields)})',
+                tuple(record[field] for field in fields),
+            )
+            self._log_change(conn, 'insert', table, record['id'])
+
+    def update(self, table, record_id, **fields):
+        assignments = ', '.join(f'{field} = ?' for field in fields)
+        with self.transaction() as conn:
+            conn.execute(f'UPDATE {table} SET {assignments} WHERE id = ?', (*fields.values(), record_id))
+            self._log_change(conn, 'update', table, record_id)
+
+    def delete(self, table, record_id):
+        with self.transaction() as conn:
+            conn.execute(f'DELETE FROM {table} WHERE id = ?', (record_id,))
+            self._log_change(conn, 'delete', table, record_id)
+
+    def all_records(self, table):
+        """Todas as linhas de table, na ordem de inserção (dentro de consistent_read, um só estado)."""
+        fields = ', '.join(TABLES[table][1])
+        return self._conn().execute(f'SELECT {fields} FROM {table} ORDER BY rowid').fetchall()
+
+    def replace_all(self, tables):
+        """Troca todos os dados por tables ({tabela: {id: registro}}) em uma transação.
+
+        Os leitores continuam vendo os dados antigos até o fim dela (WAL). No feed, a troca
+        vira um único evento "reset".
+        """
+        with self.transaction() as conn, self._bulk_load(conn):
+            for table in reversed(TABLES):  # dependentes antes das referenciadas
+                conn.execute(f'DELETE FROM {table}')
+            for table, (_, fields) in TABLES.items():
+                conn.executemany(
+                    f'INSERT INTO {table} ({", ".join(fields)}) VALUES ({", ".join("?" for _ in fields)})',
+                    (tuple(record[field] for field in fields) for record in tables[table].values()),
+                )
+            self._log_change(conn, 'reset', '', '')
+
+    @contextlib.contextmanager
+    def _bulk_load(self, conn):
+        """Carga em massa dentro de uma transação: desliga os gatilhos dos contadores e dos índices
+        de busca e os recalcula de uma vez no final.
+
+        Com os gatilhos, cada linha atualiza os contadores e o índice de trigramas; sem eles, uma
+        carga grande fica várias vezes mais rápida. Se a transação falhar, eles voltam com ela.
+        """
+        triggers = conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+            "AND (name LIKE 'stats_%' OR name LIKE 'search_%')").fetchall()
+        for trigger in triggers:
+            conn.execute(f'DROP TRIGGER {trigger["name"]}')
+        yield
+        self._backfill_stats(conn)
+        self._backfill_search(conn)
+        for trigger in triggers:
+            conn.execute(trigger['sql'])
+
+    @staticmethod
+    def _log_change(conn, op, table, record_id):
+        conn.execute('INSERT INTO changes (op, entity, record_id) VALUES (?, ?, ?)', (op, table, record_id))
+
+    def suggest(self, table, term, limit=10):
+        """Registros de table para autocompletar term, na mesma ordem do DataStore (ver SearchIndex.suggest)."""
+        normalized = normalize(term)
+        if not normalized:
+            return []
+        conn = self._conn()
+        # Caso comum: há ao menos limit textos começando com term, já em ordem no índice
+        rows = conn.execute(
+            f'''SELECT x.* FROM search_{table} s JOIN {table} x ON x.rowid = s.registro
+                WHERE s.texto >= :term AND s.texto < :term || char(1114111)
+                ORDER BY s.texto, x.id LIMIT :limit''',
+            {'term': normalized, 'limit': limit},
+        ).fetchall()
+        if len(rows) < limit:
+            condition, params = _matching('x', table, term, ':match')
+            # suggestion_key em SQL: começa com o termo, tem uma palavra (ou campo) começando com ele, o resto
+            rows = conn.execute(
+                f'''SELECT x.* FROM search_{table} s JOIN {table} x ON x.rowid = s.registro
+                    WHERE {condition}
+                    ORDER BY CASE WHEN substr(s.texto, 1, length(:term)) = :term THEN 0
+                                  WHEN instr(s.texto, ' ' || :term) > 0 OR instr(s.texto, char(31) || :term) > 0 THEN 1
+                                  ELSE 2 END,
+                             s.texto, x.id
+                    LIMIT :limit''',
+                {'match': params[0], 'term': normalized, 'limit': limit},
+            )
+        return [dict(row) for row in rows]
+
+    def list_page(self, table, offset=0, limit=50, search=None, **filters):
+        """Uma página da listagem plana de table. Retorna (linhas, total de linhas encontradas).
+
+        O total conta as linhas do JOIN, como o DataStore, que também omite registros com
+        referências inexistentes.
+        """
+        query, alias = LIST_QUERIES[table]
+        where, params = [], []
+        for field, value in filters.items():
+            where.append(f'{FILTER_COLUMNS[table][field]} = ?')
+            params.append(value)
+        if search and table in SEARCH_TARGETS:
+            conditions = []
+            for target_alias, target in SEARCH_TARGETS[table]:
+                condition, condition_params = _matching(target_alias, target, search)
+                conditions.append(condition)
+                params.extend(condition_params)
+            where.append('(' + ' OR '.join(conditions) + ')')
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+
+        # Matrículas de uma turma vêm agrupadas por oferta, como no DataStore
+        order = f'{alias}.rowid' if not (table == 'matriculas' and 'turma_id' in filters) else 'o.rowid, m.rowid'
+
+        conn = self._conn()
+        with metrics.span('store.list_page'):
+            total = conn.execute(f'SELECT COUNT(*) FROM ({query})', params).fetchone()[0]
+            rows = conn.execute(f'{query} ORDER BY {order} LIMIT ? OFFSET ?', (*params, limit, offset))
+            return [dict(row) for row in rows], total
+
+    def list_rows(self, table, ids):
+        """Linhas da listagem plana dos registros com esses IDs ({id: linha}), como no DataStore."""
+        query, alias = LIST_QUERIES[table]
+        ids = list(ids)
+        rows = {}
+        conn = self._conn()
+        for start in range(0, len(ids), 500):  # limite de parâmetros por consulta
+            chunk = ids[start:start + 500]
+            placeholders = ', '.join('?' for _ in chunk)
+            for row in conn.execute(f'{query} WHERE {alias}.id IN ({placeholders})', chunk):
+                rows[row['id']] = dict(row)
+        return rows
+
+    def stats(self, limit=10):
+        """Mesma resposta do DataStore.stats, lida das tabelas de contadores."""
+        conn = self._conn()
+        with self.consistent_read():
+            totals = dict(conn.execute('SELECT tabela, total FROM stats_totais').fetchall())
+            totals = {table: totals.get(table, 0) for table in TABLES}
+            result = {'totais': totals, 'medias': averages(totals)}
+            for name, query in STATS_QUERIES.items():
+                result[name] = [dict(row) for row in conn.execute(query, (limit,))]
+            return result
+
+    def iter_roster(self, turma_id=None, disciplina_catalogo_id=None, professor=None):
+        """Gera as linhas do relatório de matrículas a partir de um cursor, sem carregar tudo."""
+        where, params = [], []
+        for column, value in (('o.turma_id', turma_id), ('o.disciplina_catalogo_id', disciplina_catalogo_id),
+                              ('o.professor', professor)):
+            if value:
+                where.append(f'{column} = ?')
+                params.append(value)
+        query = '''SELECT t.id, t.nome, o.id, d.codigo, d.nome, o.professor, m.id, a.id, a.matricula, a.nome, a.telefone
+                   FROM matriculas m
+                   JOIN alunos a ON a.id = m.aluno_id
+                   JOIN turma_disciplinas_ofertas o ON o.id = m.turma_disciplina_id
+                   JOIN turmas t ON t.id = o.turma_id
+                   JOIN disciplinas_catalogo d ON d.id = o.disciplina_catalogo_id'''
+        if where:
+            query += ' WHERE ' + ' AND '.join(where)
+        # Conexão própria: o cursor fica aberto enquanto a resposta é enviada
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(query + ' ORDER BY o.rowid, m.rowid', params)
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(ROSTER_FIELDS, row))
+        finally:
+            conn.close()
+
+    def full_data(self, search_turma=None, search_disciplina=None, search_aluno=None):
+        """Mesma resposta do DataStore.full_data, montada com JOINs."""
+        with metrics.span('store.full_data'), self.consistent_read():
+            return self._full_data(self._conn(), search_turma, search_disciplina, search_aluno)
+
+    def normalized_data(self, search_turma=None, search_disciplina=None, search_aluno=None):
+        """Mesma resposta do DataStore.normalized_data: cada registro uma vez, sem JOINs."""
+        conn = self._conn()
+        result = {}
+        with metrics.span('store.full_data'), self.consistent_read():
+            for table, term in (('turmas', search_turma), ('disciplinas_catalogo', search_disciplina),
+                                ('alunos', search_aluno), ('turma_disciplinas_ofertas', None), ('matriculas', None)):
+                query = f'SELECT {", ".join(TABLES[table][1])} FROM {table} x'
+                params = []
+                if term:
+                    condition, params = _matching('x', table, term)
+                    query += ' WHERE ' + condition
+                result[table] = [dict(row) for row in conn.execute(query + ' ORDER BY x.rowid', params)]
+        return result
+
+    def _full_data(self, conn, search_turma, search_disciplina, search_aluno):
+        def where(alias, table, term):
+            """WHERE (e parâmetros) do filtro de busca opcional de uma consulta."""
+            if not term:
+                return '', []
+            condition, params = _matching(alias, table, term)
+            return 'WHERE ' + condition, params
+
+        turmas = []
+        turmas_by_id = {}
+        condition, params = where('t', 'turmas', search_turma)
+        rows = conn.execute(f'SELECT t.id, t.nome FROM turmas t {condition} ORDER BY t.rowid', params)
+        for row in rows:
+            turma = {'id': row['id'], 'nome': row['nome'], 'disciplinas': []}
+            turmas.append(turma)
+            turmas_by_id[row['id']] = turma
+
+        ofertas_by_id = {}
+        condition, params = where('d', 'disciplinas_catalogo', search_disciplina)
+        rows = conn.execute(
+            f'''SELECT o.id, o.turma_id, o.professor, d.id AS disciplina_catalogo_id, d.codigo, d.nome
+                FROM turma_disciplinas_ofertas o
+                JOIN disciplinas_catalogo d ON d.id = o.disciplina_catalogo_id
+                {condition}
+                ORDER BY o.rowid''',
+            params,
+        )
+        for row in rows:
+            turma = turmas_by_id.get(row['turma_id'])
+            if turma is None:
+                continue
+            oferta = {
+                'id': row['id'],
+                'codigo': row['codigo'],
+                'nome': row['nome'],
+                'professor': row['professor'],
+                'alunos': [],
+                'disciplina_catalogo_id': row['disciplina_catalogo_id'],
+            }
+            turma['disciplinas'].append(oferta)
+            ofertas_by_id[row['id']] = oferta
+
+        condition, params = where('a', 'alunos', search_aluno)
+        rows = conn.execute(
+            f'''SELECT m.id AS matricula_id, m.turma_disciplina_id, a.id, a.matricula, a.nome, a.telefone
+                FROM matriculas m
+                JOIN alunos a ON a.id = m.aluno_id
+                {condition}
+                ORDER BY m.rowid''',
+            params,
+        )
+        for row in rows:
+            oferta = ofertas_by_id.get(row['turma_disciplina_id'])
+            if oferta is not None:
+                oferta['alunos'].append({
+                    'id': row['id'],
+                    'matricula': row['matricula'],
+                    'nome': row['nome'],
+                    'telefone': row['telefone'],
+                    'matricula_id': row['matricula_id'],
+                })
+
+        condition, params = where('d', 'disciplinas_catalogo', search_disciplina)
+        disciplinas_catalogo_list = [dict(row) for row in conn.execute(
+            f'SELECT d.id, d.codigo, d.nome FROM disciplinas_catalogo d {condition} ORDER BY d.rowid', params,
+        )]
+        condition, params = where('a', 'alunos', search_aluno)
+        alunos_list = [dict(row) for row in conn.execute(
+            f'SELECT a.id, a.matricula, a.nome, a.telefone FROM alunos a {condition} ORDER BY a.rowid', params,
+        )]
+        ofertas_list = [dict(row) for row in conn.execute(
+            LIST_QUERIES['turma_disciplinas_ofertas'][0] + ' ORDER BY o.rowid'
+        )]
+        matriculas_list = [dict(row) for row in conn.execute(LIST_QUERIES['matriculas'][0] + ' ORDER BY m.rowid')]
+
+        return {
+            'turmas': turmas,
+            'disciplinas_catalogo': disciplinas_catalogo_list,
+            'alunos': alunos_list,
+            'turma_disciplinas_ofertas': ofertas_list,
+            'matriculas': matriculas_list
+        }
+
+
+def import_txt_data(data_dir, db_path):
+    """Importa os arquivos .txt (e o journal) para o banco SQLite.
+
+    Registros que violariam as chaves únicas ou estrangeiras (que o formato em
+    arquivos não impedia) são ignorados. Retorna {tabela: (importados, ignorados)}.
+    """
+    source = DataStore(data_dir)
+    target = SqliteStore(db_path)
+    report = {}
+    with target.transaction() as conn, target._bulk_load(conn):
+        for table, (_, fields) in TABLES.items():  # em ordem de dependência
+            sql = f'INSERT INTO {table} ({", ".join(fields)}) VALUES ({", ".join("?" for _ in fields)})'
+            imported = skipped = 0
+            for record in source.tables[table].values():
+                try:
+                    conn.execute(sql, tuple(record[field] for field in fields))
+                    imported += 1
+                except sqlite3.IntegrityError:
+                    skipped += 1
+            report[table] = (imported, skipped)
+    return report
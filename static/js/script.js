@@ -1,5 +1,8 @@
 document.addEventListener('DOMContentLoaded', () => {
     fetchData();
+    startChangeFeed();
+    ['turma', 'disciplina', 'aluno'].forEach(setupSuggestions);
+    setupOptionFilters();
 });
 
 let currentData = {
@@ -17,42 +20,188 @@ let currentSearchTerms = { // Para manter os termos de busca entre as chamadas
 };
 let currentActiveSection = 'turmas'; // Para saber qual seção está ativa
 
-// Modificada para aceitar parâmetros de busca
-async function fetchData(section = currentActiveSection) {
-    currentActiveSection = section; // Atualiza a seção ativa
+const PAGE_SIZE = 50; // Itens por página nas listagens
+const SELECT_LIMIT = 1000; // Máximo de opções carregadas nos dropdowns (as demais aparecem filtrando)
+const OPTION_FILTER_DELAY_MS = 250; // Espera a pessoa parar de digitar no filtro antes de buscar
+
+let currentOffsets = { // Página atual (offset) de cada listagem
+    turmas: 0,
+    disciplinas_catalogo: 0,
+    alunos: 0,
+    turma_disciplinas_ofertas: 0,
+    matriculas: 0
+};
+let currentTotals = {}; // Total de registros de cada listagem (para a paginação)
+let currentOptions = { // Opções dos dropdowns da seção de matrículas
+    turmas: [],
+    disciplinas_catalogo: [],
+    alunos: [],
+    turma_disciplinas_ofertas: []
+};
+let currentOptionTotals = {}; // Total de registros de cada dropdown (com o filtro atual)
+let currentOptionSearch = { // Termo do campo de filtro de cada dropdown
+    turmas: '',
+    disciplinas_catalogo: '',
+    alunos: '',
+    turma_disciplinas_ofertas: ''
+};
+const OPTION_SELECTS = { // Prefixo do id do dropdown (-select) e do seu filtro (-filter)
+    turma_disciplinas_ofertas: 'matricula-turma-disciplina',
+    alunos: 'matricula-aluno',
+    turmas: 'oferta-turma',
+    disciplinas_catalogo: 'oferta-disciplina'
+};
+const OPTION_FIELDS = { // Campos carregados para cada dropdown
+    turma_disciplinas_ofertas: 'id,turma_nome,disciplina_nome,professor',
+    alunos: 'id,nome,matricula',
+    turmas: 'id,nome',
+    disciplinas_catalogo: 'id,nome,codigo'
+};
 
-    let url = '/api/data';
-    const params = new URLSearchParams();
+// Últimas respostas recebidas por URL, com o ETag: se os dados não mudaram, o servidor
+// responde 304 e a resposta guardada é reaproveitada sem baixar tudo de novo
+const MAX_CACHED_RESPONSES = 100;
+const responseCache = new Map(); // url -> { etag, data }
+
+// Busca uma página de /api/<entity> (listagens paginadas)
+async function fetchList(entity, params = {}) {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+        if (value !== undefined && value !== null && value !== '') {
+            query.append(key, value);
+        }
+    });
+    const url = `/api/${entity}?${query.toString()}`;
+    const cached = responseCache.get(url);
+    const headers = cached ? { 'If-None-Match': cached.etag } : {};
+    const response = await fetch(url, { headers: headers, cache: 'no-store' });
+    if (response.status === 304 && cached) {
+        return cached.data;
+    }
+    if (!response.ok) {
+        throw new Error(`Erro ao buscar ${entity}: ${response.status}`);
+    }
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        responseCache.delete(url);
+        responseCache.set(url, { etag: etag, data: data });
+        if (responseCache.size > MAX_CACHED_RESPONSES) {
+            responseCache.delete(responseCache.keys().next().value); // Remove a mais antiga
+        }
+    }
+    return data;
+}
 
-    // Adiciona termos de busca baseados na seção ativa
-    if (section === 'turmas' && currentSearchTerms.turma) {
-        params.append('search_turma', currentSearchTerms.turma);
-    } else if (section === 'disciplinas_catalogo' && currentSearchTerms.disciplina) { // Corrigido para disciplinas_catalogo
-        params.append('search_disciplina', currentSearchTerms.disciplina);
-    } else if (section === 'alunos' && currentSearchTerms.aluno) {
-        params.append('search_aluno', currentSearchTerms.aluno);
+// Carrega em currentData a página atual de uma listagem
+async function loadPage(entity, search) {
+    let page = await fetchList(entity, { limit: PAGE_SIZE, offset: currentOffsets[entity], search: search });
+    if (page.items.length === 0 && currentOffsets[entity] > 0) {
+        // A página atual ficou vazia (ex.: após remoções): volta para a última página
+        currentOffsets[entity] = Math.max(0, Math.floor((page.total - 1) / PAGE_SIZE) * PAGE_SIZE);
+        page = await fetchList(entity, { limit: PAGE_SIZE, offset: currentOffsets[entity], search: search });
     }
+    currentData[entity] = page.items;
+    currentTotals[entity] = page.total;
+}
 
-    if (params.toString()) {
-        url += '?' + params.toString();
+// Carrega opções para os dropdowns (apenas os campos necessários), com o filtro digitado
+async function loadOptions(entity, fields) {
+    const search = currentOptionSearch[entity];
+    const page = await fetchList(entity, { limit: SELECT_LIMIT, fields: fields, search: search });
+    if (search !== currentOptionSearch[entity]) {
+        return; // O filtro mudou enquanto esta busca voltava: vale a busca mais nova
     }
+    currentOptions[entity] = page.items;
+    currentOptionTotals[entity] = page.total;
+}
+
+// Campos de filtro dos dropdowns: com dezenas de milhares de alunos, só os SELECT_LIMIT
+// primeiros cabem no dropdown; os outros são encontrados pelo nome, matrícula ou código
+function setupOptionFilters() {
+    Object.entries(OPTION_SELECTS).forEach(([entity, prefix]) => {
+        const input = document.getElementById(`${prefix}-filter`);
+        if (!input) return;
+        let timer = null;
+        input.addEventListener('input', () => {
+            clearTimeout(timer);
+            timer = setTimeout(async () => {
+                currentOptionSearch[entity] = input.value.trim();
+                try {
+                    await loadOptions(entity, OPTION_FIELDS[entity]);
+                } catch (error) {
+                    console.error('Erro ao filtrar opções:', error);
+                    return;
+                }
+                updateSelects();
+            }, OPTION_FILTER_DELAY_MS);
+        });
+    });
+}
+
+// Busca apenas os dados da seção ativa
+async function fetchData(section = currentActiveSection) {
+    currentActiveSection = section; // Atualiza a seção ativa
 
     try {
-        const response = await fetch(url);
-        currentData = await response.json();
+        if (section === 'turmas') {
+            await loadPage('turmas', currentSearchTerms.turma);
+        } else if (section === 'disciplinas_catalogo') {
+            await loadPage('disciplinas_catalogo', currentSearchTerms.disciplina);
+        } else if (section === 'alunos') {
+            await loadPage('alunos', currentSearchTerms.aluno);
+        } else if (section === 'matriculas') {
+            await Promise.all([
+                loadPage('matriculas'),
+                loadPage('turma_disciplinas_ofertas'),
+                ...Object.keys(OPTION_FIELDS).map(entity => loadOptions(entity, OPTION_FIELDS[entity]))
+            ]);
+        }
+        renderSection(section);
         console.log("Dados carregados:", currentData); // Para debug
+    } catch (error) {
+        console.error('Erro ao buscar dados:', error);
+        alert('Erro ao carregar dados do servidor.');
+    }
+}
+
+// Renderiza as listagens (e os dropdowns) de uma seção a partir de currentData/currentOptions
+function renderSection(section) {
+    if (section === 'turmas') {
         renderTurmas();
+    } else if (section === 'disciplinas_catalogo') {
         renderDisciplinas(); // Renderiza catálogo
+    } else if (section === 'alunos') {
         renderAlunos();
+    } else if (section === 'matriculas') {
         renderOfertasDisciplinas(); // Renderiza ofertas
         renderMatriculas(); // Renderiza matrículas
         updateSelects(); // Atualiza dropdowns
-    } catch (error) {
-        console.error('Erro ao buscar dados:', error);
-        alert('Erro ao carregar dados do servidor.');
     }
 }
 
+// Adiciona os botões de paginação ao final de uma listagem
+function renderPager(container, entity) {
+    const total = currentTotals[entity] || 0;
+    if (total <= PAGE_SIZE) {
+        return;
+    }
+    const offset = currentOffsets[entity];
+    const pagerDiv = document.createElement('div');
+    pagerDiv.classList.add('pager');
+    pagerDiv.innerHTML = `
+        <button onclick="changePage('${entity}', -1)" ${offset === 0 ? 'disabled' : ''}>Anterior</button>
+        <span>${offset + 1}–${Math.min(offset + PAGE_SIZE, total)} de ${total}</span>
+        <button onclick="changePage('${entity}', 1)" ${offset + PAGE_SIZE >= total ? 'disabled' : ''}>Próxima</button>
+    `;
+    container.appendChild(pagerDiv);
+}
+
+function changePage(entity, direction) {
+    currentOffsets[entity] = Math.max(0, currentOffsets[entity] + direction * PAGE_SIZE);
+    fetchData(currentActiveSection);
+}
+
 function showSection(sectionId) {
     const sections = document.querySelectorAll('.section');
     sections.forEach(section => {
@@ -64,6 +213,167 @@ function showSection(sectionId) {
 }
 
 
+// --- Feed de alterações (Server-Sent Events) ---
+// Cada alteração, feita nesta aba ou em outra, chega como um evento com o registro atualizado
+// e é aplicada à página e aos dropdowns já carregados. Só quando não dá para calcular aqui como
+// a página fica (ex.: com uma busca ativa) aquela listagem é buscada de novo.
+
+const SEARCH_TERM_KEYS = { turmas: 'turma', disciplinas_catalogo: 'disciplina', alunos: 'aluno' };
+const SECTION_LISTS = { // Listagens exibidas em cada seção
+    turmas: ['turmas'],
+    disciplinas_catalogo: ['disciplinas_catalogo'],
+    alunos: ['alunos'],
+    matriculas: ['turma_disciplinas_ofertas', 'matriculas']
+};
+const CHANGE_RENDER_DELAY_MS = 50; // Agrupa os eventos que chegam juntos (ex.: de um lote) em uma renderização
+
+let changeFeed = null;
+let pendingReloads = new Set(); // Listagens ('entidade') e dropdowns ('options:entidade') a buscar de novo
+let renderScheduled = false;
+
+const CHANGE_FEED_RETRY_MS = 60000; // Nova tentativa quando o servidor recusa o stream (503)
+
+function startChangeFeed() {
+    // Sem SSE, ou quando o servidor não anuncia um stream que não prende threads (modo WSGI),
+    // cada seção é recarregada após as alterações feitas nela
+    if (!window.EventSource || document.body.dataset.changeStream !== 'on') {
+        return;
+    }
+    changeFeed = new EventSource('/api/changes/stream');
+    // Stream recusado (503: vagas ocupadas): o navegador não reconecta sozinho
+    changeFeed.addEventListener('error', () => {
+        if (changeFeed.readyState === EventSource.CLOSED) {
+            setTimeout(startChangeFeed, CHANGE_FEED_RETRY_MS);
+        }
+    });
+    // Ao (re)conectar, revalida a seção para pegar o que mudou sem o feed (304 se nada mudou)
+    changeFeed.addEventListener('open', () => fetchData(currentActiveSection));
+    changeFeed.addEventListener('change', event => applyChange(JSON.parse(event.data)));
+    // Eventos perdidos (ficou desconectado por muito tempo): recarrega a seção
+    changeFeed.addEventListener('reset', () => fetchData(currentActiveSection));
+}
+
+// Depois de uma alteração feita nesta aba: com o feed conectado ela chega como evento
+function refreshAfterWrite(section) {
+    if (changeFeed && changeFeed.readyState === EventSource.OPEN) {
+        return;
+    }
+    fetchData(section);
+}
+
+function applyChange(change) {
+    const lists = SECTION_LISTS[currentActiveSection] || [];
+    if (lists.includes(change.entity) && !patchList(change)) {
+        pendingReloads.add(change.entity);
+    }
+    if (currentActiveSection === 'matriculas') {
+        patchOptions(change);
+        if (change.op === 'update' && change.entity !== 'matriculas') {
+            // Nomes de turmas, disciplinas, alunos e professores se repetem nas linhas das
+            // ofertas e das matrículas: busca essas páginas de novo
+            lists.filter(entity => entity !== change.entity).forEach(entity => pendingReloads.add(entity));
+        }
+    }
+    if (!renderScheduled) {
+        renderScheduled = true;
+        setTimeout(flushChanges, CHANGE_RENDER_DELAY_MS);
+    }
+}
+
+// Aplica um evento à página carregada de uma listagem; retorna false se for preciso buscá-la de novo
+function patchList(change) {
+    const entity = change.entity;
+    const items = currentData[entity];
+    const index = items.findIndex(item => item.id === change.id);
+    const total = currentTotals[entity] || 0;
+    const offset = currentOffsets[entity];
+
+    if (change.op === 'update') {
+        if (index >= 0 && change.record) {
+            items[index] = change.record;
+        }
+        // Com uma busca ativa, o registro pode ter deixado de (ou passado a) aparecer nela
+        return !currentSearchTerms[SEARCH_TERM_KEYS[entity]];
+    }
+    if (currentSearchTerms[SEARCH_TERM_KEYS[entity]]) {
+        return false; // Não dá para saber aqui se o registro entra na busca
+    }
+    if (change.op === 'insert') {
+        // Registros novos vão para o fim da listagem: aparecem se esta for a última página
+        if (change.record && offset + items.length === total && items.length < PAGE_SIZE) {
+            items.push(change.record);
+        }
+        currentTotals[entity] = total + 1;
+        return true;
+    }
+    // Remoção
+    currentTotals[entity] = Math.max(0, total - 1);
+    if (index >= 0) {
+        items.splice(index, 1);
+        // Havendo próxima página, o primeiro item dela sobe para esta; página vazia volta uma
+        return offset + items.length + 1 >= total && (items.length > 0 || offset === 0);
+    }
+    return offset === 0; // Se o registro estava em uma página anterior, os desta mudaram
+}
+
+// Aplica um evento às opções dos dropdowns da seção de matrículas
+function patchOptions(change) {
+    const entity = change.entity;
+    const options = currentOptions[entity];
+    if (!options) {
+        return;
+    }
+    if (change.op === 'update' && (entity === 'turmas' || entity === 'disciplinas_catalogo')) {
+        pendingReloads.add('options:turma_disciplinas_ofertas'); // Os rótulos das ofertas usam esses nomes
+    }
+    const truncated = (currentOptionTotals[entity] || 0) > options.length;
+    if (currentOptionSearch[entity] || (truncated && change.op !== 'update')) {
+        // Com um filtro ou com a lista cortada, não dá para saber aqui o que entra ou sai dela
+        pendingReloads.add(`options:${entity}`);
+        return;
+    }
+    const index = options.findIndex(option => option.id === change.id);
+    if (change.op === 'delete' || !change.record) {
+        if (index >= 0) {
+            options.splice(index, 1);
+        }
+    } else {
+        const option = {};
+        OPTION_FIELDS[entity].split(',').forEach(field => { option[field] = change.record[field]; });
+        if (index >= 0) {
+            options[index] = option;
+        } else if (change.op === 'insert') {
+            options.push(option);
+        }
+    }
+    if (truncated) {
+        return;
+    }
+    currentOptionTotals[entity] = options.length;
+    if (options.length > SELECT_LIMIT) {
+        options.length = SELECT_LIMIT; // O total segue contando o registro que ficou de fora
+    }
+}
+
+async function flushChanges() {
+    renderScheduled = false;
+    const reloads = [...pendingReloads];
+    pendingReloads.clear();
+    try {
+        await Promise.all(reloads.map(target => {
+            if (target.startsWith('options:')) {
+                const entity = target.slice('options:'.length);
+                return loadOptions(entity, OPTION_FIELDS[entity]);
+            }
+            return loadPage(target, currentSearchTerms[SEARCH_TERM_KEYS[target]]);
+        }));
+    } catch (error) {
+        console.error('Erro ao atualizar as listagens:', error);
+    }
+    renderSection(currentActiveSection);
+}
+
+
 // --- Funções de Renderização ---
 
 function renderTurmas() {
@@ -80,12 +390,13 @@ function renderTurmas() {
         turmaDiv.innerHTML = `
             <span>ID: ${turma.id}, Nome: ${turma.nome}</span>
             <div class="actions">
-                <button onclick="editTurma('${turma.id}', '${turma.nome}')">Editar</button>
-                <button onclick="deleteTurma('${turma.id}')">Remover</button>
+                <button onclick="editTurma('${turma.id}', '${turma.nome}', '${turma.version}')">Editar</button>
+                <button onclick="deleteTurma('${turma.id}', '${turma.version}')">Remover</button>
             </div>
         `;
         container.appendChild(turmaDiv);
     });
+    renderPager(container, 'turmas');
 }
 
 function renderDisciplinas() { // Renderiza Catálogo de Disciplinas
@@ -102,12 +413,13 @@ function renderDisciplinas() { // Renderiza Catálogo de Disciplinas
         disciplinaDiv.innerHTML = `
             <span>ID: ${disciplina.id}, Código: ${disciplina.codigo}, Nome: ${disciplina.nome}</span>
             <div class="actions">
-                <button onclick="editDisciplina('${disciplina.id}', '${disciplina.codigo}', '${disciplina.nome}')">Editar</button>
-                <button onclick="deleteDisciplina('${disciplina.id}')">Remover</button>
+                <button onclick="editDisciplina('${disciplina.id}', '${disciplina.codigo}', '${disciplina.nome}', '${disciplina.version}')">Editar</button>
+                <button onclick="deleteDisciplina('${disciplina.id}', '${disciplina.version}')">Remover</button>
             </div>
         `;
         container.appendChild(disciplinaDiv);
     });
+    renderPager(container, 'disciplinas_catalogo');
 }
 
 function renderAlunos() {
@@ -124,12 +436,13 @@ function renderAlunos() {
         alunoDiv.innerHTML = `
             <span>ID: ${aluno.id}, Matrícula: ${aluno.matricula}, Nome: ${aluno.nome}, Telefone: ${aluno.telefone}</span>
             <div class="actions">
-                <button onclick="editAluno('${aluno.id}', '${aluno.matricula}', '${aluno.nome}', '${aluno.telefone}')">Editar</button>
-                <button onclick="deleteAluno('${aluno.id}')">Remover</button>
+                <button onclick="editAluno('${aluno.id}', '${aluno.matricula}', '${aluno.nome}', '${aluno.telefone}', '${aluno.version}')">Editar</button>
+                <button onclick="deleteAluno('${aluno.id}', '${aluno.version}')">Remover</button>
             </div>
         `;
         container.appendChild(alunoDiv);
     });
+    renderPager(container, 'alunos');
 }
 
 function renderOfertasDisciplinas() { // Renderiza ofertas de disciplina
@@ -146,12 +459,13 @@ function renderOfertasDisciplinas() { // Renderiza ofertas de disciplina
         ofertaDiv.innerHTML = `
             <span>ID Oferta: ${oferta.id}, Turma: ${oferta.turma_nome}, Disciplina: ${oferta.disciplina_nome} (${oferta.disciplina_codigo}), Professor: ${oferta.professor}</span>
             <div class="actions">
-                <button onclick="editOfertaDisciplina('${oferta.id}', '${oferta.professor}')">Editar</button>
-                <button onclick="deleteOfertaDisciplina('${oferta.id}')">Remover</button>
+                <button onclick="editOfertaDisciplina('${oferta.id}', '${oferta.professor}', '${oferta.version}')">Editar</button>
+                <button onclick="deleteOfertaDisciplina('${oferta.id}', '${oferta.version}')">Remover</button>
             </div>
         `;
         container.appendChild(ofertaDiv);
     });
+    renderPager(container, 'turma_disciplinas_ofertas');
 }
 
 function renderMatriculas() { // Renderiza matrículas
@@ -168,19 +482,24 @@ function renderMatriculas() { // Renderiza matrículas
         matriculaDiv.innerHTML = `
             <span>ID Matrícula: ${matricula.id}, Aluno: ${matricula.aluno_nome} (${matricula.aluno_matricula}), Disciplina: ${matricula.disciplina_nome} (${matricula.professor}) em ${matricula.turma_nome}</span>
             <div class="actions">
-                <button onclick="deleteMatricula('${matricula.id}')">Remover</button>
+                <button onclick="deleteMatricula('${matricula.id}', '${matricula.version}')">Remover</button>
             </div>
         `;
         container.appendChild(matriculaDiv);
     });
+    renderPager(container, 'matriculas');
 }
 
 // --- Funções para Preencher Selects (Dropdowns) ---
 function updateSelects() {
+    // Os dropdowns são redesenhados a cada alteração recebida: mantém o que estava escolhido
+    const selectIds = ['matricula-turma-disciplina-select', 'matricula-aluno-select', 'oferta-turma-select', 'oferta-disciplina-select'];
+    const selected = selectIds.map(id => document.getElementById(id).value);
+
     // Select de ofertas para Matrícula
     const matriculaTurmaDisciplinaSelect = document.getElementById('matricula-turma-disciplina-select');
     matriculaTurmaDisciplinaSelect.innerHTML = '<option value="">Selecione uma oferta de disciplina</option>';
-    currentData.turma_disciplinas_ofertas.forEach(oferta => {
+    currentOptions.turma_disciplinas_ofertas.forEach(oferta => {
         const option = document.createElement('option');
         option.value = oferta.id;
         option.textContent = `Turma: ${oferta.turma_nome} - ${oferta.disciplina_nome} (${oferta.professor})`;
@@ -190,7 +509,7 @@ function updateSelects() {
     // Select de Alunos para Matrícula
     const matriculaAlunoSelect = document.getElementById('matricula-aluno-select');
     matriculaAlunoSelect.innerHTML = '<option value="">Selecione um aluno</option>';
-    currentData.alunos.forEach(aluno => {
+    currentOptions.alunos.forEach(aluno => {
         const option = document.createElement('option');
         option.value = aluno.id;
         option.textContent = `${aluno.nome} (${aluno.matricula})`;
@@ -200,7 +519,7 @@ function updateSelects() {
     // Select de Turmas para Oferta de Disciplina
     const ofertaTurmaSelect = document.getElementById('oferta-turma-select');
     ofertaTurmaSelect.innerHTML = '<option value="">Selecione uma turma</option>';
-    currentData.turmas.forEach(turma => {
+    currentOptions.turmas.forEach(turma => {
         const option = document.createElement('option');
         option.value = turma.id;
         option.textContent = turma.nome;
@@ -210,12 +529,33 @@ function updateSelects() {
     // Select de Disciplinas (Catálogo) para Oferta de Disciplina
     const ofertaDisciplinaSelect = document.getElementById('oferta-disciplina-select');
     ofertaDisciplinaSelect.innerHTML = '<option value="">Selecione uma disciplina do catálogo</option>';
-    currentData.disciplinas_catalogo.forEach(disciplina => {
+    currentOptions.disciplinas_catalogo.forEach(disciplina => {
         const option = document.createElement('option');
         option.value = disciplina.id;
         option.textContent = `${disciplina.nome} (${disciplina.codigo})`;
         ofertaDisciplinaSelect.appendChild(option);
     });
+
+    Object.entries(OPTION_SELECTS).forEach(([entity, prefix]) => appendOptionsNotice(entity, prefix));
+    selectIds.forEach((id, i) => { document.getElementById(id).value = selected[i]; });
+}
+
+// Avisa no fim do dropdown quando nem todos os registros couberam nele (ou quando o filtro não achou nada)
+function appendOptionsNotice(entity, prefix) {
+    const loaded = currentOptions[entity].length;
+    const total = currentOptionTotals[entity] || 0;
+    let text = null;
+    if (total > loaded) {
+        text = `… e mais ${total - loaded} (digite no filtro para encontrar)`;
+    } else if (loaded === 0 && currentOptionSearch[entity]) {
+        text = 'Nenhum registro encontrado para o filtro';
+    }
+    if (text) {
+        const option = document.createElement('option');
+        option.disabled = true;
+        option.textContent = text;
+        document.getElementById(`${prefix}-select`).appendChild(option);
+    }
 }
 
 
@@ -239,7 +579,7 @@ async function addTurma() {
         if (response.ok) {
             alert(result.message);
             document.getElementById('turma-nome').value = '';
-            fetchData('turmas'); // Recarrega os dados da seção de turmas
+            refreshAfterWrite('turmas'); // Recarrega os dados da seção de turmas
         } else {
             alert('Erro: ' + result.error);
         }
@@ -270,7 +610,7 @@ async function addDisciplina() { // Esta função é para o Catálogo de Discipl
             alert(result.message);
             document.getElementById('disciplina-codigo').value = '';
             document.getElementById('disciplina-nome').value = '';
-            fetchData('disciplinas_catalogo'); // Recarrega os dados do catálogo
+            refreshAfterWrite('disciplinas_catalogo'); // Recarrega os dados do catálogo
         } else {
             alert('Erro: ' + result.error);
         }
@@ -302,7 +642,7 @@ async function addAluno() {
             document.getElementById('aluno-matricula').value = '';
             document.getElementById('aluno-nome').value = '';
             document.getElementById('aluno-telefone').value = '';
-            fetchData('alunos'); // Recarrega os dados da seção de alunos
+            refreshAfterWrite('alunos'); // Recarrega os dados da seção de alunos
         } else {
             alert('Erro: ' + result.error);
         }
@@ -336,7 +676,7 @@ async function addOfertaDisciplina() {
             document.getElementById('oferta-turma-select').value = '';
             document.getElementById('oferta-disciplina-select').value = '';
             document.getElementById('oferta-professor').value = '';
-            fetchData('matriculas'); // Recarrega a seção de matrículas/ofertas
+            refreshAfterWrite('matriculas'); // Recarrega a seção de matrículas/ofertas
         } else {
             alert('Erro: ' + result.error);
         }
@@ -369,7 +709,7 @@ async function addMatricula() {
             alert(result.message);
             document.getElementById('matricula-aluno-select').value = '';
             document.getElementById('matricula-turma-disciplina-select').value = '';
-            fetchData('matriculas'); // Recarrega os dados das matrículas
+            refreshAfterWrite('matriculas'); // Recarrega os dados das matrículas
         } else {
             alert('Erro: ' + result.error);
         }
@@ -383,10 +723,12 @@ async function addMatricula() {
 // --- Funções de Edição (PUT) ---
 let currentEditId = null;
 let currentEditType = null;
+let currentEditVersion = null; // Versão do registro, enviada em If-Match (controle de concorrência)
 
 function openModal(id, type, data) {
     currentEditId = id;
     currentEditType = type;
+    currentEditVersion = data.version || null;
     const modal = document.getElementById('edit-modal');
     const modalFormContent = document.getElementById('modal-form-content');
     modalFormContent.innerHTML = ''; // Limpa conteúdo anterior
@@ -449,6 +791,7 @@ function closeModal() {
     document.getElementById('edit-modal').style.display = 'none';
     currentEditId = null;
     currentEditType = null;
+    currentEditVersion = null;
 }
 
 async function saveEdit() {
@@ -494,18 +837,20 @@ async function saveEdit() {
     }
 
     try {
+        const headers = { 'Content-Type': 'application/json' };
+        if (currentEditVersion) {
+            headers['If-Match'] = currentEditVersion;
+        }
         const response = await fetch(url, {
             method: 'PUT',
-            headers: {
-                'Content-Type': 'application/json'
-            },
+            headers: headers,
             body: JSON.stringify(data)
         });
         const result = await response.json();
         if (response.ok) {
             alert(result.message);
             closeModal();
-            fetchData(currentActiveSection); // Recarrega os dados da seção atual
+            refreshAfterWrite(currentActiveSection); // Recarrega os dados da seção atual
         } else {
             alert('Erro: ' + result.error);
         }
@@ -516,37 +861,38 @@ async function saveEdit() {
 }
 
 // Funções edit que chamam o modal
-function editTurma(id, nome) {
-    openModal(id, 'turma', { nome: nome });
+function editTurma(id, nome, version) {
+    openModal(id, 'turma', { nome: nome, version: version });
 }
 
-function editDisciplina(id, codigo, nome) { // Catálogo
-    openModal(id, 'disciplina', { codigo: codigo, nome: nome });
+function editDisciplina(id, codigo, nome, version) { // Catálogo
+    openModal(id, 'disciplina', { codigo: codigo, nome: nome, version: version });
 }
 
-function editAluno(id, matricula, nome, telefone) {
-    openModal(id, 'aluno', { matricula: matricula, nome: nome, telefone: telefone });
+function editAluno(id, matricula, nome, telefone, version) {
+    openModal(id, 'aluno', { matricula: matricula, nome: nome, telefone: telefone, version: version });
 }
 
-function editOfertaDisciplina(id, professor) {
-    openModal(id, 'oferta', { professor: professor });
+function editOfertaDisciplina(id, professor, version) {
+    openModal(id, 'oferta', { professor: professor, version: version });
 }
 
 
 // --- Funções de Remoção (DELETE) ---
 
-async function deleteItem(url, successMessage, sectionToRefresh) {
+async function deleteItem(url, successMessage, sectionToRefresh, version) {
     if (!confirm('Tem certeza que deseja remover este item?')) {
         return;
     }
     try {
         const response = await fetch(url, {
-            method: 'DELETE'
+            method: 'DELETE',
+            headers: version ? { 'If-Match': version } : {}
         });
         const result = await response.json();
         if (response.ok) {
             alert(result.message);
-            fetchData(sectionToRefresh); // Recarrega os dados da seção
+            refreshAfterWrite(sectionToRefresh); // Recarrega os dados da seção
         } else {
             alert('Erro: ' + result.error);
         }
@@ -556,33 +902,69 @@ async function deleteItem(url, successMessage, sectionToRefresh) {
     }
 }
 
-function deleteTurma(id) {
-    deleteItem(`/api/turmas/${id}`, 'Turma removida com sucesso!', 'turmas');
+function deleteTurma(id, version) {
+    deleteItem(`/api/turmas/${id}`, 'Turma removida com sucesso!', 'turmas', version);
 }
 
-function deleteDisciplina(id) { // Catálogo
-    deleteItem(`/api/disciplinas_catalogo/${id}`, 'Disciplina do catálogo removida com sucesso!', 'disciplinas_catalogo');
+function deleteDisciplina(id, version) { // Catálogo
+    deleteItem(`/api/disciplinas_catalogo/${id}`, 'Disciplina do catálogo removida com sucesso!', 'disciplinas_catalogo', version);
 }
 
-function deleteAluno(id) {
-    deleteItem(`/api/alunos/${id}`, 'Aluno removido com sucesso!', 'alunos');
+function deleteAluno(id, version) {
+    deleteItem(`/api/alunos/${id}`, 'Aluno removido com sucesso!', 'alunos', version);
 }
 
-function deleteOfertaDisciplina(id) {
-    deleteItem(`/api/turma_disciplinas_ofertas/${id}`, 'Oferta de disciplina removida com sucesso!', 'matriculas'); // Matrículas section contains offers
+function deleteOfertaDisciplina(id, version) {
+    deleteItem(`/api/turma_disciplinas_ofertas/${id}`, 'Oferta de disciplina removida com sucesso!', 'matriculas', version); // Matrículas section contains offers
 }
 
-function deleteMatricula(id) {
-    deleteItem(`/api/matriculas/${id}`, 'Matrícula removida com sucesso!', 'matriculas');
+function deleteMatricula(id, version) {
+    deleteItem(`/api/matriculas/${id}`, 'Matrícula removida com sucesso!', 'matriculas', version);
 }
 
 
 // --- Funções de Busca ---
 
+// Sugestões de /api/search enquanto o usuário digita na busca (preenchem o <datalist> do campo)
+const SUGGESTION_ENTITIES = { turma: 'turmas', disciplina: 'disciplinas_catalogo', aluno: 'alunos' };
+
+function setupSuggestions(type) {
+    const input = document.getElementById(`search-${type}-input`);
+    const datalist = document.getElementById(`suggestions-${type}`);
+    if (!input || !datalist) return;
+    let lastTerm = '';
+    input.addEventListener('input', async () => {
+        const term = input.value.trim();
+        lastTerm = term;
+        if (!term) {
+            datalist.innerHTML = '';
+            return;
+        }
+        const entity = SUGGESTION_ENTITIES[type];
+        try {
+            const response = await fetch(`/api/search?entity=${entity}&q=${encodeURIComponent(term)}`);
+            if (!response.ok || term !== lastTerm) return; // Ignora respostas de teclas anteriores
+            const items = (await response.json())[entity];
+            datalist.innerHTML = '';
+            items.forEach(item => {
+                const option = document.createElement('option');
+                option.value = item.nome;
+                if (item.codigo) option.label = item.codigo;
+                if (item.matricula) option.label = item.matricula;
+                datalist.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Erro ao buscar sugestões:', error);
+        }
+    });
+}
+
 function searchData(type) {
     const searchInput = document.getElementById(`search-${type}-input`);
     if (searchInput) {
         currentSearchTerms[type] = searchInput.value;
     }
+    const entities = { turma: 'turmas', disciplina: 'disciplinas_catalogo', aluno: 'alunos' };
+    currentOffsets[entities[type]] = 0; // Nova busca volta para a primeira página
     fetchData(currentActiveSection); // Recarrega a seção atual com o termo de busca
 }
\ No newline at end of file
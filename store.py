@@ -0,0 +1,1078 @@
+import collections
+import contextlib
+import hashlib
+import itertools
+import operator
+import os
+import threading
+import weakref
+
+import metrics
+import snapshot_cache
+from journal import Journal
+from locking import FileLock, unique_tmp_path
+from records import record_class
+from search_index import SearchIndex
+from stats import StoreStats, averages
+
+# Tabelas persistidas em arquivos "id|campo1|campo2" (na ordem dos campos abaixo)
+TABLES = {
+    'turmas': ('turmas.txt', ('id', 'nome')),
+    'disciplinas_catalogo': ('disciplinas.txt', ('id', 'codigo', 'nome')),
+    'alunos': ('alunos.txt', ('id', 'matricula', 'nome', 'telefone')),
+    'turma_disciplinas_ofertas': ('turma_disciplinas.txt', ('id', 'turma_id', 'disciplina_catalogo_id', 'professor')),
+    'matriculas': ('matriculas.txt', ('id', 'aluno_id', 'turma_disciplina_id')),
+}
+
+# Índices de chave estrangeira: tabela -> campos indexados ({valor: {id: None}})
+FOREIGN_KEYS = {
+    'turma_disciplinas_ofertas': ('turma_id', 'disciplina_catalogo_id'),
+    'matriculas': ('aluno_id', 'turma_disciplina_id'),
+}
+
+# Tabela referenciada por cada chave estrangeira (formato normalizado das respostas)
+REFERENCES = {
+    'turma_disciplinas_ofertas': {'turma_id': 'turmas', 'disciplina_catalogo_id': 'disciplinas_catalogo'},
+    'matriculas': {'aluno_id': 'alunos', 'turma_disciplina_id': 'turma_disciplinas_ofertas'},
+}
+
+# Chaves únicas: tabela -> combinações de campos que não podem se repetir ({valores: id})
+UNIQUE_KEYS = {
+    'disciplinas_catalogo': (('codigo',),),
+    'alunos': (('matricula',),),
+    'turma_disciplinas_ofertas': (('disciplina_catalogo_id', 'turma_id'),),
+    'matriculas': (('aluno_id', 'turma_disciplina_id'),),
+}
+
+# Filtros por igualdade aceitos nas listagens paginadas (turma_id em matrículas passa pelas ofertas)
+LIST_FILTERS = {
+    'turma_disciplinas_ofertas': ('turma_id', 'disciplina_catalogo_id'),
+    'matriculas': ('aluno_id', 'turma_disciplina_id', 'turma_id'),
+}
+
+# Campos usados pelo parâmetro search das listagens (e indexados para a busca textual)
+SEARCH_FIELDS = {
+    'turmas': ('nome',),
+    'disciplinas_catalogo': ('nome', 'codigo'),
+    'alunos': ('nome', 'matricula'),
+}
+
+# Busca nas listagens de tabelas sem campos de texto próprios: pelos campos de busca dos
+# registros referenciados (as ofertas pelo nome da turma ou pelo nome e código da disciplina)
+RELATED_SEARCH = {
+    'turma_disciplinas_ofertas': {'turma_id': 'turmas', 'disciplina_catalogo_id': 'disciplinas_catalogo'},
+}
+
+# Colunas do relatório de matrículas (exportação)
+ROSTER_FIELDS = (
+    'turma_id', 'turma_nome', 'turma_disciplina_id', 'disciplina_codigo', 'disciplina_nome', 'professor',
+    'matricula_id', 'aluno_id', 'aluno_matricula', 'aluno_nome', 'aluno_telefone',
+)
+
+# Classe dos registros em memória de cada tabela (o ID e as chaves estrangeiras são internados)
+RECORD_TYPES = {
+    table: record_class(table, fields, interned=('id',) + FOREIGN_KEYS.get(table, ()))
+    for table, (_, fields) in TABLES.items()
+}
+
+JOURNAL_FILE = 'journal.log'
+CHANGES_FILE = 'changes.log'
+LOCK_FILE = '.lock'
+# Tamanho do journal a partir do qual ele é compactado nos arquivos .txt
+COMPACT_THRESHOLD = 4 * 1024 * 1024
+
+# Eventos de alteração mantidos para o feed (/api/changes): quem ficar mais atrasado que
+# isso recarrega tudo. Na compactação, o changes.log é cortado para os últimos bytes
+CHANGE_LOG_KEEP = 10000
+CHANGE_LOG_MAX_BYTES = 2 * 1024 * 1024
+
+
+def _file_signature(path):
+    """Retorna (mtime, tamanho) do arquivo, ou None se ele não existir."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def read_table_file(path, record_type):
+    """Lê um arquivo de tabela e retorna um dicionário {id: registro}."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return parse_table_lines(f, record_type)
+
+
+def parse_table_lines(lines, record_type):
+    """Converte linhas "id|campo1|campo2" em {id: registro}, ignorando as malformadas."""
+    records = {}
+    size = len(record_type.fields)
+    for line in lines:
+        parts = line.strip().split('|')
+        if len(parts) == size:
+            record = record_type(*parts)
+            records[record.id] = record
+    return records
+
+
+def table_lines(fields, records):
+    """Gera a linha de cada registro no formato dos arquivos de tabela."""
+    for record in records:
+        yield '|'.join(record[field] for field in fields) + '\n'
+
+
+def write_table_file(path, fields, records):
+    """Escreve todos os registros de uma tabela no arquivo (e força a gravação no disco)."""
+    with open(path, 'w') as f:
+        f.writelines(table_lines(fields, records.values()))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class LazyTables(dict):
+    """Tabelas em memória ({nome: {id: registro}}) que só são carregadas na primeira consulta.
+
+    tables[nome] carrega a tabela se preciso; get, in, items e afins veem só as já carregadas.
+    """
+
+    def __init__(self, loader):
+        super().__init__()
+        self._loader = loader
+
+    def __missing__(self, table):
+        return self._loader(table)
+
+
+# Stores deste processo, para o tratamento pós-fork (ver DataStore._forget_snapshot_files)
+_stores = weakref.WeakSet()
+
+
+def _after_fork():
+    for store in list(_stores):
+        store._forget_snapshot_files()
+
+
+if hasattr(os, 'register_at_fork'):  # indisponível no Windows, onde não há fork
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+def record_version(table, record):
+    """Versão de um registro (hash dos seus campos), usada no controle otimista de concorrência."""
+    content = '\x1f'.join(record[field] for field in TABLES[table][1])
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+class DataStore:
+    """Mantém as tabelas em memória e registra cada alteração em um journal só de acréscimo.
+
+    Os arquivos .txt são snapshots; o estado atual é o snapshot mais as entradas do
+    journal, que é reaplicado na carga e compactado em segundo plano ao crescer.
+
+    Cada tabela é carregada só quando alguém a consulta (um worker que só lista alunos não
+    carrega as matrículas), de preferência a partir do cache binário do snapshot (ver
+    snapshot_cache). As entradas do journal de tabelas ainda não carregadas ficam guardadas
+    e são aplicadas na carga.
+    """
+
+    def __init__(self, data_dir, compact_threshold=COMPACT_THRESHOLD, fsync=True):
+        self.data_dir = data_dir
+        self.compact_threshold = compact_threshold
+        self.lock = threading.RLock()  # protege o estado em memória (leituras e aplicação das escritas)
+        self.write_lock = threading.RLock()  # serializa os escritores deste processo
+        self.file_lock = FileLock(os.path.join(data_dir, LOCK_FILE))  # serializa os processos
+        self._in_transaction = False
+        self._writer = None  # thread com a transação aberta, depois de recarregar (ver refresh)
+        self._pending = []  # entradas da transação atual, ainda não gravadas no journal
+        self._undo = []  # (tabela, id, registro anterior) para desfazer a transação atual
+        self.tables = LazyTables(self._load)
+        self.fk_indexes = {table: {field: {} for field in fields} for table, fields in FOREIGN_KEYS.items()}
+        self.unique_indexes = {table: {key: {} for key in keys} for table, keys in UNIQUE_KEYS.items()}
+        self.search_indexes = {table: SearchIndex(fields) for table, fields in SEARCH_FIELDS.items()}
+        self.counters = None  # contadores de /api/stats, montados na primeira consulta
+        self._dangling = None  # IDs com referências inexistentes, por tabela (ver _dangling_ids)
+        self.journal = Journal(os.path.join(data_dir, JOURNAL_FILE), fsync=fsync)
+        self._signatures = {name: False for name in TABLES}  # False = nunca carregado
+        # Snapshots ainda não carregados: o arquivo fica aberto desde o refresh que viu a versão
+        # nova, então a carga lê essa versão mesmo que outro processo troque o arquivo antes
+        self._snapshot_files = {}
+        self._deferred = {name: [] for name in TABLES}  # entradas do journal de tabelas não carregadas
+        self._journal_ino = None
+        self._journal_offset = 0
+        # Feed de alterações: {seq, op, entity, id} de cada entrada do journal, com seq crescente
+        self.changes = Journal(os.path.join(data_dir, CHANGES_FILE), fsync=fsync)
+        self.recent_changes = collections.deque(maxlen=CHANGE_LOG_KEEP)
+        self.last_seq = 0
+        self._changes_ino = None
+        self._changes_offset = 0
+        self._changed = threading.Condition()
+        self._compactor = None
+        # Transações desfeitas depois de visíveis aos leitores (falha ao gravar o journal); entra na
+        # versão dos dados, para que respostas montadas com elas não sigam válidas (ver data_version)
+        self._discarded = 0
+        # Sem transaction(): ela poderia começar uma compactação já na abertura (journal grande),
+        # e com o preload do gunicorn essa thread estaria no processo principal durante o fork
+        # dos workers, segurando as travas que eles herdam
+        with self.write_lock, self.file_lock:
+            self.journal.repair()
+            self.changes.repair()
+            with self.lock:
+                self.refresh()
+        _stores.add(self)
+
+    def _path(self, table):
+        return os.path.join(self.data_dir, TABLES[table][0])
+
+    def _journal_inode(self):
+        return _inode(self.journal.path)
+
+    def refresh(self):
+        """Recarrega os snapshots alterados no disco e aplica as entradas novas do journal.
+
+        Não usa a trava entre processos, para que leitores não esperem os escritores: se a
+        compactação de outro processo trocar um snapshot durante a leitura, ela é refeita.
+        """
+        with self.lock:
+            if self._writer not in (None, threading.get_ident()):
+                # Um escritor deste processo tem a trava entre processos e já recarregou: o disco
+                # só muda por ele, e o que ele grava já está em memória (ver transaction)
+                return
+            any_reloaded = False
+            while True:
+                reloaded = False
+                for table in TABLES:
+                    if _file_signature(self._path(table)) != self._signatures[table]:
+                        self._unload(table)
+                        reloaded = True
+                if reloaded:
+                    self.counters = None
+                    any_reloaded = True
+
+                # Snapshot novo ou journal substituído pela compactação: reaplica do início
+                inode = self._journal_inode()
+                if reloaded or inode != self._journal_ino:
+                    self._journal_ino = inode
+                    self._journal_offset = 0
+                    self._deferred = {name: [] for name in TABLES}
+                if self.journal.size() != self._journal_offset:
+                    with metrics.span('store.journal_replay'):
+                        entries, self._journal_offset = self.journal.read_from(self._journal_offset)
+                        for entry in entries:
+                            self._apply(entry)
+
+                if all(_file_signature(self._path(table)) == self._signatures[table] for table in TABLES):
+                    break
+            self._refresh_changes(any_reloaded)
+
+    def _unload(self, table):
+        """Descarta table da memória e guarda aberto o snapshot atual, para carregá-lo quando preciso."""
+        self.tables.pop(table, None)
+        self._clear_indexes(table)
+        old = self._snapshot_files.pop(table, None)
+        if old is not None:
+            old.close()
+        try:
+            f = open(self._path(table), 'r')
+        except FileNotFoundError:
+            self._signatures[table] = None
+            return
+        st = os.fstat(f.fileno())
+        self._signatures[table] = (st.st_mtime_ns, st.st_size)
+        self._snapshot_files[table] = f
+
+    def _load(self, table):
+        """Carrega table na primeira consulta: o snapshot (do cache, se válido, ou do .txt) e
+        as entradas do journal guardadas para ela. Retorna os registros."""
+        with self.lock:
+            if table in self.tables:  # outra thread carregou enquanto esta esperava
+                return self.tables[table]
+            if self._signatures[table] is False:  # versão do arquivo ainda não vista (após um fork)
+                self.refresh()
+            f = self._snapshot_files.pop(table, None)
+            with metrics.span('store.load'):
+                if f is None:  # arquivo inexistente
+                    self.tables[table] = {}
+                    self._rebuild_indexes(table)
+                else:
+                    with f:
+                        self._load_snapshot(table, f)
+                for entry in self._deferred[table]:
+                    self._apply(entry)
+                self._deferred[table] = []
+            return self.tables[table]
+
+    def _load_snapshot(self, table, f):
+        record_type = RECORD_TYPES[table]
+        path = self._path(table)
+        cache_key = (record_type.fields, self._signatures[table])
+        cached = snapshot_cache.read_cache(path, cache_key)
+        if cached is not None:
+            rows, search_state = cached
+            self.tables[table] = {record.id: record for record in itertools.starmap(record_type, rows)}
+            self._rebuild_indexes(table, search_state)
+            return
+        self.tables[table] = parse_table_lines(f, record_type)
+        self._rebuild_indexes(table)
+        snapshot_cache.write_cache(path, cache_key, self._cache_content(table, self.tables[table]))
+
+    def _cache_content(self, table, records, search_state=None):
+        """Conteúdo do cache do snapshot de table: as linhas e o estado do índice de busca."""
+        fields = TABLES[table][1]
+        if search_state is None and table in self.search_indexes:
+            search_state = self.search_indexes[table].state()
+        return [tuple(record[field] for field in fields) for record in records.values()], search_state
+
+    def load_all(self):
+        """Carrega todas as tabelas (e os contadores de /api/stats) de uma vez.
+
+        Usado pelo gunicorn com preload_app: carregados antes do fork, os dados são
+        compartilhados pelos workers (copy-on-write) em vez de lidos por cada um.
+        """
+        with self.lock:
+            self.refresh()
+            for table in TABLES:
+                self.tables[table]
+            self._stats_counters()
+
+    def _forget_snapshot_files(self):
+        """No processo filho de um fork: os arquivos abertos (e suas posições) seriam
+        compartilhados com o pai, então as tabelas não carregadas são reabertas no próximo refresh."""
+        for table, f in list(self._snapshot_files.items()):
+            f.close()
+            self._signatures[table] = False
+        self._snapshot_files.clear()
+
+    def _refresh_changes(self, compacted=False):
+        """Lê os eventos gravados por outros processos no changes.log.
+
+        compacted: os snapshots foram trocados (compactação de outro processo), então o log
+        pode ter sido cortado mesmo que o inode seja o mesmo (o sistema de arquivos reaproveita
+        inodes de arquivos removidos).
+        """
+        inode = _inode(self.changes.path)
+        if compacted or inode != self._changes_ino:  # log cortado: relê, ignorando os já vistos
+            self._changes_ino = inode
+            self._changes_offset = 0
+        if self.changes.size() != self._changes_offset:
+            events, self._changes_offset = self.changes.read_from(self._changes_offset)
+            for event in events:
+                if event['seq'] > self.last_seq:
+                    self.recent_changes.append(event)
+                    self.last_seq = event['seq']
+
+    def data_version(self):
+        """Retorna (versão, horário da última alteração) dos dados atuais.
+
+        A versão depende dos arquivos em disco (snapshots e posição no journal), então muda a
+        cada alteração gravada e é a mesma em todos os processos para os mesmos dados. Ela
+        também muda quando uma transação deste processo é desfeita depois de aplicada em
+        memória: os leitores podem ter visto os registros dela sob a versão anterior.
+        """
+        with self.lock:
+            self.refresh()
+            state = (tuple(self._signatures[table] for table in TABLES), self._journal_ino, self._journal_offset)
+            if self._discarded:
+                state += (self._discarded,)
+            version = hashlib.sha1(repr(state).encode('utf-8')).hexdigest()[:16]
+            mtimes = [signature[0] for signature in self._signatures.values() if signature]
+            journal_signature = _file_signature(self.journal.path)
+            if journal_signature:
+                mtimes.append(journal_signature[0])
+            return version, max(mtimes, default=0) / 1e9
+
+    def _apply(self, entry):
+        table = entry['table']
+        if table not in self.tables:
+            self._deferred[table].append(entry)
+            return
+        records = self.tables[table]
+        if entry['op'] == 'delete':
+            old = records.pop(entry['id'], None)
+            new = None
+        else:
+            new = RECORD_TYPES[table].from_mapping(entry['record'])
+            old = records.get(new.id)
+            records[new.id] = new
+        self._update_indexes(table, old, new)
+        if self.counters is not None:
+            self.counters.update(table, old, new, self.tables['turma_disciplinas_ofertas'])
+
+    # --- Índices ---
+
+    def _clear_indexes(self, table):
+        self._dangling = None
+        for index in self.fk_indexes.get(table, {}).values():
+            index.clear()
+        for index in self.unique_indexes.get(table, {}).values():
+            index.clear()
+        if table in self.search_indexes:
+            self.search_indexes[table].clear()
+
+    def _rebuild_indexes(self, table, search_state=None):
+        """Monta os índices de table a partir dos registros (o de busca pode vir pronto do cache)."""
+        self._clear_indexes(table)
+        records = self.tables[table]
+        for field, index in self.fk_indexes.get(table, {}).items():
+            for record_id, record in records.items():
+                index.setdefault(record[field], {})[record_id] = None
+        for key, index in self.unique_indexes.get(table, {}).items():
+            # attrgetter monta a tupla da chave em C (os campos são os slots do registro); com um
+            # campo só, ele devolve o valor, que zip põe numa tupla
+            values = map(operator.attrgetter(*key), records.values())
+            index.update(zip(values if len(key) > 1 else zip(values), records))
+        if table in self.search_indexes:
+            if search_state is not None:
+                self.search_indexes[table].load_state(search_state)
+            else:
+                for record in records.values():
+                    self.search_indexes[table].update(None, record)
+
+    def _ensure_loaded(self, table):
+        if table not in self.tables:
+            self._load(table)
+
+    def _update_indexes(self, table, old, new):
+        """Mantém os índices em sincronia com a troca de old por new (qualquer um pode ser None)."""
+        if old is None or new is None or table in FOREIGN_KEYS:
+            self._dangling = None  # registro novo ou removido, ou referência trocada
+        for field, index in self.fk_indexes.get(table, {}).items():
+            old_value = old[field] if old else None
+            new_value = new[field] if new else None
+            if old_value == new_value:
+                continue
+            if old:
+                bucket = index.get(old_value)
+                if bucket is not None:
+                    bucket.pop(old['id'], None)
+                    if not bucket:
+                        del index[old_value]
+            if new:
+                index.setdefault(new_value, {})[new['id']] = None
+
+        for key, index in self.unique_indexes.get(table, {}).items():
+            old_value = tuple(old[field] for field in key) if old else None
+            new_value = tuple(new[field] for field in key) if new else None
+            if old_value == new_value:
+                continue
+            if old and index.get(old_value) == old['id']:
+                del index[old_value]
+            if new:
+                index[new_value] = new['id']
+
+        if table in self.search_indexes:
+            self.search_indexes[table].update(old, new)
+
+    def lookup(self, table, field, value):
+        """IDs dos registros de table cujo campo field é igual a value (na ordem de inserção).
+
+        Não recarrega os arquivos: use depois de get_raw_data()/refresh() na mesma requisição.
+        """
+        self._ensure_loaded(table)
+        return self.fk_indexes[table][field].get(value, {}).keys()
+
+    def find_unique(self, table, **values):
+        """ID do registro com os valores informados para uma chave única, ou None."""
+        self._ensure_loaded(table)
+        key = tuple(sorted(values))
+        return self.unique_indexes[table][key].get(tuple(values[field] for field in key))
+
+    def _search(self, table, term):
+        """IDs de table que contêm term em algum campo de SEARCH_FIELDS (ou None, sem termo)."""
+        if not term:
+            return None
+        self._ensure_loaded(table)
+        return self.search_indexes[table].search(term)
+
+    def _related_search(self, table, term):
+        """IDs de table cujos registros referenciados (RELATED_SEARCH) contêm term."""
+        matches = set()
+        for field, target in RELATED_SEARCH[table].items():
+            for target_id in self._search(target, term):
+                matches.update(self.lookup(table, field, target_id))
+        return matches
+
+    def suggest(self, table, term, limit=10):
+        """Registros de table para autocompletar term (ver SearchIndex.suggest)."""
+        with self.lock:
+            self.refresh()
+            records = self.tables[table]
+            return [dict(records[i]) for i in self.search_indexes[table].suggest(term, limit)]
+
+    def _commit(self, entries):
+        """Aplica as entradas em memória e as acumula para gravar no journal ao fim da transação."""
+        with self.transaction():
+            for entry in entries:
+                record_id = entry['id'] if entry['op'] == 'delete' else entry['record']['id']
+                self._undo.append((entry['table'], record_id, self.tables[entry['table']].get(record_id)))
+                self._apply(entry)
+            self._pending.extend(entries)
+
+    def _rollback(self):
+        """Desfaz em memória as entradas da transação que não chegaram ao journal."""
+        for table, record_id, old in reversed(self._undo):
+            records = self.tables[table]
+            current = records.pop(record_id, None)
+            if old is not None:
+                records[record_id] = old
+            self._update_indexes(table, current, old)
+            if self.counters is not None:
+                self.counters.update(table, current, old, self.tables['turma_disciplinas_ofertas'])
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Trava o armazenamento (entre threads e entre processos) e recarrega o que mudou,
+        para que validações e escritas sejam atômicas. Transações aninhadas reaproveitam a externa.
+
+        Os escritores esperam uns pelos outros (write_lock e a trava entre processos) sem
+        segurar self.lock: os leitores só esperam enquanto o corpo da transação valida e aplica
+        as alterações em memória. A gravação no journal (com o fsync) vem depois, fora de
+        self.lock, em uma única escrita; se o corpo ou a gravação falharem, as alterações são
+        desfeitas em memória e nada fica no journal.
+        """
+        with self.write_lock:
+            if self._in_transaction:
+                yield
+                return
+            with self.file_lock:
+                self._in_transaction = True
+                self._pending = []
+                self._undo = []
+                try:
+                    with self.lock:
+                        self.refresh()
+                        self._writer = threading.get_ident()
+                        try:
+                            yield
+                        except BaseException:
+                            self._rollback()
+                            raise
+                    if self._pending:
+                        # Com a trava, ninguém mais escreveu no journal desde o refresh
+                        try:
+                            with metrics.span('store.journal_write'):
+                                offset = self.journal.append(self._pending)
+                        except BaseException:
+                            with self.lock:
+                                self._rollback()
+                                self._discarded += 1
+                            raise
+                        with self.lock:
+                            self._journal_offset = offset
+                            self._journal_ino = self._journal_inode()
+                        self._publish_changes(self._pending)
+                finally:
+                    self._writer = None
+                    self._in_transaction = False
+                    self._pending = []
+                    self._undo = []
+            if self._journal_offset >= self.compact_threshold:
+                self.compact_in_background()
+
+    def _publish_changes(self, entries):
+        """Grava no changes.log um evento por entrada do journal, numerado a partir de last_seq.
+
+        Vem depois do journal (ainda com a trava): um evento nunca aponta para uma alteração
+        que não foi gravada, e uma falha aqui não desfaz uma alteração já gravada.
+        """
+        self._publish([
+            (entry['op'], entry['table'], entry['id'] if entry['op'] == 'delete' else entry['record']['id'])
+            for entry in entries
+        ])
+
+    def _publish(self, changes):
+        """Grava os eventos (op, entidade, id) no changes.log e avisa quem espera por eles."""
+        events = [
+            {'seq': self.last_seq + n, 'op': op, 'entity': entity, 'id': record_id}
+            for n, (op, entity, record_id) in enumerate(changes, 1)
+        ]
+        offset = self.changes.append(events)
+        with self.lock:
+            self._changes_offset = offset
+            self._changes_ino = _inode(self.changes.path)
+            self.recent_changes.extend(events)
+            self.last_seq = events[-1]['seq']
+        with self._changed:
+            self._changed.notify_all()
+
+    def last_change_seq(self):
+        """seq do último evento de alteração (0 se não houve nenhum)."""
+        with self.lock:
+            self.refresh()
+            return self.last_seq
+
+    def changes_since(self, seq, limit=500):
+        """Até limit eventos posteriores a seq, em ordem. Retorna (eventos, último seq).
+
+        eventos é None quando os posteriores a seq não estão mais todos disponíveis (ou seq
+        é de outros dados): o cliente deve recarregar tudo e continuar do último seq.
+        """
+        with self.lock:
+            self.refresh()
+            if seq == self.last_seq:
+                return [], self.last_seq
+            if seq > self.last_seq or not self.recent_changes or self.recent_changes[0]['seq'] > seq + 1:
+                return None, self.last_seq
+            start = seq + 1 - self.recent_changes[0]['seq']  # os seq são consecutivos
+            return list(itertools.islice(self.recent_changes, start, start + limit)), self.last_seq
+
+    def wait_for_changes(self, seq, timeout):
+        """Espera até timeout segundos por um evento posterior a seq gravado por este processo.
+
+        Alterações de outros processos só aparecem em changes_since: quem espera deve consultá-lo
+        a cada timeout.
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.last_seq > seq, timeout)
+
+    @contextlib.contextmanager
+    def consistent_read(self):
+        """Várias leituras sem alterações de outras threads no meio (a trava fica com quem lê)."""
+        with self.lock:
+            self.refresh()
+            yield
+
+    def get(self, table, record_id):
+        """Registro pelo ID, ou None (sem recarregar os arquivos, como lookup)."""
+        return self.tables[table].get(record_id)
+
+    def all_records(self, table):
+        """Todos os registros de table (use dentro de consistent_read para ver um só estado).
+
+        A lista é uma cópia rasa: os registros não mudam, então podem ser lidos fora da trava.
+        """
+        return list(self.tables[table].values())
+
+    def get_raw_data(self):
+        """Retorna os dicionários em memória no formato usado pelas rotas."""
+        self.refresh()
+        return {f'{table}_raw': self.tables[table] for table in TABLES}
+
+    def insert(self, table, record):
+        self._commit([{'op': 'insert', 'table': table, 'record': record}])
+
+    def update(self, table, record_id, **fields):
+        with self.transaction():
+            record = {**self.tables[table][record_id], **fields}
+            self._commit([{'op': 'update', 'table': table, 'record': record}])
+
+    def delete(self, table, record_id):
+        self._commit([{'op': 'delete', 'table': table, 'id': record_id}])
+
+
+    def full_data(self, search_turma=None, search_disciplina=None, search_aluno=None):
+        """Monta a árvore turmas -> ofertas -> alunos e as listas planas usadas pelo frontend."""
+        with self.lock:
+            raw_data = self.get_raw_data()
+            with metrics.span('store.full_data'):
+                return self._full_data(raw_data, search_turma, search_disciplina, search_aluno)
+
+    def normalized_data(self, search_turma=None, search_disciplina=None, search_aluno=None):
+        """Os dados de full_data sem repetições: cada registro uma vez, só com os próprios campos.
+
+        Turmas, disciplinas e alunos seguem os filtros de busca; ofertas e matrículas vêm todas,
+        como nas listas planas de full_data. A árvore turmas -> ofertas -> alunos é montada
+        pelo cliente, ligando os IDs.
+        """
+        with self.lock:
+            self.refresh()
+            with metrics.span('store.full_data'):
+                tables = self.tables
+                result = {}
+                for table, term in (('turmas', search_turma), ('disciplinas_catalogo', search_disciplina),
+                                    ('alunos', search_aluno)):
+                    matches = self._search(table, term)
+                    result[table] = [dict(record) for record_id, record in tables[table].items()
+                                     if matches is None or record_id in matches]
+                # Sem os registros que apontam para outros inexistentes (como em list_row)
+                ofertas = {
+                    oferta_id: oferta for oferta_id, oferta in tables['turma_disciplinas_ofertas'].items()
+                    if oferta['turma_id'] in tables['turmas']
+                    and oferta['disciplina_catalogo_id'] in tables['disciplinas_catalogo']
+                }
+                result['turma_disciplinas_ofertas'] = [dict(oferta) for oferta in ofertas.values()]
+                result['matriculas'] = [
+                    dict(matricula) for matricula in tables['matriculas'].values()
+                    if matricula['aluno_id'] in tables['alunos'] and matricula['turma_disciplina_id'] in ofertas
+                ]
+                return result
+
+    def _full_data(self, raw_data, search_turma, search_disciplina, search_aluno):
+        # Cada filtro é resolvido uma única vez no índice de busca (None = sem filtro)
+        turma_matches = self._search('turmas', search_turma)
+        disciplina_matches = self._search('disciplinas_catalogo', search_disciplina)
+        aluno_matches = self._search('alunos', search_aluno)
+
+        turmas = []
+        for turma_id, turma_info in raw_data['turmas_raw'].items():
+            if turma_matches is not None and turma_id not in turma_matches:
+                continue
+
+            disciplinas_na_turma = []
+            for oferta_id in self.lookup('turma_disciplinas_ofertas', 'turma_id', turma_id):
+                oferta_info = raw_data['turma_disciplinas_ofertas_raw'][oferta_id]
+                disciplina_catalogo_info = raw_data['disciplinas_catalogo_raw'].get(oferta_info['disciplina_catalogo_id'])
+                if disciplina_catalogo_info:
+
+                    # Apply search_disciplina filter if present
+                    if disciplina_matches is not None and disciplina_catalogo_info['id'] not in disciplina_matches:
+                        continue
+
+                    alunos_na_disciplina = []
+                    for matricula_id in self.lookup('matriculas', 'turma_disciplina_id', oferta_id):
+                        matricula_info = raw_data['matriculas_raw'][matricula_id]
+                        aluno_info = raw_data['alunos_raw'].get(matricula_info['aluno_id'])
+                        if aluno_info:
+                            # Apply search_aluno filter if present
+                            if aluno_matches is not None and aluno_info['id'] not in aluno_matches:
+                                continue
+
+                            alunos_na_disciplina.append({
+                                'id': aluno_info['id'],
+                                'matricula': aluno_info['matricula'],
+                                'nome': aluno_info['nome'],
+                                'telefone': aluno_info['telefone'],
+                                'matricula_id': matricula_info['id'] # Adiciona o ID da matrícula para facilitar a exclusão
+                            })
+                    disciplinas_na_turma.append({
+                        'id': oferta_id, # ID da oferta
+                        'codigo': disciplina_catalogo_info['codigo'],
+                        'nome': disciplina_catalogo_info['nome'],
+                        'professor': oferta_info['professor'],
+                        'alunos': alunos_na_disciplina,
+                        'disciplina_catalogo_id': disciplina_catalogo_info['id'] # Adiciona o ID do catálogo
+                    })
+            turmas.append({
+                'id': turma_id,
+                'nome': turma_info['nome'],
+                'disciplinas': disciplinas_na_turma # Estas são as ofertas de disciplina
+            })
+
+        # Preparar catálogo de disciplinas para o frontend (sem filtro de busca aqui)
+        disciplinas_catalogo_list = [
+            {'id': d_id, 'codigo': d_info['codigo'], 'nome': d_info['nome']} 
+            for d_id, d_info in raw_data['disciplinas_catalogo_raw'].items()
+            if disciplina_matches is None or d_id in disciplina_matches
+        ]
+
+        # Preparar lista de alunos para o frontend (sem filtro de busca aqui)
+        alunos_list = [
+            {'id': a_id, 'matricula': a_info['matricula'], 'nome': a_info['nome'], 'telefone': a_info['telefone']}
+            for a_id, a_info in raw_data['alunos_raw'].items()
+            if aluno_matches is None or a_id in aluno_matches
+        ]
+
+        # Preparar ofertas de disciplina (turma_disciplinas_ofertas) para exibição direta
+        # Esta lista é plana para facilitar a busca e renderização sem depender de turmas
+        ofertas_list = self._list_rows('turma_disciplinas_ofertas', raw_data['turma_disciplinas_ofertas_raw'].values())
+
+        # Preparar lista de matrículas para exibição direta
+        matriculas_list = self._list_rows('matriculas', raw_data['matriculas_raw'].values())
+
+        return {
+            'turmas': turmas,
+            'disciplinas_catalogo': disciplinas_catalogo_list,
+            'alunos': alunos_list,
+            'turma_disciplinas_ofertas': ofertas_list,
+            'matriculas': matriculas_list
+        }
+
+    def list_row(self, table, record):
+        """Linha da listagem plana de table, com os nomes dos registros relacionados.
+
+        Retorna None quando alguma referência (turma, disciplina, aluno, oferta) não existe.
+        """
+        if table == 'turma_disciplinas_ofertas':
+            turma_info = self.tables['turmas'].get(record['turma_id'])
+            disciplina_catalogo_info = self.tables['disciplinas_catalogo'].get(record['disciplina_catalogo_id'])
+            if not (turma_info and disciplina_catalogo_info):
+                return None
+            return {
+                'id': record['id'],
+                'turma_id': record['turma_id'],
+                'turma_nome': turma_info['nome'],
+                'disciplina_catalogo_id': record['disciplina_catalogo_id'],
+                'disciplina_codigo': disciplina_catalogo_info['codigo'],
+                'disciplina_nome': disciplina_catalogo_info['nome'],
+                'professor': record['professor']
+            }
+        if table == 'matriculas':
+            aluno_info = self.tables['alunos'].get(record['aluno_id'])
+            oferta_info = self.tables['turma_disciplinas_ofertas'].get(record['turma_disciplina_id'])
+            if not (aluno_info and oferta_info):
+                return None
+            disciplina_catalogo_info = self.tables['disciplinas_catalogo'].get(oferta_info['disciplina_catalogo_id'])
+            turma_info = self.tables['turmas'].get(oferta_info['turma_id'])
+            if not (disciplina_catalogo_info and turma_info):
+                return None
+            return {
+                'id': record['id'],
+                'aluno_id': aluno_info['id'],
+                'aluno_matricula': aluno_info['matricula'],
+                'aluno_nome': aluno_info['nome'],
+                'turma_disciplina_id': oferta_info['id'],
+                'turma_nome': turma_info['nome'],
+                'disciplina_nome': disciplina_catalogo_info['nome'],
+                'professor': oferta_info['professor']
+            }
+        return dict(record)
+
+    def _list_rows(self, table, records):
+        rows = (self.list_row(table, record) for record in records)
+        return [row for row in rows if row is not None]
+
+    def _filtered_ids(self, table, filters):
+        """IDs de table que atendem aos filtros por igualdade, usando os índices."""
+        filters = dict(filters)
+        if table == 'matriculas' and 'turma_id' in filters:
+            # turma_id não é campo da matrícula: passa pelas ofertas da turma
+            ofertas = self.lookup('turma_disciplinas_ofertas', 'turma_id', filters.pop('turma_id'))
+            ids = [m_id for o_id in ofertas for m_id in self.lookup('matriculas', 'turma_disciplina_id', o_id)]
+        elif filters:
+            field = min(filters, key=lambda f: len(self.lookup(table, f, filters[f])))
+            ids = self.lookup(table, field, filters.pop(field))
+        else:
+            ids = self.tables[table].keys()
+        if filters:
+            records = self.tables[table]
+            ids = [i for i in ids if all(records[i][f] == v for f, v in filters.items())]
+        return ids
+
+    def _dangling_ids(self, table):
+        """IDs de table com alguma referência inexistente: as linhas que a listagem plana omite.
+
+        Saem dos índices de chave estrangeira (uma consulta por registro referenciado, não por
+        linha) e ficam guardados até a próxima inclusão ou remoção. Como as remoções são
+        barradas pelas referências, só há IDs aqui com dados antigos ou editados à mão.
+        """
+        if table not in REFERENCES:
+            return frozenset()
+        if self._dangling is None or table not in self._dangling:
+            # Carrega antes de montar: a carga de uma tabela descarta o que estava guardado
+            self._ensure_loaded(table)
+            targets = {target: (self.tables[target], self._dangling_ids(target))
+                       for target in REFERENCES[table].values()}
+            ids = set()
+            for field, target in REFERENCES[table].items():
+                records, dangling_targets = targets[target]
+                for value, children in self.fk_indexes[table][field].items():
+                    if value not in records or value in dangling_targets:
+                        ids.update(children)
+            if self._dangling is None:
+                self._dangling = {}
+            self._dangling[table] = ids
+        return self._dangling[table]
+
+    def list_page(self, table, offset=0, limit=50, search=None, **filters):
+        """Uma página da listagem plana de table. Retorna (linhas, total de linhas encontradas).
+
+        filters são campos de LIST_FILTERS[table]; search busca nos campos de SEARCH_FIELDS[table]
+        (ou nos dos registros referenciados, ver RELATED_SEARCH). Registros com referências inexistentes não entram na página nem no total, como no JOIN
+        do SqliteStore.
+        """
+        with self.lock:
+            self.refresh()
+            with metrics.span('store.list_page'):
+                ids = self._filtered_ids(table, filters)
+                records = self.tables[table]
+                if search and (table in SEARCH_FIELDS or table in RELATED_SEARCH):
+                    matches = self._search(table, search) if table in SEARCH_FIELDS else self._related_search(table, search)
+                    ids = [i for i in ids if i in matches]
+                dangling = self._dangling_ids(table)
+                if dangling:
+                    ids = [i for i in ids if i not in dangling]
+                rows = self._list_rows(table, (records[i] for i in itertools.islice(ids, offset, offset + limit)))
+                return rows, len(ids)
+
+    def stats(self, limit=10):
+        """Totais, médias e as limit primeiras posições de cada ranking de /api/stats.
+
+        Tudo vem dos contadores mantidos a cada alteração: nenhuma tabela é percorrida (só
+        na primeira consulta, para montá-los).
+        """
+        with self.lock:
+            self.refresh()
+            counters = self._stats_counters()
+            turmas, alunos = self.tables['turmas'], self.tables['alunos']
+            ofertas = self.tables['turma_disciplinas_ofertas']
+
+            def ranking(counter, row):
+                rows = (row(key, count) for key, count in counter.most_common())
+                return list(itertools.islice((r for r in rows if r is not None), limit))
+
+            def oferta_row(oferta_id, count):
+                row = self.list_row('turma_disciplinas_ofertas', ofertas[oferta_id]) if oferta_id in ofertas else None
+                return row and {**row, 'alunos': count}
+
+            def turma_row(turma_id, count):
+                turma = turmas.get(turma_id)
+                return turma and {'id': turma['id'], 'nome': turma['nome'], 'ofertas': count}
+
+            def professor_row(professor, count):
+                return {'professor': professor, 'ofertas': counters.ofertas_por_professor.get(professor),
+                        'matriculas': count}
+
+            def aluno_row(aluno_id, count):
+                aluno = alunos.get(aluno_id)
+                return aluno and {'id': aluno['id'], 'matricula': aluno['matricula'], 'nome': aluno['nome'],
+                                  'disciplinas': count}
+
+            totals = {table: len(self.tables[table]) for table in TABLES}
+            return {
+                'totais': totals,
+                'medias': averages(totals),
+                'ofertas_com_mais_alunos': ranking(counters.alunos_por_oferta, oferta_row),
+                'turmas_com_mais_ofertas': ranking(counters.ofertas_por_turma, turma_row),
+                'professores_com_mais_matriculas': ranking(counters.matriculas_por_professor, professor_row),
+                'alunos_com_mais_disciplinas': ranking(counters.disciplinas_por_aluno, aluno_row),
+            }
+
+    def _stats_counters(self):
+        if self.counters is None:
+            # Carrega as tabelas antes: a carga aplica as entradas guardadas do journal, que não
+            # podem ser contadas também pelos contadores novos
+            tables = {table: self.tables[table] for table in TABLES}
+            counters = StoreStats()
+            counters.rebuild(tables)
+            self.counters = counters
+        return self.counters
+
+    def list_rows(self, table, ids):
+        """Linhas da listagem plana dos registros de table com esses IDs ({id: linha}).
+
+        Os que não existem mais ficam de fora.
+        """
+        with self.lock:
+            self.refresh()
+            records = self.tables[table]
+            rows = self._list_rows(table, (records[i] for i in ids if i in records))
+            return {row['id']: row for row in rows}
+
+    def iter_roster(self, turma_id=None, disciplina_catalogo_id=None, professor=None):
+        """Gera as linhas do relatório de matrículas (ROSTER_FIELDS), oferta por oferta.
+
+        A trava é mantida só enquanto as linhas de uma oferta são montadas, então o uso de
+        memória depende do tamanho de uma turma, não do total de matrículas.
+        """
+        with self.lock:
+            self.refresh()
+            filters = {}
+            if turma_id:
+                filters['turma_id'] = turma_id
+            if disciplina_catalogo_id:
+                filters['disciplina_catalogo_id'] = disciplina_catalogo_id
+            oferta_ids = list(self._filtered_ids('turma_disciplinas_ofertas', filters))
+
+        for oferta_id in oferta_ids:
+            with self.lock:
+                oferta = self.tables['turma_disciplinas_ofertas'].get(oferta_id)
+                if not oferta or (professor and oferta['professor'] != professor):
+                    continue
+                turma = self.tables['turmas'].get(oferta['turma_id'])
+                disciplina = self.tables['disciplinas_catalogo'].get(oferta['disciplina_catalogo_id'])
+                if not (turma and disciplina):
+                    continue
+                rows = []
+                for matricula_id in self.lookup('matriculas', 'turma_disciplina_id', oferta_id):
+                    matricula = self.tables['matriculas'][matricula_id]
+                    aluno = self.tables['alunos'].get(matricula['aluno_id'])
+                    if aluno:
+                        rows.append((
+                            turma['id'], turma['nome'], oferta_id, disciplina['codigo'], disciplina['nome'],
+                            oferta['professor'], matricula_id, aluno['id'], aluno['matricula'], aluno['nome'],
+                            aluno['telefone'],
+                        ))
+            for row in rows:
+                yield dict(zip(ROSTER_FIELDS, row))
+
+    # --- Compactação ---
+
+    def compact(self):
+        """Grava o estado atual nos arquivos .txt e descarta do journal o que já foi gravado.
+
+        Os snapshots são escritos em arquivos temporários fora da trava e só então
+        renomeados sobre os originais, com a trava, junto com o corte do journal. Tabelas não
+        carregadas e sem entradas no journal ficam como estão. Ao fim, grava o cache binário
+        de cada snapshot novo.
+        """
+        with self.transaction():
+            for table in TABLES:
+                if self._deferred[table]:
+                    self._ensure_loaded(table)
+            snapshot = {table: dict(records) for table, records in self.tables.items()}
+            search_states = {table: self.search_indexes[table].state(copy=True)
+                             for table in snapshot if table in self.search_indexes}
+            offset = self._journal_offset
+            inode = self._journal_ino
+            signatures = dict(self._signatures)
+
+        tmp_paths = {}
+        with metrics.span('store.snapshot_write'):
+            for table, records in snapshot.items():
+                tmp_paths[table] = unique_tmp_path(self._path(table))
+                write_table_file(tmp_paths[table], TABLES[table][1], records)
+
+        with self.transaction():
+            if self._journal_ino != inode or self._signatures != signatures:
+                # Outro processo compactou antes: este snapshot pode estar desatualizado. Os
+                # snapshots trocados são o sinal confiável; o journal novo pode ter o mesmo inode
+                # do antigo, reaproveitado pelo sistema de arquivos
+                for tmp_path in tmp_paths.values():
+                    os.remove(tmp_path)
+                return
+            for table, tmp_path in tmp_paths.items():
+                os.replace(tmp_path, self._path(table))
+                self._signatures[table] = _file_signature(self._path(table))
+            self._journal_offset = self.journal.truncate_to(offset)
+            self._journal_ino = self._journal_inode()
+            if self.changes.size() > CHANGE_LOG_MAX_BYTES:
+                self.changes.truncate_to(self.changes.tail_offset(CHANGE_LOG_MAX_BYTES // 2))
+                self._changes_ino = _inode(self.changes.path)
+                self._changes_offset = self.changes.size()
+            signatures = {table: self._signatures[table] for table in tmp_paths}
+
+        with metrics.span('store.cache_write'):
+            for table, records in snapshot.items():
+                content = self._cache_content(table, records, search_states.get(table))
+                snapshot_cache.write_cache(self._path(table), (RECORD_TYPES[table].fields, signatures[table]), content)
+
+    def replace_all(self, tables):
+        """Troca todos os dados por tables ({tabela: {id: registro}}), como numa restauração.
+
+        Os snapshots novos são escritos fora da trava e trocados com ela, junto com o
+        esvaziamento do journal; os outros processos recarregam tudo no próximo refresh. No
+        feed, a troca vira um único evento "reset".
+        """
+        tmp_paths = {}
+        with metrics.span('store.snapshot_write'):
+            for table, records in tables.items():
+                tmp_paths[table] = unique_tmp_path(self._path(table))
+                write_table_file(tmp_paths[table], TABLES[table][1], records)
+
+        with self.transaction():
+            self._forget_snapshot_files()
+            for table, tmp_path in tmp_paths.items():
+                os.replace(tmp_path, self._path(table))
+                self._signatures[table] = _file_signature(self._path(table))
+                self.tables[table] = tables[table]
+                self._rebuild_indexes(table)
+            self._deferred = {name: [] for name in TABLES}
+            self.counters = None
+            self._journal_offset = self.journal.truncate_to(self.journal.size())
+            self._journal_ino = self._journal_inode()
+            self._publish([('reset', '', '')])
+
+    def compact_in_background(self):
+        """Compacta em uma thread. Ela não é daemon: o processo espera por ela ao sair, para que
+        um comando curto (ex.: `flask import`) não deixe a compactação pela metade, com os *.tmp
+        em data/ e o journal grande no lugar."""
+        if self._compactor and self._compactor.is_alive():
+            return
+        self._compactor = threading.Thread(target=self.compact, name='compactor')
+        self._compactor.start()